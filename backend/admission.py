@@ -0,0 +1,229 @@
+"""Request coalescing and admission control for the hot read endpoints.
+
+When a team opens the dashboard, dozens of identical GET /teams, /tasks and
+/presence?date=... requests arrive together. Two things keep that burst from
+turning into dozens of identical MongoDB queries and a pile of timeouts:
+
+- Single flight. The first request for a given path and query string runs the
+  handler; identical requests arriving while it runs wait for it and get a
+  copy of its response. For the conditional-GET endpoints the key includes
+  the resource's ETag, so a read that follows a write never joins a flight
+  that started before it. For endpoints that need a bearer token the key
+  includes the token, so nobody gets a response produced under someone
+  else's credentials.
+- Per-route limits. At most ADMISSION_CONCURRENCY handlers run at once per
+  route (ADMISSION_ROUTE_LIMITS overrides single routes, e.g.
+  "/availability=4,/search=8"). Up to ADMISSION_MAX_QUEUE more wait, for at
+  most ADMISSION_QUEUE_TIMEOUT_MS, which is well below the MongoDB client's
+  socketTimeoutMS. Anything beyond that is answered at once with 503 and
+  Retry-After, and so is every new request while more than
+  ADMISSION_DB_MAX_PENDING calls are already waiting on the database pool.
+
+Only GET requests to the paths in ROUTES go through here. The middleware is
+registered inside conditional_get, so 304s and cached bodies never queue.
+ADMISSION_ENABLED=false turns both off.
+"""
+import asyncio
+import hashlib
+import os
+import time
+from collections import deque
+
+from starlette.responses import JSONResponse, Response
+
+import db
+import metrics
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+ADMISSION_CONCURRENCY = int(os.getenv("ADMISSION_CONCURRENCY", 16))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", 64))
+ADMISSION_QUEUE_TIMEOUT_MS = int(os.getenv("ADMISSION_QUEUE_TIMEOUT_MS", 1000))
+ADMISSION_DB_MAX_PENDING = int(os.getenv("ADMISSION_DB_MAX_PENDING", 2 * db.DB_EXECUTOR_WORKERS))
+ADMISSION_ROUTE_LIMITS = os.getenv("ADMISSION_ROUTE_LIMITS", "")
+
+# path -> whether the response depends on the bearer token
+ROUTES = {
+    "/tasks": False,
+    "/teams": False,
+    "/leaves": False,
+    "/presence": False,
+    "/teams/dashboard": False,
+    "/analytics/tasks": False,
+    "/availability": False,
+    "/daily": True,
+    "/search": True,
+}
+
+
+def _route_limits(spec):
+    limits = {}
+    for item in spec.split(","):
+        path, _, limit = item.strip().partition("=")
+        if path and limit:
+            limits[path] = int(limit)
+    return limits
+
+
+class Shed(Exception):
+    def __init__(self, reason):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class RouteLimiter:
+    """A counting semaphore with a bounded FIFO queue"""
+
+    def __init__(self, route, limit, max_queue):
+        self.route = route
+        self.limit = limit
+        self.max_queue = max_queue
+        self.active = 0
+        self.waiters = deque()
+        self.max_queue_depth = 0
+
+    async def acquire(self, timeout):
+        """Take a slot, waiting up to `timeout` seconds; raises Shed"""
+        if self.active < self.limit and not self.waiters:
+            self.active += 1
+            return
+        if len(self.waiters) >= self.max_queue:
+            raise Shed("queue_full")
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        self.max_queue_depth = max(self.max_queue_depth, len(self.waiters))
+        metrics.REQUESTS_QUEUED.inc(route=self.route)
+        queued = time.perf_counter()
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except BaseException as e:
+            if waiter.done() and not waiter.cancelled():
+                # A slot was handed over just as we gave up; pass it on
+                self.release()
+            elif waiter in self.waiters:
+                self.waiters.remove(waiter)
+            if isinstance(e, asyncio.TimeoutError):
+                raise Shed("queue_timeout")
+            raise
+        finally:
+            metrics.QUEUE_WAIT_SECONDS.observe(time.perf_counter() - queued, route=self.route)
+
+    def release(self):
+        # Hand the slot straight to the next waiter, so a new arrival cannot jump the queue
+        while self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def stats(self):
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "queue_depth": len(self.waiters),
+            "max_queue_depth": self.max_queue_depth,
+        }
+
+
+class _Abandoned(Exception):
+    """The leader of a flight went away without a response"""
+
+
+class Admission:
+    def __init__(self, concurrency=ADMISSION_CONCURRENCY, max_queue=ADMISSION_MAX_QUEUE,
+                 queue_timeout_ms=ADMISSION_QUEUE_TIMEOUT_MS, db_max_pending=ADMISSION_DB_MAX_PENDING,
+                 route_limits=ADMISSION_ROUTE_LIMITS):
+        overrides = _route_limits(route_limits)
+        self.limiters = {path: RouteLimiter(path, overrides.get(path, concurrency), max_queue) for path in ROUTES}
+        self.queue_timeout = queue_timeout_ms / 1000
+        self.db_max_pending = db_max_pending
+        # key -> future of (status, raw headers, body)
+        self._flights = {}
+        self.coalesced = 0
+        self.shed = 0
+
+    def key(self, request):
+        parts = [request.url.path, request.url.query, getattr(request.state, "etag", "")]
+        if ROUTES[request.url.path]:
+            parts.append(hashlib.sha1(request.headers.get("authorization", "").encode()).hexdigest())
+        return "\n".join(parts)
+
+    async def _follow(self, route, flight):
+        status, headers, body = await asyncio.shield(flight)
+        self.coalesced += 1
+        metrics.REQUESTS_COALESCED.inc(route=route)
+        response = Response(content=body, status_code=status)
+        response.raw_headers = list(headers)
+        return response
+
+    async def _lead(self, request, call_next, route, flight):
+        limiter = self.limiters[route]
+        if db.pending() > self.db_max_pending:
+            raise Shed("db_saturated")
+        await limiter.acquire(self.queue_timeout)
+        try:
+            response = await call_next(request)
+            body = b"".join([chunk async for chunk in response.body_iterator])
+        finally:
+            limiter.release()
+        flight.set_result((response.status_code, response.raw_headers, body))
+        result = Response(content=body, status_code=response.status_code)
+        result.raw_headers = response.raw_headers
+        return result
+
+    def _busy(self, route, reason):
+        self.shed += 1
+        metrics.REQUESTS_SHED.inc(route=route, reason=reason)
+        return JSONResponse({"detail": "Server busy, please retry"}, status_code=503, headers={"Retry-After": "1"})
+
+    async def middleware(self, request, call_next):
+        """HTTP middleware: coalesce identical reads, then limit and queue per route"""
+        route = request.url.path
+        if not ADMISSION_ENABLED or request.method != "GET" or route not in ROUTES:
+            return await call_next(request)
+        key = self.key(request)
+        while True:
+            flight = self._flights.get(key)
+            if flight is None:
+                break
+            try:
+                return await self._follow(route, flight)
+            except Shed as e:
+                return self._busy(route, e.reason)
+            except _Abandoned:
+                # The leader's client disconnected; run it ourselves
+                continue
+
+        flight = self._flights[key] = asyncio.get_running_loop().create_future()
+        try:
+            return await self._lead(request, call_next, route, flight)
+        except Shed as e:
+            flight.set_exception(e)
+            return self._busy(route, e.reason)
+        except BaseException as e:
+            if not flight.done():
+                flight.set_exception(_Abandoned() if isinstance(e, asyncio.CancelledError) else e)
+            raise
+        finally:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            if flight.done() and not flight.cancelled():
+                # Nobody may be following; mark the exception as retrieved
+                flight.exception()
+
+    def stats(self):
+        return {
+            "enabled": ADMISSION_ENABLED,
+            "concurrency": ADMISSION_CONCURRENCY,
+            "max_queue": ADMISSION_MAX_QUEUE,
+            "queue_timeout_ms": round(self.queue_timeout * 1000),
+            "db_max_pending": self.db_max_pending,
+            "db_pending": db.pending(),
+            "in_flight": len(self._flights),
+            "coalesced": self.coalesced,
+            "shed": self.shed,
+            "routes": {path: limiter.stats() for path, limiter in self.limiters.items()},
+        }
+
+
+admission = Admission()
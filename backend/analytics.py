@@ -0,0 +1,107 @@
+"""Chart series for the analytics page, computed in MongoDB.
+
+One aggregation with a $facet per chart replaces downloading every task into
+the browser: status counts, tasks completed per weekday (by end date),
+tasks per calendar month (by start date) and tasks per assignee. The team
+filter is resolved through the teams collection into an `assign $in` match.
+
+Results are cached per filter set for ANALYTICS_CACHE_SECONDS and tagged with
+the tasks and teams versions from the change feed, so a write through the
+API is visible on the next request even inside the cache window.
+"""
+import os
+import time
+from datetime import date
+
+import events
+import stats
+from db import tasks_col
+
+ANALYTICS_CACHE_SECONDS = float(os.getenv("ANALYTICS_CACHE_SECONDS", 30))
+ANALYTICS_CACHE_SIZE = 256
+
+WEEKDAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+# filters -> (expires_at, versions, result)
+_cache = {}
+
+
+def task_pipeline(query):
+    return [
+        {"$match": query},
+        {"$facet": {
+            "status": [{"$group": {"_id": "$status", "count": {"$sum": 1}}}],
+            # Legacy date strings that dates.migrate could not convert are left
+            # out; $month on a string fails the whole aggregation
+            "done_dates": [
+                {"$match": {"status": "Done", "enddate": {"$type": "date"}}},
+                {"$group": {"_id": "$enddate", "count": {"$sum": 1}}}
+            ],
+            "month": [
+                {"$match": {"startdate": {"$type": "date"}}},
+                {"$group": {"_id": {"$month": "$startdate"}, "count": {"$sum": 1}}}
+            ],
+            "assignee": [{"$group": {"_id": "$assign", "count": {"$sum": 1}}}]
+        }}
+    ]
+
+
+def _weekday(value):
+    return value.weekday() if isinstance(value, date) else None
+
+
+def summarize(facets):
+    status = {}
+    for row in facets["status"]:
+        # Tasks without a status show as Waiting everywhere in the UI
+        name = row["_id"] or "Waiting"
+        status[name] = status.get(name, 0) + row["count"]
+
+    done_by_weekday = [0] * 7
+    for row in facets["done_dates"]:
+        weekday = _weekday(row["_id"]) if row["_id"] else None
+        if weekday is not None:
+            done_by_weekday[weekday] += row["count"]
+
+    by_month = [0] * 12
+    for row in facets["month"]:
+        if row["_id"]:
+            by_month[row["_id"] - 1] += row["count"]
+
+    by_assignee = {}
+    for row in facets["assignee"]:
+        name = row["_id"] or "Unassigned"
+        by_assignee[name] = by_assignee.get(name, 0) + row["count"]
+
+    return {
+        "total": sum(status.values()),
+        "status": status,
+        "done_by_weekday": done_by_weekday,
+        "by_month": by_month,
+        "by_assignee": [{"assign": name, "count": count}
+                        for name, count in sorted(by_assignee.items(), key=lambda item: (-item[1], item[0]))]
+    }
+
+
+async def task_analytics(query, team=None):
+    """All four task chart series for tasks matching `query` (and `team`)"""
+    versions = await events.versions()
+    key = (tuple(sorted((k, repr(v)) for k, v in query.items())), team)
+    tag = (versions.get("tasks", 0), versions.get("teams", 0))
+    now = time.monotonic()
+    cached = _cache.get(key)
+    if cached and cached[0] > now and cached[1] == tag:
+        return cached[2]
+
+    if team:
+        members = await stats.team_members(team)
+        if "assign" in query:
+            members = [m for m in members if m == query["assign"]]
+        query = dict(query, assign={"$in": members})
+    facets = (await tasks_col.aggregate(task_pipeline(query)))[0]
+    result = summarize(facets)
+
+    if len(_cache) >= ANALYTICS_CACHE_SIZE:
+        _cache.clear()
+    _cache[key] = (now + ANALYTICS_CACHE_SECONDS, tag, result)
+    return result
@@ -0,0 +1,263 @@
+"""Hot and cold tiers for daily-task and presence history.
+
+Daily tasks dated before the archive boundary, and presence months before it,
+are moved from `daily` / `presence_buckets` to `daily_archive` /
+`presence_archive`. The boundary is the first day of the month
+ARCHIVE_AFTER_DAYS ago, so whole months move together. The hot collections
+and their indexes then only cover recent history, which is what nearly every
+read asks for, and the archive's indexes stay out of the working set.
+
+Reads are transparent: Tiered puts both collections behind the AsyncCollection
+read methods, queries them concurrently and merges the results in the
+requested order. A recent range costs one extra index seek that finds nothing
+in the archive. Writes go to the hot collection; a document that has been
+archived is moved back when it is updated, and deleted where it is.
+
+The scheduler leader runs the job once a day. It can also be run by hand:
+
+    python archive.py run
+    python archive.py run --after-days 180
+"""
+import argparse
+import asyncio
+import os
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+from pymongo import DeleteOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+import dates
+import db
+from db import daily_archive_col, daily_col, presence_archive_col, presence_col
+
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", 365))
+ARCHIVE_BATCH_SIZE = 1000
+
+ISO_DATE = r"^\d{4}-\d{2}-\d{2}$"
+
+
+def boundary(now=None, after_days=ARCHIVE_AFTER_DAYS):
+    """First day of the month `after_days` ago; everything before it is archived"""
+    day = (now or datetime.utcnow()) - timedelta(days=after_days)
+    return datetime(day.year, day.month, 1)
+
+
+def sort_key(sort):
+    """(key function, reverse) for merging lists sorted by a pymongo sort spec"""
+    fields = [field for field, _ in sort]
+    direction = sort[0][1]
+    # {"$meta": "textScore"} sorts best first
+    reverse = direction == -1 or isinstance(direction, dict)
+
+    def key(doc):
+        # Missing and null values sort first, as in MongoDB
+        return tuple((doc.get(f) is not None, doc.get(f)) for f in fields)
+    return key, reverse
+
+
+def _with_sort_fields(projection, sort):
+    """The projection plus any sort fields it leaves out, and the fields to strip afterwards"""
+    if not projection or not sort:
+        return projection, []
+    projection = dict(projection)
+    inclusive = any(v and k != "_id" for k, v in projection.items())
+    extra = []
+    for field, _ in sort:
+        if field in projection and projection[field]:
+            continue
+        if field == "_id" and projection.get("_id", 1):
+            continue
+        if not inclusive and field != "_id":
+            continue
+        projection[field] = 1
+        extra.append(field)
+    return projection, extra
+
+
+def _strip(docs, fields):
+    for doc in docs:
+        for field in fields:
+            doc.pop(field, None)
+    return docs
+
+
+class Tiered:
+    """Read access to a hot collection and its archive as one collection"""
+
+    def __init__(self, hot, cold):
+        self.hot = hot
+        self.cold = cold
+        self.name = hot.name
+
+    async def find(self, filter=None, projection=None, sort=None, skip=0, limit=0):
+        projection, extra = _with_sort_fields(projection, sort)
+        count = skip + limit if limit else 0
+        hot, cold = await asyncio.gather(
+            self.hot.find(filter, projection, sort=sort, limit=count),
+            self.cold.find(filter, projection, sort=sort, limit=count)
+        )
+        docs = hot + cold
+        if sort:
+            key, reverse = sort_key(sort)
+            docs.sort(key=key, reverse=reverse)
+        docs = docs[skip:skip + limit] if limit else docs[skip:]
+        return _strip(docs, extra)
+
+    async def find_batches(self, filter=None, projection=None, sort=None, batch_size=500):
+        """Both tiers' batches, merged in `sort` order (hot first for ties)"""
+        projection, extra = _with_sort_fields(projection, sort)
+        streams = [self.hot.find_batches(filter, projection, sort, batch_size),
+                   self.cold.find_batches(filter, projection, sort, batch_size)]
+        try:
+            if not sort:
+                for stream in streams:
+                    async for batch in stream:
+                        yield _strip(batch, extra)
+                return
+            key, reverse = sort_key(sort)
+            buffers = [deque(), deque()]
+            live = [True, True]
+            out = []
+            while True:
+                for i, stream in enumerate(streams):
+                    if live[i] and not buffers[i]:
+                        try:
+                            buffers[i].extend(await stream.__anext__())
+                        except StopAsyncIteration:
+                            live[i] = False
+                ready = [i for i in (0, 1) if buffers[i]]
+                if not ready:
+                    break
+                pick = ready[0]
+                if len(ready) == 2:
+                    first, second = key(buffers[0][0]), key(buffers[1][0])
+                    if (second > first) if reverse else (second < first):
+                        pick = 1
+                out.append(buffers[pick].popleft())
+                if len(out) >= batch_size:
+                    yield _strip(out, extra)
+                    out = []
+            if out:
+                yield _strip(out, extra)
+        finally:
+            for stream in streams:
+                await stream.aclose()
+
+    async def find_one(self, filter, projection=None):
+        doc = await self.hot.find_one(filter, projection)
+        if doc is None:
+            doc = await self.cold.find_one(filter, projection)
+        return doc
+
+    async def aggregate(self, pipeline):
+        """The pipeline's results from each tier, concatenated; callers combine groups"""
+        hot, cold = await asyncio.gather(self.hot.aggregate(pipeline), self.cold.aggregate(pipeline))
+        return hot + cold
+
+    async def restore(self, filter):
+        """Move one archived document matching `filter` back to the hot tier"""
+        doc = await self.cold.find_one_and_delete(filter)
+        if doc is not None:
+            await self.hot.insert_one(doc)
+        return doc
+
+    async def update_one(self, filter, update):
+        result = await self.hot.update_one(filter, update)
+        if result.matched_count == 0 and await self.restore(filter) is not None:
+            result = await self.hot.update_one(filter, update)
+        return result
+
+    async def delete_one(self, filter):
+        result = await self.hot.delete_one(filter)
+        if result.deleted_count == 0:
+            result = await self.cold.delete_one(filter)
+        return result
+
+
+daily_tiers = Tiered(daily_col, daily_archive_col)
+presence_tiers = Tiered(presence_col, presence_archive_col)
+
+
+def _batches(col, query, batch_size):
+    """Matching documents in _id order, a batch at a time, resumable after each batch"""
+    last = None
+    while True:
+        page = dict(query, _id={"$gt": last}) if last is not None else query
+        docs = list(col.find(page, sort=[("_id", 1)], limit=batch_size))
+        if not docs:
+            return
+        yield docs
+        last = docs[-1]["_id"]
+
+
+def archive_daily(before, database=None, batch_size=ARCHIVE_BATCH_SIZE):
+    """Move daily tasks dated before `before` to the archive; returns how many moved"""
+    database = database if database is not None else db.get_database()
+    hot, cold = database[daily_col.name], database[daily_archive_col.name]
+    moved = 0
+    # Daily dates are "YYYY-MM-DD" strings; anything else stays where it is
+    query = {"date": {"$lt": dates.to_api(before), "$regex": ISO_DATE}}
+    for docs in _batches(hot, query, batch_size):
+        try:
+            cold.insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            # Copied by an earlier run that stopped before deleting them
+            if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+                raise
+        ids = [doc["_id"] for doc in docs]
+        # Only delete documents nobody changed since they were read
+        moved += hot.bulk_write([DeleteOne(doc) for doc in docs], ordered=False).deleted_count
+        changed = [doc["_id"] for doc in hot.find({"_id": {"$in": ids}}, {"_id": 1})]
+        if changed:
+            # Updated while being copied: the hot copy wins, try again next run
+            cold.delete_many({"_id": {"$in": changed}})
+    return moved
+
+
+def archive_presence(before, database=None, batch_size=ARCHIVE_BATCH_SIZE):
+    """Move presence months before `before` to the archive; returns how many buckets moved"""
+    database = database if database is not None else db.get_database()
+    hot, cold = database[presence_col.name], database[presence_archive_col.name]
+    moved = 0
+    for docs in _batches(hot, {"month": {"$lt": before}}, batch_size):
+        copies = [
+            UpdateOne({"member_name": doc["member_name"], "month": doc["month"]},
+                      {"$set": {f"days.{day}": status for day, status in doc["days"].items()}}, upsert=True)
+            for doc in docs if doc.get("days")
+        ]
+        if copies:
+            cold.bulk_write(copies, ordered=False)
+        # A bucket marked while it was being copied no longer matches and stays
+        # hot until the next run; reads merge both tiers meanwhile
+        for doc in docs:
+            moved += hot.delete_one({"_id": doc["_id"], "days": doc.get("days")}).deleted_count
+    return moved
+
+
+def run(now=None, after_days=ARCHIVE_AFTER_DAYS, database=None):
+    """Archive everything before the boundary; returns what moved, or None when disabled"""
+    if after_days <= 0:
+        return None
+    started = time.perf_counter()
+    before = boundary(now, after_days)
+    report = {
+        "boundary": dates.to_api(before),
+        "daily": archive_daily(before, database),
+        "presence_buckets": archive_presence(before, database),
+    }
+    report["duration_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move old daily tasks and presence to the archive collections")
+    parser.add_argument("command", choices=["run"])
+    parser.add_argument("--after-days", type=int, default=ARCHIVE_AFTER_DAYS)
+    args = parser.parse_args()
+    print(run(after_days=args.after_days))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""Who is away in a date range, and overlap checks for new leave requests.
+
+A leave [s, e] overlaps the range [a, b] when s <= b and e >= a. Those two
+bounds alone still walk every older leave in the index, so queries also
+bound s from below by a - max_leave_days: no leave is longer than that, so
+nothing starting earlier can reach the range. With the `interval` index on
+(start_date, end_date) (or `member_start` for one member) a lookup then reads
+only the leaves that start within max_leave_days of the range, however long
+the history is.
+
+max_leave_days is kept in the `counters` collection and raised with $max on
+every leave write. Deleting a long leave never lowers it, which only makes
+the bound looser. It is computed from the leaves collection the first time
+it is read or raised, so a write never leaves it covering only its own leave.
+
+Absences are presence records with status "absent" in the range, read
+through the (status, date) index.
+"""
+import asyncio
+from datetime import timedelta
+
+import dates
+import stats
+from buckets import presence_rows
+from db import leaves_col, team_col
+from events import counters_col
+
+# Rejected requests do not make anyone unavailable
+ACTIVE_LEAVE_STATUSES = ["approved", "pending"]
+
+SPANS_ID = "leave_spans"
+
+LEAVE_FIELDS = {"_id": 0, "member_name": 1, "start_date": 1, "end_date": 1, "status": 1, "reason": 1}
+
+
+def span_days(start_date, end_date):
+    return max(0, (dates.to_db(end_date) - dates.to_db(start_date)).days)
+
+
+async def _raise_max(days):
+    await counters_col.update_one({"_id": SPANS_ID}, {"$max": {"max_leave_days": days}}, upsert=True)
+
+
+async def record_spans(spans):
+    """Raise max_leave_days to cover newly written leaves"""
+    spans = list(spans)
+    if spans:
+        # Seed from the collection first; $max on a missing counter would ignore older leaves
+        await max_leave_days()
+        await _raise_max(max(spans))
+
+
+async def max_leave_days():
+    doc = await counters_col.find_one({"_id": SPANS_ID})
+    if doc is not None:
+        return doc.get("max_leave_days", 0)
+    rows = await leaves_col.aggregate([
+        {"$match": {"start_date": {"$type": "date"}, "end_date": {"$type": "date"}}},
+        {"$group": {"_id": None, "longest": {"$max": {"$subtract": ["$end_date", "$start_date"]}}}}
+    ])
+    longest = rows[0]["longest"] if rows else 0
+    # $subtract of two dates is milliseconds
+    days = int(longest.total_seconds() // 86400) if isinstance(longest, timedelta) else int((longest or 0) // 86400000)
+    await _raise_max(max(0, days))
+    return max(0, days)
+
+
+def leave_overlap_filter(start_date, end_date, max_days, statuses=None):
+    """Leaves overlapping [start_date, end_date], as an index-bounded range"""
+    return {
+        "start_date": {"$gte": start_date - timedelta(days=max_days), "$lte": end_date},
+        "end_date": {"$gte": start_date},
+        "status": {"$in": statuses or ACTIVE_LEAVE_STATUSES}
+    }
+
+
+def leave_item(doc):
+    return {
+        "member_name": doc.get("member_name"),
+        "start_date": dates.to_api(doc.get("start_date")),
+        "end_date": dates.to_api(doc.get("end_date")),
+        "status": doc.get("status"),
+        "reason": doc.get("reason")
+    }
+
+
+def _member_match(members):
+    return {} if members is None else {"member_name": {"$in": members}}
+
+
+async def leaves_in_range(start_date, end_date, members=None, statuses=None):
+    match = leave_overlap_filter(start_date, end_date, await max_leave_days(), statuses)
+    match.update(_member_match(members))
+    return await leaves_col.find(match, LEAVE_FIELDS, sort=[("member_name", 1), ("start_date", 1)])
+
+
+async def absences_in_range(start_date, end_date, members=None):
+    match = dict(_member_match(members), status="absent", date={"$gte": start_date, "$lte": end_date})
+    return await presence_rows.find(match, {"_id": 0, "member_name": 1, "date": 1})
+
+
+async def availability(start_date, end_date, team=None, members=None, statuses=None):
+    """Members on leave or absent between two BSON dates, and everyone else"""
+    if members is None and team:
+        members = await stats.team_members(team)
+    roster_query = {} if members is None else {"name": {"$in": members}}
+    leaves, absences, roster = await asyncio.gather(
+        leaves_in_range(start_date, end_date, members, statuses),
+        absences_in_range(start_date, end_date, members),
+        team_col.find(roster_query, {"_id": 0, "name": 1}, sort=[("name", 1)])
+    )
+    unavailable = {doc["member_name"] for doc in leaves} | {doc["member_name"] for doc in absences}
+    return {
+        "start_date": dates.to_api(start_date),
+        "end_date": dates.to_api(end_date),
+        "on_leave": [leave_item(doc) for doc in leaves],
+        "absent": [{"member_name": doc["member_name"], "date": dates.to_api(doc["date"])} for doc in absences],
+        "unavailable": sorted(unavailable),
+        "available": [m["name"] for m in roster if m["name"] not in unavailable]
+    }
+
+
+def _overlaps(a, b):
+    return a["start_date"] <= b["end_date"] and b["start_date"] <= a["end_date"]
+
+
+async def find_overlaps(requests):
+    """For each requested leave ({member_name, start_date, end_date} and
+    optionally status and reason), the existing active leaves and other
+    active requests in the list it overlaps, both as leave_item()s.
+
+    One query covers the whole list: per member, the window spanning all of
+    that member's requested dates.
+    """
+    wanted = [dict(leave, start_date=dates.to_db(leave["start_date"]), end_date=dates.to_db(leave["end_date"]))
+              for leave in requests]
+    if not wanted:
+        return []
+    max_days = await max_leave_days()
+    windows = {}
+    for leave in wanted:
+        low, high = windows.get(leave["member_name"], (leave["start_date"], leave["end_date"]))
+        windows[leave["member_name"]] = (min(low, leave["start_date"]), max(high, leave["end_date"]))
+    clauses = [dict(leave_overlap_filter(low, high, max_days), member_name=member) for member, (low, high) in windows.items()]
+    existing = await leaves_col.find(clauses[0] if len(clauses) == 1 else {"$or": clauses}, LEAVE_FIELDS)
+    by_member = {}
+    for doc in existing:
+        by_member.setdefault(doc["member_name"], []).append(doc)
+    requested = {}
+    for i, leave in enumerate(wanted):
+        requested.setdefault(leave["member_name"], []).append(i)
+
+    results = []
+    for i, leave in enumerate(wanted):
+        member = leave["member_name"]
+        found = [leave_item(doc) for doc in by_member.get(member, []) if _overlaps(leave, doc)]
+        found.extend(
+            leave_item(wanted[j])
+            for j in requested[member]
+            if j != i and wanted[j].get("status", "pending") in ACTIVE_LEAVE_STATUSES and _overlaps(leave, wanted[j])
+        )
+        results.append(found)
+    return results
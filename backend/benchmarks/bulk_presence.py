@@ -0,0 +1,68 @@
+"""Throughput of single-item POST /presence vs POST /presence/bulk.
+
+Marks presence for `--members` synthetic members on one date, first one
+request per member (what the pages do today), then in one bulk request, and
+prints records per second for each path.
+
+    python benchmarks/bulk_presence.py --url http://127.0.0.1:8000 --members 500
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+USERNAME = "bench-bulk-user"
+PASSWORD = "bench-bulk-password"
+
+
+async def auth_headers(client):
+    await client.post("/register", json={"username": USERNAME, "email": f"{USERNAME}@example.com", "password": PASSWORD})
+    token = (await client.post("/token", data={"username": USERNAME, "password": PASSWORD})).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+def records(members, date, status):
+    return [{"member_name": f"bench-member-{i}", "date": date, "status": status} for i in range(members)]
+
+
+async def single(client, headers, items, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(item):
+        async with semaphore:
+            await client.post("/presence", json=item, headers=headers)
+    await asyncio.gather(*(one(item) for item in items))
+
+
+async def bulk(client, headers, items, batch_size):
+    for i in range(0, len(items), batch_size):
+        await client.post("/presence/bulk", json=items[i:i + batch_size], headers=headers)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Single vs bulk presence writes")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--members", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=10, help="parallel single-item requests")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--date", default="1999-01-01", help="date the bench records are written for")
+    args = parser.parse_args()
+
+    async with httpx.AsyncClient(base_url=args.url, timeout=120) as client:
+        headers = await auth_headers(client)
+
+        start = time.perf_counter()
+        await single(client, headers, records(args.members, args.date, "present"), args.concurrency)
+        single_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        await bulk(client, headers, records(args.members, args.date, "absent"), args.batch_size)
+        bulk_s = time.perf_counter() - start
+
+    print(f"single: {args.members} requests in {single_s:.2f} s ({args.members / single_s:,.0f} records/s)")
+    print(f"bulk:   {-(-args.members // args.batch_size)} requests in {bulk_s:.2f} s ({args.members / bulk_s:,.0f} records/s)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
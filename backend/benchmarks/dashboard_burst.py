@@ -0,0 +1,104 @@
+"""A 9 AM dashboard burst: many clients load the same pages at once.
+
+Each client makes the requests a dashboard load makes (GET /teams, /tasks,
+/presence?date=<today> and /teams/dashboard), all clients at the same moment.
+Before each wave the benchmark writes a team member, a task and a presence
+record, so the response cache is cold like it is after the first edit of the
+morning. Reports per-wave latency, status codes and, from /metrics, how many
+MongoDB calls the wave cost and how many requests were coalesced, queued or
+shed. Run the server once with ADMISSION_ENABLED=false to compare.
+
+    python benchmarks/dashboard_burst.py --url http://127.0.0.1:8000 --clients 50 --waves 5
+"""
+import argparse
+import asyncio
+import re
+import statistics
+import time
+from datetime import datetime
+
+import httpx
+
+from load_concurrency import percentile
+
+USERNAME = "bench-burst-user"
+PASSWORD = "bench-burst-password"
+MEMBER = "bench-burst-member"
+COUNTERS = ("mongo_operations_total", "http_requests_coalesced_total", "http_requests_queued_total",
+            "http_requests_shed_total")
+
+
+async def counters(client):
+    """Sum of each counter in COUNTERS across its labels"""
+    text = (await client.get("/metrics")).text
+    totals = dict.fromkeys(COUNTERS, 0.0)
+    for line in text.splitlines():
+        match = re.match(r"([a-z_]+)(?:\{.*\})? ([0-9.e+]+)$", line)
+        if match and match.group(1) in totals:
+            totals[match.group(1)] += float(match.group(2))
+    return totals
+
+
+async def bust(client, headers, today, wave):
+    await client.put(f"/teams/{MEMBER}", json={"name": MEMBER, "email": f"{MEMBER}@example.com", "team": f"bench-{wave}"})
+    await client.put(f"/tasks/{MEMBER}", headers=headers, json={
+        "taskname": MEMBER, "assign": MEMBER, "status": "Waiting", "startdate": today, "enddate": today})
+    await client.post("/presence", headers=headers, json={"member_name": MEMBER, "date": today,
+                                                          "status": ("present", "absent")[wave % 2]})
+
+
+async def dashboard_load(client, today):
+    paths = [("/teams", None), ("/tasks", None), ("/presence", {"date": today}), ("/teams/dashboard", {"date": today})]
+
+    async def one(path, params):
+        started = time.perf_counter()
+        try:
+            status = (await client.get(path, params=params)).status_code
+        except httpx.HTTPError:
+            status = "error"
+        return status, (time.perf_counter() - started) * 1000
+
+    return await asyncio.gather(*(one(path, params) for path, params in paths))
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Many identical dashboard loads at the same moment")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--waves", type=int, default=5)
+    args = parser.parse_args()
+    today = datetime.utcnow().strftime("%Y-%m-%d")
+
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=30) as client:
+        # Both fail harmlessly if they already exist
+        await client.post("/register", json={"username": USERNAME, "email": f"{USERNAME}@example.com", "password": PASSWORD})
+        token = (await client.post("/token", data={"username": USERNAME, "password": PASSWORD})).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        await client.post("/teams", json={"name": MEMBER, "email": f"{MEMBER}@example.com", "team": "bench"})
+        await client.post("/tasks", headers=headers, json={
+            "taskname": MEMBER, "assign": MEMBER, "status": "Waiting", "startdate": today, "enddate": today})
+
+        for wave in range(args.waves):
+            await bust(client, headers, today, wave)
+            before = await counters(client)
+            started = time.perf_counter()
+            loads = await asyncio.gather(*(dashboard_load(client, today) for _ in range(args.clients)))
+            elapsed = (time.perf_counter() - started) * 1000
+            after = await counters(client)
+            results = [r for load in loads for r in load]
+            latencies = [ms for _, ms in results]
+            codes = {}
+            for status, _ in results:
+                codes[status] = codes.get(status, 0) + 1
+            delta = {name: int(after[name] - before[name]) for name in COUNTERS}
+            print(f"wave {wave}: {len(results)} requests in {elapsed:7.1f} ms  p50={statistics.median(latencies):7.1f}  "
+                  f"p99={percentile(latencies, 99):7.1f} ms  status={codes}  mongo_calls={delta['mongo_operations_total']}  "
+                  f"coalesced={delta['http_requests_coalesced_total']}  queued={delta['http_requests_queued_total']}  "
+                  f"shed={delta['http_requests_shed_total']}")
+
+        print(f"admission: {(await client.get('/admin/admission', headers=headers)).json()}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
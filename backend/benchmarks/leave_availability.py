@@ -0,0 +1,149 @@
+"""Availability and leave-overlap queries over large synthetic leave histories.
+
+For each history size, fills a scratch database with leaves spread over
+several years, then times the range query behind GET /availability and the
+overlap check run when a leave is created. The bounded query (see
+availability.py) is compared with the plain `start_date <= end and
+end_date >= start` filter, which has to walk every leave that started before
+the range. Against a real server the keys and documents examined come from
+explain().
+
+    python benchmarks/leave_availability.py --sizes 10000,100000,1000000
+    python benchmarks/leave_availability.py --backend mongomock --sizes 2000,20000 --queries 20
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+from load_concurrency import percentile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import availability  # noqa: E402
+import db  # noqa: E402
+import indexes  # noqa: E402
+
+HISTORY_START = datetime(2015, 1, 1)
+STATUSES = ("approved", "approved", "pending", "rejected")
+
+
+def fill(database, size, members, rng):
+    """`size` leaves of 1-14 days, each member's leaves in sequence over the years"""
+    database.leaves.drop()
+    database.counters.delete_one({"_id": availability.SPANS_ID})
+    per_member = max(1, size // members)
+    gap = max(15, 3650 // per_member)
+    batch = []
+    for i in range(size):
+        member, n = i % members, i // members
+        start = HISTORY_START + timedelta(days=n * gap + rng.randrange(gap - 14))
+        batch.append({
+            "member_name": f"member-{member:06d}",
+            "start_date": start,
+            "end_date": start + timedelta(days=rng.randrange(14)),
+            "reason": "synthetic",
+            "status": rng.choice(STATUSES),
+            "requested_by": f"member-{member:06d}",
+        })
+        if len(batch) >= 5000:
+            database.leaves.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        database.leaves.insert_many(batch, ordered=False)
+    indexes.ensure_indexes(database)
+    return per_member * gap
+
+
+def naive_filter(start, end):
+    return {"start_date": {"$lte": end}, "end_date": {"$gte": start}, "status": {"$in": availability.ACTIVE_LEAVE_STATUSES}}
+
+
+def examined(col, query):
+    try:
+        stats = col.find(query).explain().get("executionStats", {})
+    except Exception:
+        # mongomock has no explain
+        return None
+    return stats.get("totalKeysExamined"), stats.get("totalDocsExamined")
+
+
+def timed(fn, runs):
+    latencies = []
+    for i in range(runs):
+        started = time.perf_counter()
+        fn(i)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+def report(label, latencies, plan):
+    line = (f"  {label:22} p50={statistics.median(latencies):8.2f}  p95={percentile(latencies, 95):8.2f} ms")
+    if plan:
+        line += f"  keys={plan[0]} docs={plan[1]}"
+    print(line)
+
+
+def run_size(database, size, members, queries, rng):
+    started = time.perf_counter()
+    span = fill(database, size, members, rng)
+    print(f"{size} leaves for {members} members over {span} days (filled in {time.perf_counter() - started:.1f} s)")
+    col = database.leaves
+    max_days = asyncio.run(availability.max_leave_days())
+    # Ranges late in the history are the worst case for the plain filter
+    ranges = []
+    for _ in range(queries):
+        start = HISTORY_START + timedelta(days=rng.randrange(span // 2, span))
+        ranges.append((start, start + timedelta(days=rng.randrange(7))))
+
+    def bounded(i):
+        return list(col.find(availability.leave_overlap_filter(*ranges[i], max_days), availability.LEAVE_FIELDS))
+
+    def naive(i):
+        return list(col.find(naive_filter(*ranges[i]), availability.LEAVE_FIELDS))
+
+    assert len(bounded(0)) == len(naive(0))
+    report("range, bounded", timed(bounded, queries), examined(col, availability.leave_overlap_filter(*ranges[0], max_days)))
+    report("range, plain", timed(naive, queries), examined(col, naive_filter(*ranges[0])))
+
+    # The query find_overlaps() sends for one new leave
+    def overlap_check(i):
+        member = f"member-{rng.randrange(members):06d}"
+        return list(col.find(dict(availability.leave_overlap_filter(*ranges[i], max_days), member_name=member), availability.LEAVE_FIELDS))
+
+    def overlap_plain(i):
+        member = f"member-{rng.randrange(members):06d}"
+        return list(col.find(dict(naive_filter(*ranges[i]), member_name=member), availability.LEAVE_FIELDS))
+
+    member = "member-000000"
+    report("overlap check", timed(overlap_check, queries),
+           examined(col, dict(availability.leave_overlap_filter(*ranges[0], max_days), member_name=member)))
+    report("overlap check, plain", timed(overlap_plain, queries), examined(col, dict(naive_filter(*ranges[0]), member_name=member)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark availability and overlap queries")
+    parser.add_argument("--backend", choices=["mongo", "mongomock"], default="mongo")
+    parser.add_argument("--db", default="leave_availability_bench", help="scratch database (dropped collections)")
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--members", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    if args.backend == "mongomock":
+        import mongomock
+        client = mongomock.MongoClient()
+        db.create_client = lambda: client
+    db.MONGO_DB_NAME = args.db
+    rng = random.Random(args.seed)
+    for size in (int(s) for s in args.sizes.split(",")):
+        run_size(db.get_database(), size, min(args.members, size), args.queries, rng)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Concurrency load test for the read endpoints.
+
+Runs the same batch of GET requests against a running API at increasing
+concurrency levels and prints p50/p95/p99 latency for each level. With the
+data-access layer off the event loop, p99 should stay close to the
+single-client value until the Mongo pool is saturated.
+
+    python benchmarks/load_concurrency.py --url http://127.0.0.1:8000 --path /tasks
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run_level(client, path, concurrency, total):
+    latencies = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                response = await client.get(path)
+                if response.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    elapsed = time.perf_counter() - start
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": errors,
+        "rps": round(total / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--path", default="/teams")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--levels", default="1,10,50,100")
+    args = parser.parse_args()
+
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=30) as client:
+        for level in [int(x) for x in args.levels.split(",")]:
+            result = await run_level(client, args.path, level, args.requests)
+            print(result)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
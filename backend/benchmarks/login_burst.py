@@ -0,0 +1,143 @@
+"""Measure /tasks latency while a burst of logins is in progress.
+
+First samples /tasks alone, then keeps sampling for as long as `--logins`
+concurrent POST /token requests take. With bcrypt on its own pool the /tasks
+percentiles during the burst should stay near the idle ones; any 503s from the
+password pool are counted as shed logins.
+
+With `--baseline-port` it first starts its own server on that port, with the
+same environment but bcrypt run inline on the event loop as before the pool
+existed, measures it the same way, and stops it, so both are printed side by
+side.
+
+    python benchmarks/login_burst.py --url http://127.0.0.1:8000 --logins 200
+    python benchmarks/login_burst.py --url http://127.0.0.1:8000 --baseline-port 8001
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+from load_concurrency import percentile
+from startup_time import BACKEND_DIR, wait_for
+
+USERNAME = "bench-login-user"
+PASSWORD = "bench-login-password"
+
+
+async def sample_tasks(client, count, interval, until=None):
+    """Time GET /tasks `count` times, or for as long as `until` is running.
+
+    Returns the latencies and how many requests the server dropped.
+    """
+    latencies = []
+    dropped = 0
+    while len(latencies) + dropped < count if until is None else not until.done():
+        start = time.perf_counter()
+        try:
+            await client.get("/tasks", params={"limit": 10})
+            latencies.append((time.perf_counter() - start) * 1000)
+        except httpx.TransportError:
+            # A blocked event loop lets uvicorn's keep-alive timer close
+            # connections that already carry a request
+            dropped += 1
+        await asyncio.sleep(interval)
+    return latencies, dropped
+
+
+async def login_burst(client, count):
+    async def one():
+        try:
+            response = await client.post("/token", data={"username": USERNAME, "password": PASSWORD})
+        except httpx.TransportError:
+            return "dropped"
+        return response.status_code
+    codes = await asyncio.gather(*(one() for _ in range(count)))
+    return {code: codes.count(code) for code in set(codes)}
+
+
+def summary(label, sampled):
+    latencies, dropped = sampled
+    print(f"{label:24} /tasks n={len(latencies):<5} p50={statistics.median(latencies):8.2f} ms  "
+          f"p95={percentile(latencies, 95):8.2f} ms  p99={percentile(latencies, 99):8.2f} ms  dropped={dropped}")
+
+
+async def measure(url, name, args):
+    # Drop idle connections before uvicorn's 5 s keep-alive timeout closes them under us
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None, keepalive_expiry=2)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=120) as client:
+        # Registration fails harmlessly if the bench user already exists
+        await client.post("/register", json={"username": USERNAME, "email": f"{USERNAME}@example.com", "password": PASSWORD})
+
+        summary(f"{name} idle", await sample_tasks(client, args.samples, args.interval))
+
+        started = time.perf_counter()
+        burst = asyncio.create_task(login_burst(client, args.logins))
+        during = await sample_tasks(client, args.samples, args.interval, until=burst)
+        codes = await burst
+        summary(f"{name} during burst", during)
+        print(f"{name}: {args.logins} logins in {time.perf_counter() - started:.1f} s, status codes {codes}")
+
+        if name == "pool":
+            token = (await client.post("/token", data={"username": USERNAME, "password": PASSWORD})).json()["access_token"]
+            pool = await client.get("/admin/password-pool", headers={"Authorization": f"Bearer {token}"})
+            print(f"{name} password pool: {pool.json()}")
+
+
+def serve_inline(port):
+    """Run the API with bcrypt called directly in the handlers, as before passwords.py had a pool"""
+    sys.path.insert(0, BACKEND_DIR)
+    import uvicorn
+
+    import main
+    import passwords
+
+    async def inline(operation, fn, *args):
+        return fn(*args)
+
+    passwords._submit = inline
+    uvicorn.run(main.app, host="127.0.0.1", port=port, log_level="warning")
+
+
+async def measure_baseline(port, args):
+    server = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--serve-inline", str(port)],
+                              cwd=BACKEND_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        url = f"http://127.0.0.1:{port}"
+        if not await asyncio.to_thread(wait_for, f"{url}/health/ready", time.perf_counter() + 60):
+            raise SystemExit("baseline server did not become ready")
+        await measure(url, "inline", args)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+async def run(args):
+    if args.baseline_port:
+        await measure_baseline(args.baseline_port, args)
+    await measure(args.url, "pool", args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Login burst vs /tasks latency")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--baseline-port", type=int, help="start an inline-bcrypt server on this port and measure it first")
+    parser.add_argument("--serve-inline", type=int, metavar="PORT", help=argparse.SUPPRESS)
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--samples", type=int, default=200)
+    parser.add_argument("--interval", type=float, default=0.01)
+    args = parser.parse_args()
+
+    if args.serve_inline:
+        serve_inline(args.serve_inline)
+    else:
+        asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""Presence storage before and after monthly buckets and archiving.
+
+Writes `--members` members x `--years` years of daily presence to a scratch
+database (<MONGO_DB_NAME>_storage_bench, dropped before and after) and
+reports documents, data size and index size for three layouts:
+
+  before    one document per member per day in `presence`, with its three
+            indexes
+  buckets   the same data after buckets.migrate(): one document per member
+            per month in `presence_buckets`
+  archived  after archive.run(): months older than --after-days moved to
+            `presence_archive`; "hot" is what recent reads touch
+
+Sizes come from collStats. mongomock has no collStats, so there the data size
+is the sum of the BSON documents, and indexes are neither built (its unique
+indexes make inserts quadratic) nor reported.
+
+    python benchmarks/presence_storage.py --members 500 --years 3
+    python benchmarks/presence_storage.py --backend mongomock --members 50 --years 2
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+import bson
+from pymongo import ASCENDING, IndexModel
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import archive  # noqa: E402
+import buckets  # noqa: E402
+import db  # noqa: E402
+import indexes  # noqa: E402
+from seed import PRESENCE_STATUSES, member_name  # noqa: E402
+
+BATCH_SIZE = 5000
+# The per-day collection's indexes before buckets
+LEGACY_INDEXES = [
+    IndexModel([("member_name", ASCENDING), ("date", ASCENDING)], name="member_date_unique", unique=True),
+    IndexModel([("date", ASCENDING), ("status", ASCENDING)], name="date_status"),
+    IndexModel([("status", ASCENDING), ("date", ASCENDING)], name="status_date"),
+]
+
+
+def legacy_rows(members, days, end, rng):
+    start = end - timedelta(days=days)
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        if day.weekday() >= 5:
+            continue
+        for i in range(members):
+            yield {"member_name": member_name(i), "date": day, "status": rng.choice(PRESENCE_STATUSES)}
+
+
+def sizes(database, name):
+    """(documents, data bytes, index bytes or None)"""
+    col = database[name]
+    try:
+        stats = database.command("collStats", name)
+        return stats["count"], stats["size"], stats["totalIndexSize"]
+    except Exception:
+        count = size = 0
+        for doc in col.find({}):
+            count += 1
+            size += len(bson.encode(doc))
+        return count, size, None
+
+
+def _mb(value):
+    return "      n/a" if value is None else f"{value / 1e6:9.2f} MB"
+
+
+def report(label, rows):
+    print(label)
+    for name, (count, size, index_size) in rows.items():
+        print(f"  {name:24} {count:10} docs  data {_mb(size)}  indexes {_mb(index_size)}")
+
+
+def run(args):
+    if args.backend == "mongomock":
+        import mongomock
+        client = mongomock.MongoClient()
+        db.create_client = lambda: client
+    database = db.get_client()[f"{db.MONGO_DB_NAME}_storage_bench"]
+    database.client.drop_database(database.name)
+    with_indexes = args.backend == "mongo"
+    try:
+        legacy = database[buckets.LEGACY_COLLECTION]
+        if with_indexes:
+            legacy.create_indexes(LEGACY_INDEXES)
+        end = datetime.combine(datetime.utcnow().date(), datetime.min.time())
+        batch = []
+        for row in legacy_rows(args.members, args.years * 365, end, random.Random(42)):
+            batch.append(row)
+            if len(batch) >= BATCH_SIZE:
+                legacy.insert_many(batch)
+                batch = []
+        if batch:
+            legacy.insert_many(batch)
+        before = {buckets.LEGACY_COLLECTION: sizes(database, buckets.LEGACY_COLLECTION)}
+        report("before: one document per member per day", before)
+
+        if with_indexes:
+            for name in (db.presence_col.name, db.presence_archive_col.name):
+                database[name].create_indexes(indexes.INDEXES[name])
+        started = time.perf_counter()
+        migrated = buckets.migrate(database)
+        print(f"migrated {migrated['days']} days into {migrated['buckets']} buckets "
+              f"in {(time.perf_counter() - started) * 1000:.0f} ms")
+        after = {db.presence_col.name: sizes(database, db.presence_col.name)}
+        report("buckets: one document per member per month", after)
+
+        moved = archive.run(end, args.after_days, database)
+        print(f"archived {moved['presence_buckets']} buckets before {moved['boundary']} in {moved['duration_ms']:.0f} ms")
+        tiers = {
+            f"{db.presence_col.name} (hot)": sizes(database, db.presence_col.name),
+            db.presence_archive_col.name: sizes(database, db.presence_archive_col.name),
+        }
+        report(f"archived: older than {args.after_days} days", tiers)
+
+        old_count, old_size, old_index = before[buckets.LEGACY_COLLECTION]
+        new_count, new_size, new_index = after[db.presence_col.name]
+        hot_count, hot_size, hot_index = tiers[f"{db.presence_col.name} (hot)"]
+        print(f"documents {old_count / max(1, new_count):.1f}x fewer, data {old_size / max(1, new_size):.1f}x smaller")
+        if old_index is not None:
+            print(f"indexes {old_index / max(1, new_index):.1f}x smaller; "
+                  f"hot indexes {old_index / max(1, hot_index):.1f}x smaller than before")
+        print(f"hot tier holds {hot_count} of {new_count} buckets ({hot_size / max(1, new_size):.0%} of the data)")
+    finally:
+        database.client.drop_database(database.name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Presence storage per layout")
+    parser.add_argument("--backend", choices=["mongo", "mongomock"], default="mongo")
+    parser.add_argument("--members", type=int, default=500)
+    parser.add_argument("--years", type=int, default=3)
+    parser.add_argument("--after-days", type=int, default=365)
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Search latency over a seeded corpus.
+
+Seeds tasks and daily tasks (see seed.py) and runs a mix of queries straight
+against the configured search engine: one common word, two words, a rare
+token, assignee and status/date filters, and a deep page. Reports p50/p95/p99
+and hits per query. `--engine local` also reports how long the in-process
+index took to build and how many terms it holds.
+
+    python benchmarks/search_latency.py --scale 1000000 --engine mongo
+    python benchmarks/search_latency.py --backend mongomock --scale 20000 --runs 20
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+from load_concurrency import percentile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import seed as seeding  # noqa: E402
+
+
+def query_mix(scale):
+    tasks = seeding.plan(scale)["tasks"]
+    start, end = seeding.day(100), seeding.day(190)
+    return {
+        "one_word": dict(q="billing"),
+        "two_words": dict(q="billing invoice"),
+        "rare_token": dict(q=f"{max(0, tasks // 2):07d}"),
+        "by_assignee": dict(q="review report", assign=seeding.member_name(0)),
+        "status_dates": dict(q="migrate database", status="Done", start=start, end=end),
+        "tasks_only": dict(q="dashboard", kinds=["tasks"]),
+        "deep_page": dict(q="fix", offset=500),
+    }
+
+
+async def run(args):
+    if args.backend == "mongomock" or args.engine == "local":
+        os.environ["SEARCH_BACKEND"] = "local"
+    else:
+        os.environ["SEARCH_BACKEND"] = "mongo"
+    if args.backend == "mongomock":
+        import mongomock
+        import db
+        client = mongomock.MongoClient()
+        db.create_client = lambda: client
+    if args.scale:
+        await asyncio.to_thread(seeding.seed, args.scale, args.drop or args.backend == "mongomock")
+
+    import dates
+    import main
+    engine = main.search_engine
+    print(f"engine: {engine.backend}")
+    if engine.backend == "local":
+        started = time.perf_counter()
+        await engine.sync()
+        stats = engine.stats()
+        print(f"index built in {(time.perf_counter() - started) * 1000:.0f} ms: "
+              f"{stats['documents']} documents, {stats['terms']} terms")
+
+    for name, params in query_mix(args.scale).items():
+        kinds = params.get("kinds", ["tasks", "daily"])
+        start = dates.to_db(params["start"]) if "start" in params else None
+        end = dates.to_db(params["end"]) if "end" in params else None
+        latencies = []
+        hits = 0
+        for _ in range(args.runs):
+            started = time.perf_counter()
+            page = await engine.search(params["q"], kinds, params.get("assign"), params.get("status"), start, end,
+                                       args.limit, params.get("offset", 0))
+            latencies.append((time.perf_counter() - started) * 1000)
+            hits = len(page["items"])
+        print(f"{name:14} p50={statistics.median(latencies):8.2f}  p95={percentile(latencies, 95):8.2f}  "
+              f"p99={percentile(latencies, 99):8.2f} ms  hits={hits}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure search latency on a seeded corpus")
+    parser.add_argument("--backend", choices=["mongo", "mongomock"], default="mongo")
+    parser.add_argument("--engine", choices=["mongo", "local"], default="mongo", help="forced to local with mongomock")
+    parser.add_argument("--scale", type=int, default=100000, help="documents to seed first; 0 to use existing data")
+    parser.add_argument("--drop", action="store_true", help="drop the seeded collections before seeding")
+    parser.add_argument("--runs", type=int, default=100, help="runs per query")
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
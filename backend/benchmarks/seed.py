@@ -0,0 +1,190 @@
+"""Seed reproducible synthetic data for benchmarks.
+
+Fills users, teams, tasks, daily tasks, leaves and presence with about
+`--scale` documents in total (1k to 1M), generated from a fixed random seed so
+two runs at the same scale see the same data. Documents have the same shape as
+the ones the API writes, and the presence/leave rollups are rebuilt at the
+end so the stats endpoints read them as they would in production. Presence
+is written as monthly buckets (see buckets.py), and everything is seeded into
+the hot collections; run `python archive.py run` afterwards to split it.
+
+    python benchmarks/seed.py --scale 100000 --drop      # uses MONGO_URL / MONGO_DB_NAME
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+from pymongo.errors import BulkWriteError
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import buckets  # noqa: E402
+import dates  # noqa: E402
+import db  # noqa: E402
+import indexes  # noqa: E402
+import rollups  # noqa: E402
+from passwords import pwd_context  # noqa: E402
+
+BATCH_SIZE = 5000
+COLLECTIONS = ("users", "teams", "tasks", "daily", "leaves", "presence")
+# Where each kind is stored, where that differs from its name
+TARGETS = {"presence": db.presence_col.name}
+# Dropped along with the seeded collections: archives and legacy layouts
+EXTRA_DROPS = (db.daily_archive_col.name, db.presence_archive_col.name, buckets.LEGACY_COLLECTION)
+TASK_STATUSES = ("Waiting", "In Progress", "Review", "Done")
+LEAVE_STATUSES = ("pending", "approved", "rejected")
+PRESENCE_STATUSES = ("present", "present", "present", "absent")
+TEAM_NAMES = ("Platform", "Mobile", "Web", "Data", "Design", "QA", "Support", "Ops")
+# Vocabulary for task names and descriptions, so search has realistic text
+VERBS = ("fix", "review", "update", "migrate", "document", "test", "deploy", "design", "refactor", "triage")
+NOUNS = ("billing", "login", "dashboard", "invoice", "report", "search", "onboarding", "payments", "export",
+         "notifications", "calendar", "profile", "api", "database", "release", "backlog", "roadmap", "metrics")
+START_DATE = date(2023, 1, 1)
+
+BENCH_PASSWORD = "bench-password"
+
+
+def plan(scale):
+    """How many documents of each kind make up `scale`"""
+    members = max(10, scale // 100)
+    counts = {
+        "users": members,
+        "teams": members,
+        "tasks": int(scale * 0.3),
+        "daily": int(scale * 0.15),
+        "leaves": int(scale * 0.1),
+    }
+    counts["presence"] = max(0, scale - sum(counts.values()))
+    return counts
+
+
+def member_name(i):
+    return f"member-{i:06d}"
+
+
+def day(offset):
+    return (START_DATE + timedelta(days=offset)).isoformat()
+
+
+def generate(kind, count, members, rng):
+    """Yield `count` synthetic documents for collection `kind`"""
+    if kind == "users":
+        # One real hash shared by every user keeps seeding fast and lets
+        # benchmarks log in as any member-NNNNNN / BENCH_PASSWORD
+        hashed = pwd_context.hash(BENCH_PASSWORD)
+        for i in range(count):
+            yield {"username": member_name(i), "email": f"{member_name(i)}@example.com", "hashed_password": hashed}
+    elif kind == "teams":
+        for i in range(count):
+            yield {"name": member_name(i), "email": f"{member_name(i)}@example.com", "team": TEAM_NAMES[i % len(TEAM_NAMES)]}
+    elif kind == "tasks":
+        for i in range(count):
+            assign = member_name(rng.randrange(members))
+            start = rng.randrange(730)
+            yield {
+                "taskname": f"{rng.choice(VERBS)} {rng.choice(NOUNS)} task-{i:07d}",
+                "assign": assign,
+                "status": rng.choice(TASK_STATUSES),
+                "startdate": dates.to_db(day(start)),
+                "enddate": dates.to_db(day(start + rng.randrange(1, 30))),
+                "email": f"{assign}@example.com",
+                "sendReminder": rng.random() < 0.5,
+            }
+    elif kind == "daily":
+        for i in range(count):
+            assign = member_name(rng.randrange(members))
+            yield {
+                "name": f"daily-{i:07d}",
+                "assign": assign,
+                "description": f"{rng.choice(VERBS)} the {rng.choice(NOUNS)} and {rng.choice(NOUNS)} with {rng.choice(TEAM_NAMES)}",
+                "date": day(rng.randrange(730)),
+                "email": f"{assign}@example.com",
+            }
+    elif kind == "leaves":
+        for i in range(count):
+            member = member_name(i % members)
+            # Spread each member's leaves over distinct start dates
+            start = (i // members) * 7 + rng.randrange(5)
+            status = rng.choice(LEAVE_STATUSES)
+            yield {
+                "member_name": member,
+                "start_date": dates.to_db(day(start)),
+                "end_date": dates.to_db(day(start + rng.randrange(1, 5))),
+                "reason": "synthetic",
+                "status": status,
+                "requested_by": member,
+                "approved_by": "manager" if status != "pending" else None,
+            }
+    elif kind == "presence":
+        # (member, date) is unique: member i gets consecutive days
+        for i in range(count):
+            yield {"member_name": member_name(i % members), "date": dates.to_db(day(i // members)), "status": rng.choice(PRESENCE_STATUSES)}
+
+
+def as_buckets(rows):
+    """Group presence rows into monthly bucket documents"""
+    grouped = {}
+    for row in rows:
+        day = row["date"]
+        bucket = grouped.setdefault((row["member_name"], buckets.month_of(day)), {})
+        bucket[buckets.day_key(day)] = row["status"]
+    for (member, month), days in grouped.items():
+        yield {"member_name": member, "month": month, "days": days}
+
+
+def _insert(col, batch):
+    try:
+        return len(col.insert_many(batch, ordered=False).inserted_ids)
+    except BulkWriteError as e:
+        # Re-seeding without --drop: existing documents hit the unique indexes
+        return e.details.get("nInserted", 0)
+
+
+def seed(scale, drop=False, random_seed=42):
+    """Insert about `scale` documents; returns per-collection counts"""
+    database = db.get_database()
+    rng = random.Random(random_seed)
+    counts = plan(scale)
+    started = time.perf_counter()
+    if drop:
+        for name in EXTRA_DROPS:
+            database[name].drop()
+    for kind in COLLECTIONS:
+        col = database[TARGETS.get(kind, kind)]
+        if drop:
+            col.drop()
+        inserted = 0
+        batch = []
+        docs = generate(kind, counts[kind], counts["users"], rng)
+        if kind == "presence":
+            docs = as_buckets(docs)
+        for doc in docs:
+            batch.append(doc)
+            if len(batch) >= BATCH_SIZE:
+                inserted += _insert(col, batch)
+                batch = []
+        if batch:
+            inserted += _insert(col, batch)
+        print(f"seeded {kind}: {inserted} documents for {counts[kind]}")
+    # Nothing legacy left to fold in at startup
+    database["migrations"].update_one({"_id": buckets.MIGRATION_ID}, {"$set": {"seeded": True}}, upsert=True)
+    indexes.ensure_indexes(database)
+    print(f"rollups: {rollups.rebuild()}")
+    print(f"seeded {sum(counts.values())} documents in {time.perf_counter() - started:.1f} s")
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed synthetic benchmark data")
+    parser.add_argument("--scale", type=int, default=10000, help="approximate total number of documents")
+    parser.add_argument("--drop", action="store_true", help="drop the seeded collections first")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    seed(args.scale, args.drop, args.seed)
+
+
+if __name__ == "__main__":
+    main()
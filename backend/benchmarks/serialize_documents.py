@@ -0,0 +1,136 @@
+"""Per-document CPU cost of the list read path, before and after.
+
+Times the work GET /tasks (and the other list routes) does per document once
+MongoDB has answered, using synthetic task documents of the stored shape:
+
+  before  decode the whole BSON document, build a Task per document,
+          FastAPI's response_model validation and serialization, and the
+          stdlib JSON encoder (JSONResponse)
+  after   decode the projected BSON document, Resource.converter() into
+          plain dicts, and ORJSONResponse
+
+Each stage is timed separately and reported in microseconds per document.
+
+    python benchmarks/serialize_documents.py --docs 1000,10000,100000
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import List, Union
+
+import bson
+from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dates  # noqa: E402
+from main import TASK_RESOURCE, Task  # noqa: E402
+from pagination import Page  # noqa: E402
+
+
+def stored_tasks(count):
+    start = datetime(2024, 1, 1)
+    return [{
+        "_id": bson.ObjectId(),
+        "taskname": f"review billing task-{i:07d}",
+        "assign": f"member-{i % 1000:06d}",
+        "status": ("Waiting", "In Progress", "Review", "Done")[i % 4],
+        "startdate": start + timedelta(days=i % 365),
+        "enddate": start + timedelta(days=i % 365 + 7),
+        "email": f"member-{i % 1000:06d}@example.com",
+        "sendReminder": i % 2 == 0,
+    } for i in range(count)]
+
+
+def old_models(docs):
+    # What get_tasks did before: one model per document
+    return [Task(
+        taskname=doc.get("taskname"),
+        assign=doc.get("assign"),
+        status=doc.get("status"),
+        startdate=dates.to_api(doc.get("startdate")),
+        enddate=dates.to_api(doc.get("enddate")),
+        email=doc.get("email") or "",
+        send_reminder=doc.get("sendReminder", False)
+    ) for doc in docs]
+
+
+async def old_validate(field, models):
+    return await serialize_response(field=field, response_content=models, is_coroutine=True)
+
+
+def timed(fn, *args):
+    # Collections triggered by earlier stages' garbage would be charged to this one
+    gc.collect()
+    gc.disable()
+    try:
+        started = time.perf_counter()
+        result = fn(*args)
+        return result, time.perf_counter() - started
+    finally:
+        gc.enable()
+
+
+def run(count, repeat):
+    docs = stored_tasks(count)
+    selected = list(TASK_RESOURCE.fields)
+    projection = dict(TASK_RESOURCE.projection(selected), _id=0)
+    full_bson = [bson.encode(doc) for doc in docs]
+    projected_bson = [bson.encode({k: doc[k] for k in projection if k in doc}) for doc in docs]
+    field = create_response_field(name="Response_get_tasks", type_=Union[List[Task], Page])
+
+    best = {}
+
+    def record(stage, seconds):
+        best[stage] = min(best.get(stage, seconds), seconds)
+
+    for _ in range(repeat):
+        decoded, t = timed(lambda: [bson.decode(b) for b in full_bson])
+        record("before: bson decode", t)
+        models, t = timed(old_models, decoded)
+        record("before: build models", t)
+        content, t = timed(lambda: asyncio.run(old_validate(field, models)))
+        record("before: validate+encode", t)
+        body, t = timed(lambda: JSONResponse(content).body)
+        record("before: json.dumps", t)
+        old_body = body
+
+        decoded, t = timed(lambda: [bson.decode(b) for b in projected_bson])
+        record("after: bson decode", t)
+        convert = TASK_RESOURCE.converter(selected)
+        items, t = timed(lambda: [convert(doc) for doc in decoded])
+        record("after: convert", t)
+        body, t = timed(lambda: ORJSONResponse(items).body)
+        record("after: orjson", t)
+        new_body = body
+
+    assert json.loads(old_body) == json.loads(new_body), "responses differ"
+    print(f"{count} documents (best of {repeat}), microseconds per document:")
+    for side in ("before", "after"):
+        stages = {k: v for k, v in best.items() if k.startswith(side)}
+        for stage, seconds in stages.items():
+            print(f"  {stage:26} {seconds / count * 1e6:8.2f}")
+        print(f"  {side + ': total':26} {sum(stages.values()) / count * 1e6:8.2f}")
+    before = sum(v for k, v in best.items() if k.startswith("before"))
+    after = sum(v for k, v in best.items() if k.startswith("after"))
+    print(f"  speedup {before / after:.1f}x, response {len(new_body)} bytes")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-document cost of the list read path")
+    parser.add_argument("--docs", default="1000,10000,100000")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    for count in (int(c) for c in args.docs.split(",")):
+        run(count, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
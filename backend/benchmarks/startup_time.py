@@ -0,0 +1,93 @@
+"""Cold-start time of the API.
+
+Starts `uvicorn main:app` in a fresh process `--runs` times and measures how
+long until GET /health/live and GET /health/ready first answer 200, plus the
+bare `import main` time in a separate interpreter. Point `--mongo-url` at an
+unreachable address to check that the app still comes up live (and stays
+not-ready) while MongoDB is down.
+
+    python benchmarks/startup_time.py --runs 5
+    python benchmarks/startup_time.py --runs 3 --mongo-url 127.0.0.1:1 --ready-timeout 5
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_time(env):
+    code = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+    result = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, env=env, capture_output=True, text=True, timeout=300)
+    return float(result.stdout.strip().splitlines()[-1]) * 1000
+
+
+def wait_for(url, deadline):
+    while time.perf_counter() < deadline:
+        try:
+            if httpx.get(url, timeout=0.5).status_code == 200:
+                return True
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.01)
+    return False
+
+
+def start_once(port, env, ready_timeout):
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        base = f"http://127.0.0.1:{port}"
+        live = wait_for(f"{base}/health/live", started + 60)
+        live_ms = (time.perf_counter() - started) * 1000 if live else None
+        ready = wait_for(f"{base}/health/ready", time.perf_counter() + ready_timeout)
+        ready_ms = (time.perf_counter() - started) * 1000 if ready else None
+        return live_ms, ready_ms
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def summary(label, values):
+    measured = [v for v in values if v is not None]
+    if not measured:
+        print(f"{label:12} never (of {len(values)} runs)")
+        return
+    print(f"{label:12} median={statistics.median(measured):8.1f} ms  min={min(measured):8.1f}  "
+          f"max={max(measured):8.1f}  ({len(measured)}/{len(values)} runs)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure API cold-start time")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8799)
+    parser.add_argument("--mongo-url", help="override MONGO_URL for the started servers")
+    parser.add_argument("--ready-timeout", type=float, default=60, help="seconds to wait for readiness after liveness")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    if args.mongo_url:
+        env["MONGO_URL"] = args.mongo_url
+
+    imports = [import_time(env) for _ in range(args.runs)]
+    lives, readies = [], []
+    for _ in range(args.runs):
+        live_ms, ready_ms = start_once(args.port, env, args.ready_timeout)
+        lives.append(live_ms)
+        readies.append(ready_ms)
+
+    summary("import main", imports)
+    summary("live", lives)
+    summary("ready", readies)
+
+
+if __name__ == "__main__":
+    main()
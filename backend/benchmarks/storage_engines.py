@@ -0,0 +1,210 @@
+"""The same repository operations on each storage engine (DB_ENGINE).
+
+For every engine in `--engines`, seeds a scratch database
+(<MONGO_DB_NAME>_engine_bench, dropped afterwards) with seed.py at `--scale`,
+builds the indexes from indexes.py, then times the collection calls the
+routes make, through the same AsyncCollection wrappers and thread pool:
+
+  user_by_name       login: users by username
+  tasks_by_status    GET /tasks?status, first page in start date order
+  tasks_date_range   GET /tasks?startdate&enddate, one week
+  leaves_overlap     GET /availability (leaves), one month
+  presence_month     GET /presence?member_name&date bucket lookup
+  analytics_facet    GET /analytics/tasks $facet over one assignee's tasks
+  leave_stats        GET /stats/leaves for one quarter ($group)
+  insert_task        POST /tasks
+  update_task        PUT /tasks status change
+  mark_presence      POST /presence (find_one_and_update upsert)
+  bulk_insert_100    POST /daily/bulk, 100 documents
+
+Each operation runs `--ops` times, `--concurrency` at a time, and the table
+shows p50/p95 latency per engine side by side. `mongo` needs MONGO_URL;
+`sqlite` writes to `--sqlite-path` (deleted afterwards); `mongomock` is only
+useful as a sanity check.
+
+    python benchmarks/storage_engines.py --scale 100000
+    python benchmarks/storage_engines.py --engines sqlite,mongomock --scale 10000 --concurrency 8
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from load_concurrency import percentile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import analytics  # noqa: E402
+import buckets  # noqa: E402
+import db  # noqa: E402
+import seed as seeding  # noqa: E402
+import sqlite_engine  # noqa: E402
+import stats  # noqa: E402
+from availability import leave_overlap_filter  # noqa: E402
+from db import daily_col, leaves_col, presence_col, tasks_col, users_col  # noqa: E402
+
+HISTORY_DAYS = 730
+BASE_DB_NAME = db.MONGO_DB_NAME
+_create_mongo_client = db.create_client
+
+
+def _day(rng):
+    return datetime.combine(seeding.START_DATE, datetime.min.time()) + timedelta(days=rng.randrange(HISTORY_DAYS))
+
+
+def operations(members):
+    """name -> coroutine function of (i, rng)"""
+    def member(rng):
+        return seeding.member_name(rng.randrange(members))
+
+    async def user_by_name(i, rng):
+        await users_col.find_one({"username": member(rng)})
+
+    async def tasks_by_status(i, rng):
+        await tasks_col.find({"status": rng.choice(seeding.TASK_STATUSES)}, sort=[("startdate", 1), ("_id", 1)], limit=50)
+
+    async def tasks_date_range(i, rng):
+        start = _day(rng)
+        await tasks_col.find({"startdate": {"$gte": start}, "enddate": {"$lte": start + timedelta(days=7)}}, limit=200)
+
+    async def leaves_overlap(i, rng):
+        start = _day(rng)
+        await leaves_col.find(leave_overlap_filter(start, start + timedelta(days=30), 5),
+                              sort=[("member_name", 1), ("start_date", 1)])
+
+    async def presence_month(i, rng):
+        await presence_col.find_one(buckets.bucket_key(member(rng), _day(rng)))
+
+    async def analytics_facet(i, rng):
+        await tasks_col.aggregate(analytics.task_pipeline({"assign": member(rng)}))
+
+    async def leave_stats(i, rng):
+        start = _day(rng)
+        await leaves_col.aggregate(stats.leave_pipeline(stats.leave_match(None, start, start + timedelta(days=91))))
+
+    async def insert_task(i, rng):
+        start = _day(rng)
+        await tasks_col.insert_one({"taskname": f"bench task {i}", "assign": member(rng), "status": "Waiting",
+                                    "startdate": start, "enddate": start + timedelta(days=5), "email": "",
+                                    "sendReminder": False})
+
+    async def update_task(i, rng):
+        await tasks_col.update_one({"assign": member(rng), "status": {"$ne": "Done"}}, {"$set": {"status": "Review"}})
+
+    async def mark_presence(i, rng):
+        await buckets.mark(member(rng), _day(rng), rng.choice(seeding.PRESENCE_STATUSES))
+
+    async def bulk_insert_100(i, rng):
+        await daily_col.insert_many([{"name": f"bench-{i}-{n}", "assign": member(rng), "description": "bench",
+                                      "date": seeding.day(rng.randrange(HISTORY_DAYS)), "email": ""}
+                                     for n in range(100)], ordered=False)
+
+    return {fn.__name__: fn for fn in (
+        user_by_name, tasks_by_status, tasks_date_range, leaves_overlap, presence_month, analytics_facet,
+        leave_stats, insert_task, update_task, mark_presence, bulk_insert_100,
+    )}
+
+
+def use_engine(engine, args):
+    """Point db.py at `engine` and a scratch database"""
+    if db._client is not None:
+        db._client.close()
+    db._client = None
+    db.MONGO_DB_NAME = f"{BASE_DB_NAME}_engine_bench"
+    db.DB_ENGINE = "sqlite" if engine == "sqlite" else "mongo"
+    db.create_client = _create_mongo_client
+    if engine == "sqlite":
+        sqlite_engine.SQLITE_PATH = args.sqlite_path
+        _remove_sqlite(args.sqlite_path)
+    elif engine == "mongomock":
+        import mongomock
+        client = mongomock.MongoClient()
+        db.create_client = lambda: client
+
+
+def _remove_sqlite(path):
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
+async def time_operation(fn, ops, concurrency, rng):
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with semaphore:
+            started = time.perf_counter()
+            await fn(i, rng)
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(ops)))
+    elapsed = time.perf_counter() - started
+    return {"p50_ms": percentile(latencies, 50), "p95_ms": percentile(latencies, 95), "ops_s": ops / elapsed}
+
+
+async def run_engine(engine, args):
+    use_engine(engine, args)
+    print(f"{engine}: seeding {args.scale} documents")
+    started = time.perf_counter()
+    counts = await asyncio.to_thread(seeding.seed, args.scale, True)
+    seeded_s = time.perf_counter() - started
+    rng = random.Random(7)
+    results = {"seed_s": seeded_s}
+    try:
+        for name, fn in operations(counts["users"]).items():
+            if args.operations and name not in args.operations:
+                continue
+            results[name] = await time_operation(fn, args.ops, args.concurrency, rng)
+            print(f"  {name:18} p50={results[name]['p50_ms']:8.2f} ms  p95={results[name]['p95_ms']:8.2f} ms  "
+                  f"{results[name]['ops_s']:9.1f} ops/s")
+    finally:
+        client = db.get_client()
+        client.drop_database(db.MONGO_DB_NAME)
+        client.close()
+        db._client = None
+        if engine == "sqlite":
+            _remove_sqlite(args.sqlite_path)
+    return results
+
+
+def compare(engines, results):
+    names = [name for name in results[engines[0]] if name != "seed_s"]
+    header = "".join(f"{engine + ' p50':>14}{engine + ' p95':>14}" for engine in engines)
+    print(f"\n{'operation':18}{header}")
+    print(f"{'seed (s)':18}" + "".join(f"{results[e]['seed_s']:14.1f}{'':14}" for e in engines))
+    for name in names:
+        print(f"{name:18}" + "".join(f"{results[e][name]['p50_ms']:14.2f}{results[e][name]['p95_ms']:14.2f}"
+                                     for e in engines))
+
+
+async def run(args):
+    engines = args.engines.split(",")
+    results = {}
+    for engine in engines:
+        results[engine] = await run_engine(engine, args)
+    compare(engines, results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare storage engines on the API's collection calls")
+    parser.add_argument("--engines", default="mongo,sqlite", help="comma-separated: mongo, sqlite, mongomock")
+    parser.add_argument("--scale", type=int, default=20000, help="documents to seed per engine")
+    parser.add_argument("--ops", type=int, default=200, help="calls per operation")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--operations", type=lambda s: s.split(","), help="comma-separated subset to run")
+    parser.add_argument("--sqlite-path", default=os.path.join(BENCH_DIR, "engine_bench.db"))
+    args = parser.parse_args()
+    unknown = [e for e in args.engines.split(",") if e not in ("mongo", "sqlite", "mongomock")]
+    if unknown:
+        raise SystemExit(f"unknown engines: {', '.join(unknown)}")
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
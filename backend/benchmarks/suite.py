@@ -0,0 +1,274 @@
+"""Benchmark suite for the API endpoints, with JSON results.
+
+Seeds synthetic data (see seed.py), then drives each endpoint at every
+concurrency level and records throughput, p50/p95/p99 latency, errors and
+memory. Results go to a JSON file so runs can be compared across changes.
+
+By default the app runs in-process through httpx's ASGI transport, against
+MONGO_URL (`--backend mongo`), the embedded SQLite engine (`--backend
+sqlite`, a file at `--sqlite-path`) or an in-memory mongomock database
+(`--backend mongomock`, for quick relative comparisons at small scales; it
+is much slower than a real server). With `--url` the suite drives an
+already-running server instead; pass `--server-pid` to record its memory.
+
+    python benchmarks/suite.py --backend mongomock --scale 5000
+    python benchmarks/suite.py --backend mongo --scale 1000000 --levels 1,10,50 --requests 500
+    python benchmarks/suite.py --backend sqlite --scale 100000 --drop
+    python benchmarks/suite.py --url http://127.0.0.1:8000 --server-pid 1234 --scale 0
+    python benchmarks/suite.py --compare results/before.json results/after.json
+
+GET list endpoints are served from the ETag response cache after the first
+request; pass `--bust-cache` to give every request a unique query string and
+measure the handlers themselves.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+import httpx
+
+from load_concurrency import percentile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import seed as seeding  # noqa: E402
+
+MEMBER = seeding.member_name(0)
+DAY = seeding.day(0)
+
+
+def _presence(i):
+    return {"member_name": seeding.member_name(i % 10), "date": f"2099-{1 + i // 28 % 12:02d}-{1 + i % 28:02d}", "status": "present"}
+
+
+def _task(i):
+    return {"taskname": f"bench-task-{time.time_ns()}-{i}", "assign": MEMBER, "status": "Waiting",
+            "startdate": "2099-01-01", "enddate": "2099-01-31"}
+
+
+# name -> (method, path, body factory); writes run last
+ENDPOINTS = {
+    "teams": ("GET", "/teams", None),
+    "teams_page": ("GET", "/teams?limit=100", None),
+    "tasks": ("GET", "/tasks", None),
+    "tasks_page": ("GET", "/tasks?limit=100", None),
+    "tasks_by_assignee": ("GET", f"/tasks?assign={MEMBER}", None),
+    "daily_page": ("GET", "/daily?limit=100", None),
+    "leaves_member": ("GET", f"/leaves/{MEMBER}", None),
+    "presence_day": ("GET", f"/presence?date={DAY}&limit=100", None),
+    "team_dashboard": ("GET", f"/teams/dashboard?date={DAY}", None),
+    "search": ("GET", "/search?q=billing+invoice", None),
+    "search_filtered": ("GET", f"/search?q=billing&assign={MEMBER}&start_date={DAY}&end_date={seeding.day(90)}", None),
+    "availability": ("GET", f"/availability?start_date={DAY}&end_date={seeding.day(6)}", None),
+    "stats_leaves": ("GET", "/stats/leaves", None),
+    "stats_presence": ("GET", "/stats/presence", None),
+    "mark_presence": ("POST", "/presence", _presence),
+    "create_task": ("POST", "/tasks", _task),
+}
+
+
+def rss_mb(pid=None):
+    """Resident set size of `pid` (default: this process) in MB, Linux only"""
+    try:
+        with open(f"/proc/{pid or 'self'}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+async def _watch_rss(pid, peak):
+    while True:
+        value = rss_mb(pid)
+        if value is not None:
+            peak[0] = max(peak[0] or 0, value)
+        await asyncio.sleep(0.05)
+
+
+async def run_level(client, headers, endpoint, concurrency, total, bust_cache, pid, trace):
+    method, path, body = ENDPOINTS[endpoint]
+    latencies = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        nonlocal errors
+        url = path
+        if bust_cache and method == "GET":
+            url += ("&" if "?" in path else "?") + f"_bench={time.time_ns()}-{i}"
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, url, headers=headers, json=body(i) if body else None)
+                if response.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    rss_before = rss_mb(pid)
+    peak = [rss_before]
+    watcher = asyncio.create_task(_watch_rss(pid, peak))
+    if trace:
+        tracemalloc.start()
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    elapsed = time.perf_counter() - start
+    traced_peak = None
+    if trace:
+        traced_peak = round(tracemalloc.get_traced_memory()[1] / 1024 / 1024, 2)
+        tracemalloc.stop()
+    watcher.cancel()
+    return {
+        "endpoint": endpoint,
+        "method": method,
+        "path": path,
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": errors,
+        "rps": round(total / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "rss_mb_before": rss_before,
+        "rss_mb_peak": peak[0],
+        "rss_mb_after": rss_mb(pid),
+        "traced_peak_mb": traced_peak,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _use_mongomock():
+    import mongomock
+    import db
+    # mongomock has no $text; search through the in-process index instead
+    os.environ["SEARCH_BACKEND"] = "local"
+    client = mongomock.MongoClient()
+    db.create_client = lambda: client
+
+
+def _use_sqlite(path):
+    import db
+    import sqlite_engine
+    db.DB_ENGINE = "sqlite"
+    sqlite_engine.SQLITE_PATH = path
+    os.environ.setdefault("SEARCH_BACKEND", "local")
+
+
+async def run(args):
+    if args.backend == "mongomock" and not args.url:
+        _use_mongomock()
+    if args.backend == "sqlite" and not args.url:
+        _use_sqlite(args.sqlite_path)
+    if args.scale:
+        await asyncio.to_thread(seeding.seed, args.scale, args.drop or args.backend == "mongomock")
+
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=300)
+        pid = args.server_pid
+    else:
+        import main
+        client = httpx.AsyncClient(app=main.app, base_url="http://bench", timeout=300)
+        pid = None
+
+    endpoints = args.endpoints.split(",") if args.endpoints else list(ENDPOINTS)
+    unknown = [e for e in endpoints if e not in ENDPOINTS]
+    if unknown:
+        raise SystemExit(f"unknown endpoints: {', '.join(unknown)}; choose from {', '.join(ENDPOINTS)}")
+    levels = [int(level) for level in args.levels.split(",")]
+
+    results = []
+    async with client:
+        token = (await client.post("/token", data={"username": MEMBER, "password": seeding.BENCH_PASSWORD})).json().get("access_token")
+        if not token:
+            raise SystemExit(f"could not log in as {MEMBER}; seed the database first (--scale)")
+        headers = {"Authorization": f"Bearer {token}"}
+        for endpoint in endpoints:
+            for level in levels:
+                result = await run_level(client, headers, endpoint, level, args.requests, args.bust_cache, pid, args.tracemalloc)
+                results.append(result)
+                print(f"{endpoint:18} c={level:<4} {result['rps']:9.1f} req/s  p50={result['p50_ms']:8.2f}  "
+                      f"p95={result['p95_ms']:8.2f}  p99={result['p99_ms']:8.2f} ms  errors={result['errors']}  "
+                      f"rss={result['rss_mb_after']} MB")
+
+    report = {
+        "meta": {
+            "started_at": datetime.utcnow().isoformat(),
+            "commit": _git_commit(),
+            "backend": "http" if args.url else args.backend,
+            "url": args.url,
+            "scale": args.scale,
+            "seed_counts": seeding.plan(args.scale) if args.scale else None,
+            "levels": levels,
+            "requests_per_level": args.requests,
+            "bust_cache": args.bust_cache,
+            "python": platform.python_version(),
+        },
+        "results": results,
+    }
+    output = args.output or os.path.join(
+        BENCH_DIR, "results", f"{datetime.utcnow():%Y%m%d-%H%M%S}-{report['meta']['backend']}-{args.scale}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"results written to {output}")
+
+
+def compare(before_path, after_path):
+    """Print the p99 and throughput change per endpoint and level"""
+    with open(before_path) as f:
+        before = {(r["endpoint"], r["concurrency"]): r for r in json.load(f)["results"]}
+    with open(after_path) as f:
+        after = json.load(f)["results"]
+    for result in after:
+        old = before.get((result["endpoint"], result["concurrency"]))
+        if old is None:
+            continue
+        rps = (result["rps"] - old["rps"]) / old["rps"] * 100 if old["rps"] else 0.0
+        p99 = (result["p99_ms"] - old["p99_ms"]) / old["p99_ms"] * 100 if old["p99_ms"] else 0.0
+        print(f"{result['endpoint']:18} c={result['concurrency']:<4} rps {old['rps']:9.1f} -> {result['rps']:9.1f} ({rps:+6.1f}%)  "
+              f"p99 {old['p99_ms']:8.2f} -> {result['p99_ms']:8.2f} ms ({p99:+6.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed data and benchmark every endpoint")
+    parser.add_argument("--backend", choices=["mongo", "sqlite", "mongomock"], default="mongo")
+    parser.add_argument("--sqlite-path", default=os.path.join(BENCH_DIR, "results", "bench.db"),
+                        help="database file for --backend sqlite")
+    parser.add_argument("--url", help="benchmark a running server instead of the in-process app")
+    parser.add_argument("--server-pid", type=int, help="pid of the --url server, to record its memory")
+    parser.add_argument("--scale", type=int, default=10000, help="documents to seed first; 0 to use existing data")
+    parser.add_argument("--drop", action="store_true", help="drop the seeded collections before seeding")
+    parser.add_argument("--endpoints", help=f"comma-separated subset of: {', '.join(ENDPOINTS)}")
+    parser.add_argument("--levels", default="1,10,50")
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint and level")
+    parser.add_argument("--bust-cache", action="store_true", help="unique query string per GET")
+    parser.add_argument("--tracemalloc", action="store_true", help="also record Python heap peaks (slow)")
+    parser.add_argument("--output", help="results file (default benchmarks/results/<time>-<backend>-<scale>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="compare two results files and exit")
+    args = parser.parse_args()
+    if args.compare:
+        compare(*args.compare)
+        return
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Compare the old per-member fan-out with GET /teams/dashboard.
+
+The fan-out replays what leaves.js used to do on every page load: GET /teams,
+then one /leaves and one /presence request per member. The dashboard path is
+a single request. Both are run against a live API and the request count and
+wall time are printed.
+
+    python benchmarks/team_dashboard.py --url http://127.0.0.1:8000 --runs 5
+    python benchmarks/team_dashboard.py --seed 200   # add 200 bench members first
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from datetime import datetime
+
+import httpx
+
+
+async def fan_out(client, today):
+    requests = 1
+    members = (await client.get("/teams")).json()
+    for member in members:
+        await client.get("/leaves", params={"member_name": member["name"], "status": "approved"})
+        await client.get("/presence", params={"member_name": member["name"], "date": today})
+        requests += 2
+    return requests
+
+
+async def dashboard(client, today):
+    await client.get("/teams/dashboard", params={"date": today})
+    return 1
+
+
+async def measure(name, fn, client, today, runs):
+    timings = []
+    requests = 0
+    for _ in range(runs):
+        start = time.perf_counter()
+        requests = await fn(client, today)
+        timings.append((time.perf_counter() - start) * 1000)
+    print(f"{name:10} requests/page={requests:5}  median={statistics.median(timings):9.1f} ms  max={max(timings):9.1f} ms")
+
+
+async def seed(client, count):
+    for i in range(count):
+        await client.post("/teams", json={"name": f"bench-member-{i}", "email": f"bench{i}@example.com", "team": "bench"})
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Team page fan-out vs dashboard endpoint")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0, help="create this many team members first")
+    args = parser.parse_args()
+
+    today = datetime.utcnow().strftime("%Y-%m-%d")
+    async with httpx.AsyncClient(base_url=args.url, timeout=60) as client:
+        if args.seed:
+            await seed(client, args.seed)
+        await measure("fan-out", fan_out, client, today, args.runs)
+        await measure("dashboard", dashboard, client, today, args.runs)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,417 @@
+"""Presence stored as one document per member per month.
+
+    {"member_name": "ann", "month": 2024-03-01, "days": {"04": "present", "05": "absent"}}
+
+A month of marks costs one document, and one entry per index, instead of up
+to 31, so on multi-year histories the collection and its indexes are a
+fraction of the size. Marking a day is a single upsert of `days.<DD>`; the
+same find_one_and_update returns the previous status for the rollups and the
+change feed. Old months are moved to `presence_archive` by archive.py; when a
+month is first written again, its archived bucket is folded back in.
+
+`presence_rows` is a read-only view of the buckets in both tiers as the day
+records the API has always returned: {member_name, date, status}, plus a
+synthetic `_id` of member and date for keyset paging. It understands the
+filters the presence routes send (member_name, date or a date range, status)
+and the sort specs of pagination.Resource, so fetch_all(), fetch_page() and
+export_response() work on it as on a collection. Rows come out ordered by
+member and date; in that order (the default, or sorting by member) buckets
+are streamed and a page stops reading once it is full. Sorting by date or
+status reads every bucket the filter selects.
+
+Existing per-day documents are folded into buckets once at startup, or by hand.
+At startup the run is claimed in `job_runs` like a scheduler job, so with
+several workers or replicas only one process migrates; the others retry their
+startup until it is done. Once the run has failed SCHEDULER_MAX_ATTEMPTS times
+startup stops with MigrationFailed instead, until the job_runs document is
+reset by hand.
+
+    python buckets.py migrate
+"""
+import argparse
+import time
+from datetime import datetime
+
+from pymongo import UpdateOne
+from pymongo.errors import OperationFailure
+
+import dates
+import db
+import scheduler
+from archive import presence_tiers, sort_key
+from db import presence_archive_col, presence_col
+
+LEGACY_COLLECTION = "presence"
+MIGRATION_ID = "presence_buckets"
+MIGRATION_JOB = "presence_buckets_migration"
+NAMESPACE_NOT_FOUND = 26
+MIGRATION_BATCH_SIZE = 5000
+
+BUCKET_FIELDS = {"_id": 0, "member_name": 1, "month": 1, "days": 1}
+ROW_FIELDS = ("_id", "member_name", "date", "status")
+
+
+def month_of(day):
+    return datetime(day.year, day.month, 1)
+
+
+def day_key(day):
+    return f"{day.day:02d}"
+
+
+def bucket_key(member_name, day):
+    return {"member_name": member_name, "month": month_of(day)}
+
+
+def row_id(member_name, day):
+    # NUL sorts before any character, so ids order like (member, date)
+    return f"{member_name}\x00{day.date().isoformat()}"
+
+
+def upsert_op(member_name, day, status):
+    """Bulk operation marking one day"""
+    return UpdateOne(bucket_key(member_name, day), {"$set": {f"days.{day_key(day)}": status}}, upsert=True)
+
+
+# Filters on rows --------------------------------------------------------
+
+_OPERATORS = {
+    "$gt": lambda a, b: a is not None and a > b,
+    "$gte": lambda a, b: a is not None and a >= b,
+    "$lt": lambda a, b: a is not None and a < b,
+    "$lte": lambda a, b: a is not None and a <= b,
+    "$in": lambda a, b: a in b,
+    "$ne": lambda a, b: a != b,
+}
+
+
+def matches(row, filter):
+    """Evaluate the subset of MongoDB filter syntax the presence routes use"""
+    for field, condition in filter.items():
+        if field == "$and":
+            if not all(matches(row, f) for f in condition):
+                return False
+        elif field == "$or":
+            if not any(matches(row, f) for f in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = row.get(field)
+            if not all(_OPERATORS[op](value, operand) for op, operand in condition.items()):
+                return False
+        elif row.get(field) != condition:
+            return False
+    return True
+
+
+def _conjuncts(filter):
+    yield filter
+    for part in filter.get("$and", ()):
+        yield from _conjuncts(part)
+
+
+def bucket_filter(filter):
+    """Bucket query selecting every bucket that can hold a row matching `filter`"""
+    query = {}
+    members = {}
+    start = end = None
+    for part in _conjuncts(filter):
+        member = part.get("member_name")
+        if isinstance(member, dict):
+            members.update({k: v for k, v in member.items() if k in ("$in", "$gte", "$lte")})
+        elif member is not None:
+            members["$eq"] = member
+        day = part.get("date")
+        if isinstance(day, dict):
+            low = day.get("$gte", day.get("$gt"))
+            high = day.get("$lte", day.get("$lt"))
+            if "$in" in day and day["$in"]:
+                low, high = min(day["$in"]), max(day["$in"])
+        else:
+            low = high = day
+        if low is not None:
+            start = low if start is None else max(start, low)
+        if high is not None:
+            end = high if end is None else min(end, high)
+        # A keyset cursor on _id bounds the member name too
+        row_key = part.get("_id")
+        if isinstance(row_key, dict):
+            for op, bound in row_key.items():
+                name = bound.split("\x00")[0]
+                members["$gte" if op in ("$gt", "$gte") else "$lte"] = name
+    if members:
+        query["member_name"] = members["$eq"] if set(members) == {"$eq"} else members
+    if start is not None or end is not None:
+        query["month"] = {}
+        if start is not None:
+            query["month"]["$gte"] = month_of(start)
+        if end is not None:
+            query["month"]["$lte"] = month_of(end)
+    return query
+
+
+def expand(bucket, descending=False):
+    """Day rows of one bucket, in date order"""
+    month = bucket["month"]
+    member = bucket["member_name"]
+    rows = []
+    for key in sorted(bucket.get("days") or {}, reverse=descending):
+        day = month.replace(day=int(key))
+        rows.append({"_id": row_id(member, day), "member_name": member, "date": day, "status": bucket["days"][key]})
+    return rows
+
+
+def _project(row, projection):
+    if not projection:
+        return row
+    keep = {f for f, v in projection.items() if v}
+    if projection.get("_id", 1):
+        keep.add("_id")
+    return {f: row[f] for f in ROW_FIELDS if f in keep}
+
+
+def _merged(first, second):
+    """One bucket from a month found in both tiers; days written since archiving win"""
+    days = dict(second.get("days") or {})
+    days.update(first.get("days") or {})
+    return dict(first, days=days)
+
+
+class PresenceRows:
+    """Presence buckets in both tiers, read as one row per member per day"""
+
+    name = "presence"
+
+    async def find_batches(self, filter=None, projection=None, sort=None, batch_size=500):
+        filter = filter or {}
+        sort = list(sort or [("_id", 1)])
+        descending = sort[0][1] == -1
+        streamed = sort[0][0] in ("_id", "member_name")
+        buckets = presence_tiers.find_batches(
+            bucket_filter(filter), BUCKET_FIELDS,
+            sort=[("member_name", sort[0][1]), ("month", sort[0][1])], batch_size=batch_size
+        )
+        rows = []
+        pending = None
+        try:
+            async for batch in buckets:
+                for bucket in batch:
+                    if pending is not None and (pending["member_name"], pending["month"]) == (bucket["member_name"], bucket["month"]):
+                        pending = _merged(pending, bucket)
+                        continue
+                    if pending is not None:
+                        rows.extend(r for r in expand(pending, descending) if matches(r, filter))
+                    pending = bucket
+                if streamed and len(rows) >= batch_size:
+                    yield [_project(r, projection) for r in rows[:batch_size]]
+                    rows = rows[batch_size:]
+            if pending is not None:
+                rows.extend(r for r in expand(pending, descending) if matches(r, filter))
+        finally:
+            await buckets.aclose()
+        if not streamed:
+            key, reverse = sort_key(sort)
+            rows.sort(key=key, reverse=reverse)
+        for i in range(0, len(rows), batch_size):
+            yield [_project(r, projection) for r in rows[i:i + batch_size]]
+
+    async def find(self, filter=None, projection=None, sort=None, skip=0, limit=0):
+        docs = []
+        batches = self.find_batches(filter, projection, sort, batch_size=min(skip + limit, 1000) if limit else 1000)
+        try:
+            async for batch in batches:
+                docs.extend(batch)
+                if limit and len(docs) >= skip + limit:
+                    break
+        finally:
+            await batches.aclose()
+        return docs[skip:skip + limit] if limit else docs[skip:]
+
+
+presence_rows = PresenceRows()
+
+
+def sync_rows():
+    """Every day row in both tiers, for code already running off the loop"""
+    for col in (presence_col, presence_archive_col):
+        for bucket in col.sync.find({}, BUCKET_FIELDS):
+            yield from expand(bucket)
+
+
+# Writes -------------------------------------------------------------------
+
+async def _restore(member_name, day, skip_key=None):
+    """Fold the member's archived bucket for the month back into the hot tier; returns its days"""
+    key = bucket_key(member_name, day)
+    archived = await presence_archive_col.find_one_and_delete(key, {"_id": 0, "days": 1})
+    days = (archived or {}).get("days") or {}
+    restored = {f"days.{k}": v for k, v in days.items() if k != skip_key}
+    if restored:
+        await presence_col.update_one(key, {"$set": restored}, upsert=True)
+    return days
+
+
+async def mark(member_name, day, status):
+    """Set one day's status, creating it if needed; returns the previous status"""
+    key = day_key(day)
+    field = f"days.{key}"
+    previous = await presence_col.find_one_and_update(
+        bucket_key(member_name, day), {"$set": {field: status}}, projection={"_id": 0, field: 1}, upsert=True
+    )
+    if previous is None:
+        # First write to this month in the hot tier; it may have been archived
+        return (await _restore(member_name, day, skip_key=key)).get(key)
+    return (previous.get("days") or {}).get(key)
+
+
+async def update(member_name, day, status):
+    """Change an existing day's status; returns the previous status, None if there was no record"""
+    key = day_key(day)
+    field = f"days.{key}"
+    query = dict(bucket_key(member_name, day), **{field: {"$exists": True}})
+    previous = await presence_col.find_one_and_update(query, {"$set": {field: status}}, projection={"_id": 0, field: 1})
+    if previous is None:
+        if not await presence_archive_col.find_one(query, {"_id": 1}):
+            return None
+        await _restore(member_name, day)
+        previous = await presence_col.find_one_and_update(query, {"$set": {field: status}}, projection={"_id": 0, field: 1})
+        if previous is None:
+            return None
+    return (previous.get("days") or {}).get(key)
+
+
+async def unmark(member_name, day):
+    """Remove one day's record wherever it is; returns the previous status"""
+    key = day_key(day)
+    field = f"days.{key}"
+    query = dict(bucket_key(member_name, day), **{field: {"$exists": True}})
+    for col in (presence_col, presence_archive_col):
+        previous = await col.find_one_and_update(query, {"$unset": {field: ""}}, projection={"_id": 0, field: 1})
+        if previous is not None:
+            await col.delete_one(dict(bucket_key(member_name, day), days={}))
+            return (previous.get("days") or {}).get(key)
+    return None
+
+
+async def statuses(pairs):
+    """{(member_name, "YYYY-MM-DD"): status} for the given (member_name, date) pairs"""
+    if not pairs:
+        return {}
+    rows = await presence_rows.find(
+        {"member_name": {"$in": list({m for m, _ in pairs})}, "date": {"$in": list({d for _, d in pairs})}},
+        {"_id": 0, "member_name": 1, "date": 1, "status": 1}
+    )
+    return {(r["member_name"], dates.to_api(r["date"])): r["status"] for r in rows}
+
+
+async def restore_months(pairs):
+    """Before a bulk write: fold archived buckets for these (member_name, date) months back in"""
+    keys = {(m, month_of(d)) for m, d in pairs}
+    archived = await presence_archive_col.find(
+        {"$or": [{"member_name": m, "month": month} for m, month in keys]}, {"_id": 0, "member_name": 1, "month": 1}
+    )
+    for doc in archived:
+        await _restore(doc["member_name"], doc["month"])
+
+
+# Migration from one document per day ----------------------------------------
+
+def migrate(database=None):
+    """Fold the legacy per-day `presence` documents into monthly buckets.
+
+    Safe to re-run: each day is written with $set. When every document has
+    been copied the legacy collection is renamed to `presence_legacy`, so it
+    can be checked and dropped by hand.
+    """
+    database = database if database is not None else db.get_database()
+    started = time.perf_counter()
+    legacy = database[LEGACY_COLLECTION]
+    target = database[presence_col.name]
+    report = {"days": 0, "buckets": 0, "skipped": 0}
+
+    def flush(days_by_bucket):
+        if days_by_bucket:
+            target.bulk_write([
+                UpdateOne({"member_name": member, "month": month}, {"$set": days}, upsert=True)
+                for (member, month), days in days_by_bucket.items()
+            ], ordered=False)
+            report["buckets"] += len(days_by_bucket)
+
+    pending = {}
+    count = 0
+    # (member_name, date) order keeps each bucket's days together
+    for doc in legacy.find({}, {"_id": 0, "member_name": 1, "date": 1, "status": 1}, sort=[("member_name", 1), ("date", 1)]):
+        day = doc.get("date")
+        try:
+            day = dates.to_db(day) if isinstance(day, str) else day
+        except ValueError:
+            day = None
+        if not isinstance(day, datetime) or not doc.get("member_name"):
+            report["skipped"] += 1
+            continue
+        key = (doc["member_name"], month_of(day))
+        if count >= MIGRATION_BATCH_SIZE and key not in pending:
+            # Flush between buckets, so each bucket is written once
+            flush(pending)
+            pending, count = {}, 0
+        pending.setdefault(key, {})[f"days.{day_key(day)}"] = doc.get("status")
+        count += 1
+        report["days"] += 1
+    flush(pending)
+
+    if LEGACY_COLLECTION in database.list_collection_names():
+        name = "presence_legacy"
+        if name in database.list_collection_names():
+            name = f"presence_legacy_{datetime.utcnow():%Y%m%d%H%M%S}"
+        try:
+            legacy.rename(name)
+            report["legacy_collection"] = name
+        except OperationFailure as e:
+            # Renamed by a run that took over after our lease expired
+            if e.code != NAMESPACE_NOT_FOUND:
+                raise
+    report["duration_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    database["migrations"].update_one(
+        {"_id": MIGRATION_ID},
+        {"$set": {"finished_at": datetime.utcnow(), "report": report}},
+        upsert=True
+    )
+    return report
+
+
+class MigrationFailed(Exception):
+    """The migration is out of attempts; retrying startup cannot help"""
+
+
+def migrate_once(database=None):
+    """Run migrate() unless it has already completed; used at startup"""
+    database = database if database is not None else db.get_database()
+    if database["migrations"].find_one({"_id": MIGRATION_ID}):
+        return None
+    if not scheduler.claim_run(MIGRATION_JOB, "once"):
+        run_id = f"{MIGRATION_JOB}:once"
+        run = scheduler.runs_col.sync.find_one({"_id": run_id}) or {}
+        live = run.get("status") == "running" and run.get("lease_until", datetime.min) > datetime.utcnow()
+        if run.get("status") != "done" and not live and run.get("attempts", 0) >= scheduler.SCHEDULER_MAX_ATTEMPTS:
+            raise MigrationFailed(
+                f"presence bucket migration failed {run['attempts']} times (last error: {run.get('error')}); "
+                f"fix the cause, then delete job_runs document {run_id!r} and restart")
+        raise RuntimeError(f"presence bucket migration is running in another process (job_runs {run_id})")
+    try:
+        report = migrate(database)
+    except Exception as e:
+        scheduler.finish_run(MIGRATION_JOB, "once", error=e)
+        raise
+    scheduler.finish_run(MIGRATION_JOB, "once", result=report)
+    print(f"Presence bucket migration: {report}")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fold per-day presence documents into monthly buckets")
+    parser.add_argument("command", choices=["migrate"])
+    parser.parse_args()
+    print(migrate())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""Unordered bulk writes with per-item results.
+
+Each batch endpoint turns its validated items into pymongo write operations
+and sends them in one unordered bulk_write, so a bad item does not stop the
+rest. The result lists every item by its position in the request.
+"""
+from fastapi import HTTPException
+from pymongo import InsertOne
+from pymongo.errors import BulkWriteError
+
+BULK_MAX_ITEMS = 1000
+
+
+def check_size(items):
+    if not items:
+        raise HTTPException(status_code=400, detail="No items to write")
+    if len(items) > BULK_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {BULK_MAX_ITEMS} items per request")
+
+
+async def bulk_apply(col, operations):
+    """Run `operations` unordered; returns {"summary": ..., "results": [...]}"""
+    errors = {}
+    try:
+        result = await col.bulk_write(operations, ordered=False)
+        details = result.bulk_api_result
+    except BulkWriteError as e:
+        details = e.details
+        for error in details.get("writeErrors", []):
+            errors[error["index"]] = error.get("errmsg", "write failed")
+
+    upserted = {u["index"] for u in details.get("upserted", [])}
+    results = []
+    for index, op in enumerate(operations):
+        if index in errors:
+            results.append({"index": index, "status": "error", "error": errors[index]})
+        elif isinstance(op, InsertOne) or index in upserted:
+            results.append({"index": index, "status": "created"})
+        else:
+            results.append({"index": index, "status": "updated"})
+    summary = {
+        "created": details.get("nInserted", 0) + details.get("nUpserted", 0),
+        "updated": details.get("nMatched", 0),
+        "errors": len(errors)
+    }
+    return {"summary": summary, "results": results}
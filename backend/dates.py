@@ -0,0 +1,139 @@
+"""Calendar dates stored as native BSON dates.
+
+Task, leave and presence dates go over the API as "YYYY-MM-DD" strings and
+are stored as midnight-UTC BSON dates, so range filters compare dates instead
+of strings and the compound indexes in indexes.py can serve them. Convert
+with to_db() on the way in (documents and query filters) and to_api() on the
+way out. Daily tasks keep their string `date`.
+
+Existing string dates are converted once by migrate(), which startup runs
+until it has completed and which can also be run by hand:
+
+    python dates.py migrate
+"""
+import argparse
+import time
+from datetime import date, datetime
+from typing import Annotated
+
+from fastapi import HTTPException
+from pydantic import AfterValidator
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+import db
+
+# collection -> stored date fields
+DATE_FIELDS = {
+    "tasks": ("startdate", "enddate"),
+    "leaves": ("start_date", "end_date"),
+    # Legacy per-day presence, before buckets.migrate() folds it into buckets
+    "presence": ("date",),
+}
+
+MIGRATION_ID = "native_dates"
+MIGRATION_BATCH_SIZE = 1000
+
+
+def _iso(value):
+    return date.fromisoformat(value).isoformat()
+
+
+# "YYYY-MM-DD" in request bodies; anything else is a 422
+DateStr = Annotated[str, AfterValidator(_iso)]
+
+
+def to_db(value):
+    """"YYYY-MM-DD", date or datetime -> midnight datetime; None stays None"""
+    if value is None or isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day)
+    return datetime.fromisoformat(str(value)[:10])
+
+
+def to_api(value):
+    """Stored date -> "YYYY-MM-DD"; unconverted strings pass through"""
+    if isinstance(value, datetime):
+        # Several times faster than strftime; this runs per document on reads
+        return value.date().isoformat()
+    return value
+
+
+def param(value, name="date"):
+    """Parse an optional query parameter, or 400"""
+    if not value:
+        return None
+    try:
+        return to_db(_iso(value))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{name} must be a date in YYYY-MM-DD format")
+
+
+def migrate(database=None):
+    """Convert every remaining string date to a BSON date.
+
+    Only string values are touched, so it is safe to run again or from
+    several processes at once. Values that are not ISO dates are left as they
+    are and counted under `skipped`.
+    """
+    database = database if database is not None else db.get_database()
+    started = time.perf_counter()
+    report = {"converted": {}, "skipped": {}}
+    for name, fields in DATE_FIELDS.items():
+        col = database[name]
+        for field in fields:
+            converted = skipped = 0
+            batch = []
+            for doc in col.find({field: {"$type": "string"}}, {field: 1}):
+                try:
+                    value = to_db(doc[field])
+                except ValueError:
+                    skipped += 1
+                    continue
+                batch.append(UpdateOne({"_id": doc["_id"], field: doc[field]}, {"$set": {field: value}}))
+                if len(batch) >= MIGRATION_BATCH_SIZE:
+                    converted += _apply(col, batch)
+                    batch = []
+            if batch:
+                converted += _apply(col, batch)
+            report["converted"][f"{name}.{field}"] = converted
+            report["skipped"][f"{name}.{field}"] = skipped
+    report["duration_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    database["migrations"].update_one(
+        {"_id": MIGRATION_ID},
+        {"$set": {"finished_at": datetime.utcnow(), "report": report}},
+        upsert=True
+    )
+    return report
+
+
+def _apply(col, batch):
+    try:
+        return col.bulk_write(batch, ordered=False).modified_count
+    except BulkWriteError as e:
+        # e.g. two spellings of the same day for one member hitting the
+        # presence unique index; those documents keep their string date
+        print(f"Could not convert {len(e.details.get('writeErrors', []))} dates in {col.name}")
+        return e.details.get("nModified", 0)
+
+
+def migrate_once(database=None):
+    """Run migrate() unless it has already completed; used at startup"""
+    database = database if database is not None else db.get_database()
+    if database["migrations"].find_one({"_id": MIGRATION_ID}):
+        return None
+    report = migrate(database)
+    print(f"Date migration: {report}")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert stored string dates to BSON dates")
+    parser.add_argument("command", choices=["migrate"])
+    parser.parse_args()
+    print(migrate())
+
+
+if __name__ == "__main__":
+    main()
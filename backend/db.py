@@ -0,0 +1,217 @@
+"""Data-access layer.
+
+Routes only ever see AsyncCollection, which forwards to a pymongo-style
+collection from the engine chosen by DB_ENGINE: "mongo" (the default) or
+"sqlite", an embedded engine for single-node installs, tests and benchmarks
+that need no database server (see sqlite_engine.py).
+
+pymongo is a blocking driver, so every call made from a route is pushed onto a
+bounded thread pool instead of running on the uvicorn event loop. The pool has
+as many threads as the Mongo connection pool has sockets, so a worker thread
+never sits waiting for a connection while holding an executor slot.
+"""
+import asyncio
+import itertools
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from dotenv import load_dotenv
+from pymongo import MongoClient, ReturnDocument
+
+import metrics
+
+load_dotenv()
+
+DB_ENGINE = os.getenv("DB_ENGINE", "mongo")
+MONGO_URL = os.getenv("MONGO_URL", "mongodb:27017")
+MONGO_DB_NAME = os.getenv("MONGO_DB_NAME", "task_manager")
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", 50))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", 0))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", 5000))
+DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", MONGO_MAX_POOL_SIZE))
+MONGO_CONNECT_BASE_DELAY = float(os.getenv("MONGO_CONNECT_BASE_DELAY", 0.5))
+MONGO_CONNECT_MAX_DELAY = float(os.getenv("MONGO_CONNECT_MAX_DELAY", 30))
+
+_client = None
+# Only touched from the event loop, so no locking is needed. The same goes
+# for the other counters, caches and queues kept in module state by the
+# request path (passwords, response_cache, admission)
+_pending = 0
+_executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_WORKERS, thread_name_prefix="mongo")
+
+
+def create_client():
+    if DB_ENGINE == "sqlite":
+        import sqlite_engine
+        return sqlite_engine.SQLiteClient(sqlite_engine.SQLITE_PATH)
+    return MongoClient(
+        MONGO_URL,
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+        waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        serverSelectionTimeoutMS=5000,
+        connectTimeoutMS=5000,
+        socketTimeoutMS=5000
+    )
+
+
+async def connect():
+    """Wait until the database answers a ping, backing off between attempts.
+
+    Pings run on the database pool and the waits are asyncio sleeps, so the
+    event loop keeps serving (e.g. health checks) while MongoDB is down. Retries
+    until it succeeds; callers that need a deadline wrap it in wait_for().
+    """
+    delay = MONGO_CONNECT_BASE_DELAY
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            await run(get_client().admin.command, 'ping')
+            print("Successfully connected to SQLite" if DB_ENGINE == "sqlite" else "Successfully connected to MongoDB")
+            return get_client()
+        except Exception as e:
+            print(f"MongoDB connection attempt {attempt} failed: {e}; retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, MONGO_CONNECT_MAX_DELAY)
+
+
+async def ping():
+    await run(get_client().admin.command, 'ping')
+
+
+def get_client():
+    global _client
+    if _client is None:
+        _client = create_client()
+    return _client
+
+
+def get_database():
+    return get_client()[MONGO_DB_NAME]
+
+
+async def run(fn, *args, **kwargs):
+    """Run a blocking driver call on the database thread pool"""
+    global _pending
+    loop = asyncio.get_running_loop()
+    _pending += 1
+    try:
+        return await loop.run_in_executor(_executor, partial(fn, *args, **kwargs))
+    finally:
+        _pending -= 1
+
+
+def pending():
+    """Calls running on the database pool or waiting for a thread"""
+    return _pending
+
+
+class AsyncCollection:
+    """Awaitable wrapper around a pymongo collection.
+
+    Cursor-returning methods are drained inside the worker thread and return
+    plain lists, so no blocking iteration ever happens on the event loop.
+    The underlying collection is resolved on each call, which keeps the
+    wrapper valid if the client is (re)created after import.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    async def _run(self, operation, fn, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await run(fn, *args, **kwargs)
+        finally:
+            metrics.record_mongo(self.name, operation, time.perf_counter() - started)
+
+    @property
+    def sync(self):
+        """The plain (pymongo or SQLite) collection, for code already running off the loop"""
+        return get_database()[self.name]
+
+    async def find(self, filter=None, projection=None, sort=None, skip=0, limit=0):
+        def _find():
+            cursor = self.sync.find(filter or {}, projection)
+            if sort:
+                cursor = cursor.sort(sort)
+            if skip:
+                cursor = cursor.skip(skip)
+            if limit:
+                cursor = cursor.limit(limit)
+            return list(cursor)
+        return await self._run("find", _find)
+
+    async def find_batches(self, filter=None, projection=None, sort=None, batch_size=500):
+        """Yield the result in lists of up to batch_size documents.
+
+        Only one batch is held in memory at a time, so callers can stream
+        arbitrarily large results.
+        """
+        cursor = await self._run("find", lambda: self.sync.find(filter or {}, projection, sort=sort, batch_size=batch_size))
+        try:
+            while True:
+                batch = await self._run("get_more", lambda: list(itertools.islice(cursor, batch_size)))
+                if not batch:
+                    break
+                yield batch
+        finally:
+            await self._run("close_cursor", cursor.close)
+
+    async def find_one(self, filter, projection=None):
+        return await self._run("find_one", self.sync.find_one, filter, projection)
+
+    async def insert_one(self, document):
+        return await self._run("insert_one", self.sync.insert_one, document)
+
+    async def insert_many(self, documents, ordered=True):
+        return await self._run("insert_many", self.sync.insert_many, documents, ordered=ordered)
+
+    async def update_one(self, filter, update, upsert=False):
+        return await self._run("update_one", self.sync.update_one, filter, update, upsert=upsert)
+
+    async def update_many(self, filter, update, upsert=False):
+        return await self._run("update_many", self.sync.update_many, filter, update, upsert=upsert)
+
+    async def find_one_and_update(self, filter, update, projection=None, upsert=False, return_document=ReturnDocument.BEFORE):
+        return await self._run("find_one_and_update", self.sync.find_one_and_update, filter, update, projection,
+                               upsert=upsert, return_document=return_document)
+
+    async def find_one_and_delete(self, filter, projection=None):
+        return await self._run("find_one_and_delete", self.sync.find_one_and_delete, filter, projection)
+
+    async def delete_one(self, filter):
+        return await self._run("delete_one", self.sync.delete_one, filter)
+
+    async def delete_many(self, filter):
+        return await self._run("delete_many", self.sync.delete_many, filter)
+
+    async def count_documents(self, filter):
+        return await self._run("count_documents", self.sync.count_documents, filter)
+
+    async def aggregate(self, pipeline):
+        return await self._run("aggregate", lambda: list(self.sync.aggregate(pipeline)))
+
+    async def bulk_write(self, requests, ordered=True):
+        return await self._run("bulk_write", self.sync.bulk_write, requests, ordered=ordered)
+
+
+users_col = AsyncCollection('users')
+tasks_col = AsyncCollection('tasks')
+daily_col = AsyncCollection('daily')
+team_col = AsyncCollection('teams')
+leaves_col = AsyncCollection('leaves')
+# One document per member per month, see buckets.py
+presence_col = AsyncCollection('presence_buckets')
+# Old history moved out of daily and presence_buckets, see archive.py
+daily_archive_col = AsyncCollection('daily_archive')
+presence_archive_col = AsyncCollection('presence_archive')
+
+
+def shutdown():
+    _executor.shutdown(wait=False)
+    if _client is not None:
+        _client.close()
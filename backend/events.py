@@ -0,0 +1,157 @@
+"""Change feed for tasks, daily tasks, teams, presence and leaves.
+
+Write routes call publish() after a successful write. Each event gets a
+sequence number from an atomic counter and is stored in the `events`
+collection (expired after EVENT_RETENTION_HOURS), so every API worker sees
+every event and a reconnecting client can resume from the last sequence it
+received. The sequence number is the resume token: it is sent as the SSE
+`id`, and browsers send it back as Last-Event-ID when they reconnect.
+
+Local writes wake this worker's streams immediately. Events written by other
+workers are picked up by polling every EVENT_POLL_SECONDS. Sequence numbers
+are taken before the insert, so two workers can commit out of order. A
+reader stops at a gap and waits up to EVENT_GAP_WAIT seconds for the missing
+event to appear before it skips the gap.
+"""
+import asyncio
+import json
+import os
+from datetime import datetime, timedelta
+
+from pymongo import ReturnDocument
+
+import db
+
+EVENT_RETENTION_HOURS = int(os.getenv("EVENT_RETENTION_HOURS", 24))
+EVENT_POLL_SECONDS = float(os.getenv("EVENT_POLL_SECONDS", 1))
+EVENT_GAP_WAIT = float(os.getenv("EVENT_GAP_WAIT", 2))
+EVENT_HEARTBEAT_SECONDS = 15
+EVENT_BATCH_SIZE = 500
+
+RESOURCES = ("tasks", "daily", "teams", "presence", "leaves")
+
+events_col = db.AsyncCollection('events')
+counters_col = db.AsyncCollection('counters')
+
+_listeners = set()
+
+
+async def _reserve(resource, count):
+    """Reserve `count` consecutive sequence numbers; returns the first one.
+
+    Also bumps the resource's version, which response_cache uses for ETags.
+    """
+    doc = await counters_col.find_one_and_update(
+        {"_id": "events"},
+        {"$inc": {"seq": count, f"versions.{resource}": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return doc["seq"] - count + 1
+
+
+def _notify():
+    for listener in list(_listeners):
+        listener.set()
+
+
+async def publish_many(resource, changes):
+    """Store [(action, key, data)] changes for `resource` as events"""
+    if not changes:
+        return
+    first = await _reserve(resource, len(changes))
+    now = datetime.utcnow()
+    docs = [
+        {"seq": first + i, "ts": now, "resource": resource, "action": action, "key": key, "data": data}
+        for i, (action, key, data) in enumerate(changes)
+    ]
+    await events_col.insert_many(docs)
+    _notify()
+
+
+async def publish(resource, action, key, data=None):
+    await publish_many(resource, [(action, key, data)])
+
+
+async def latest_seq():
+    doc = await counters_col.find_one({"_id": "events"})
+    return doc["seq"] if doc else 0
+
+
+async def versions():
+    """{resource: version}; a resource's version changes on every write to it"""
+    doc = await counters_col.find_one({"_id": "events"}, {"_id": 0, "versions": 1})
+    return doc.get("versions", {}) if doc else {}
+
+
+async def oldest_seq():
+    docs = await events_col.find({}, {"_id": 0, "seq": 1}, sort=[("seq", 1)], limit=1)
+    return docs[0]["seq"] if docs else None
+
+
+async def read_since(last_seq, resources=None, limit=EVENT_BATCH_SIZE):
+    """Events after last_seq in order, stopping at a recent gap.
+
+    Returns (events, new_last_seq). Events of resources the caller did not
+    ask for still advance new_last_seq.
+    """
+    docs = await events_col.find({"seq": {"$gt": last_seq}}, {"_id": 0}, sort=[("seq", 1)], limit=limit)
+    cutoff = datetime.utcnow() - timedelta(seconds=EVENT_GAP_WAIT)
+    out = []
+    for doc in docs:
+        if doc["seq"] != last_seq + 1 and doc["ts"] > cutoff:
+            break
+        last_seq = doc["seq"]
+        if resources is None or doc["resource"] in resources:
+            out.append(doc)
+    return out, last_seq
+
+
+def format_sse(event_type, data, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event_type}")
+    lines.append(f"data: {json.dumps(data, default=str)}")
+    return "\n".join(lines) + "\n\n"
+
+
+async def stream(since=None, resources=None):
+    """Yield SSE frames from `since` (or from now) until the client disconnects"""
+    wakeup = asyncio.Event()
+    _listeners.add(wakeup)
+    try:
+        latest = await latest_seq()
+        last_seq = latest if since is None else since
+        if since is not None and since < latest:
+            oldest = await oldest_seq()
+            if oldest is None or since < oldest - 1:
+                # Events the client missed have expired; it must refetch
+                last_seq = latest
+                yield format_sse("reset", {"reason": "resume token expired"}, last_seq)
+        yield format_sse("ready", {"seq": last_seq}, last_seq)
+        idle = 0.0
+        while True:
+            wakeup.clear()
+            batch, new_seq = await read_since(last_seq, resources)
+            for event in batch:
+                yield format_sse(event["resource"], {
+                    "seq": event["seq"],
+                    "action": event["action"],
+                    "key": event["key"],
+                    "data": event.get("data")
+                }, event["seq"])
+            progressed = new_seq != last_seq
+            last_seq = new_seq
+            if progressed:
+                idle = 0.0
+                continue
+            try:
+                await asyncio.wait_for(wakeup.wait(), EVENT_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                idle += EVENT_POLL_SECONDS
+            if idle >= EVENT_HEARTBEAT_SECONDS:
+                idle = 0.0
+                yield ": keep-alive\n\n"
+    finally:
+        _listeners.discard(wakeup)
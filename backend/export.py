@@ -0,0 +1,56 @@
+"""Streaming export of list data as NDJSON or CSV.
+
+Rows are read from Mongo in batches and encoded batch by batch, so an export
+of any size uses constant memory and the first bytes go out as soon as the
+first batch arrives.
+"""
+import csv
+import io
+
+import orjson
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+EXPORT_BATCH_SIZE = 1000
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+async def _ndjson(batches, resource, selected):
+    convert = resource.converter(selected)
+    async for batch in batches:
+        yield b"".join(orjson.dumps(convert(doc), default=str) + b"\n" for doc in batch)
+
+
+async def _csv(batches, resource, selected):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(selected)
+    convert = resource.converter(selected)
+    async for batch in batches:
+        for doc in batch:
+            item = convert(doc)
+            writer.writerow(["" if item[f] is None else item[f] for f in selected])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    # Header-only export when nothing matched
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def export_response(col, resource, query, name, format="ndjson", fields=None, sort=None):
+    """Stream every document matching `query` in the requested format"""
+    if format not in MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="format must be ndjson or csv")
+    selected = resource.select(fields)
+    batches = col.find_batches(query, resource.projection(selected), sort=resource.sort_spec(sort), batch_size=EXPORT_BATCH_SIZE)
+    encode = _csv if format == "csv" else _ndjson
+    return StreamingResponse(
+        encode(batches, resource, selected),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{name}.{format}"'}
+    )
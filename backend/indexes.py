@@ -0,0 +1,205 @@
+"""Index declarations and query-plan reporting.
+
+INDEXES lists every index the routes rely on. ensure_indexes() runs at
+startup and is idempotent. QUERY_SHAPES lists the filters the routes actually
+send, so explain_queries() can flag any of them that falls back to a
+collection scan.
+
+    python indexes.py create            # create/verify all indexes
+    python indexes.py report            # explain every query shape
+    python indexes.py slow --slowms 50  # enable the profiler and list slow queries
+"""
+import argparse
+import json
+from datetime import datetime, timedelta
+
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel
+from pymongo.errors import OperationFailure
+
+import db
+from events import EVENT_RETENTION_HOURS
+
+INDEXES = {
+    "users": [
+        IndexModel([("username", ASCENDING)], name="username_unique", unique=True),
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+    ],
+    "tasks": [
+        IndexModel([("sendReminder", ASCENDING), ("enddate", ASCENDING)], name="reminder_due"),
+        IndexModel([("assign", ASCENDING), ("status", ASCENDING)], name="assign_status"),
+        IndexModel([("status", ASCENDING)], name="status"),
+        IndexModel([("taskname", ASCENDING)], name="taskname"),
+        IndexModel([("startdate", ASCENDING), ("enddate", ASCENDING)], name="date_range"),
+        IndexModel([("taskname", TEXT)], name="text", default_language="english"),
+    ],
+    "daily": [
+        IndexModel([("name", ASCENDING)], name="name"),
+        IndexModel([("assign", ASCENDING), ("date", ASCENDING)], name="assign_date"),
+        IndexModel([("date", ASCENDING)], name="date"),
+        # Weights match search.SOURCES
+        IndexModel([("name", TEXT), ("description", TEXT)], name="text", weights={"name": 3, "description": 1},
+                   default_language="english"),
+    ],
+    # Same shape and lookups as daily, for history moved by archive.py
+    "daily_archive": [
+        IndexModel([("name", ASCENDING)], name="name"),
+        IndexModel([("date", ASCENDING)], name="date"),
+        IndexModel([("name", TEXT), ("description", TEXT)], name="text", weights={"name": 3, "description": 1},
+                   default_language="english"),
+    ],
+    "teams": [
+        IndexModel([("name", ASCENDING)], name="name_unique", unique=True),
+        IndexModel([("team", ASCENDING)], name="team"),
+    ],
+    "leaves": [
+        IndexModel([("member_name", ASCENDING), ("start_date", ASCENDING)], name="member_start"),
+        IndexModel([("member_name", ASCENDING), ("status", ASCENDING)], name="member_status"),
+        IndexModel([("status", ASCENDING)], name="status"),
+        # Overlap queries bound start_date on both sides (see availability.py)
+        IndexModel([("start_date", ASCENDING), ("end_date", ASCENDING)], name="interval"),
+    ],
+    # One document per member per month, see buckets.py
+    "presence_buckets": [
+        IndexModel([("member_name", ASCENDING), ("month", ASCENDING)], name="member_month_unique", unique=True),
+        IndexModel([("month", ASCENDING), ("member_name", ASCENDING)], name="month_member"),
+    ],
+    "presence_archive": [
+        IndexModel([("member_name", ASCENDING), ("month", ASCENDING)], name="member_month_unique", unique=True),
+        IndexModel([("month", ASCENDING), ("member_name", ASCENDING)], name="month_member"),
+    ],
+    "rollups": [
+        IndexModel([("kind", ASCENDING), ("scope", ASCENDING), ("key", ASCENDING), ("period", ASCENDING)], name="series"),
+        IndexModel([("kind", ASCENDING), ("scope", ASCENDING), ("period", ASCENDING)], name="scope_period"),
+    ],
+    "events": [
+        IndexModel([("seq", ASCENDING)], name="seq_unique", unique=True),
+        IndexModel([("ts", ASCENDING)], name="ts_ttl", expireAfterSeconds=EVENT_RETENTION_HOURS * 3600),
+    ],
+    "job_runs": [
+        IndexModel([("started_at", DESCENDING)], name="started_at"),
+    ],
+    "mail_queue": [
+        IndexModel([("status", ASCENDING), ("next_attempt_at", ASCENDING)], name="status_due"),
+    ],
+}
+
+
+def _today():
+    return datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _tomorrow():
+    return _today() + timedelta(days=1)
+
+
+def _month():
+    return _today().replace(day=1)
+
+
+# (collection, description, filter) for the queries the routes send
+QUERY_SHAPES = [
+    ("users", "login / register by username", lambda: {"username": "x"}),
+    ("users", "register / forgot password by email", lambda: {"email": "x"}),
+    ("tasks", "reminders due tomorrow", lambda: {"sendReminder": True, "enddate": _tomorrow()}),
+    ("tasks", "GET /tasks?assign&status", lambda: {"assign": "x", "status": "x"}),
+    ("tasks", "GET /tasks?status", lambda: {"status": "x"}),
+    ("tasks", "PUT/DELETE /tasks/{taskname}", lambda: {"taskname": "x"}),
+    ("tasks", "GET /tasks?startdate&enddate", lambda: {"startdate": {"$gte": _today()}, "enddate": {"$lte": _tomorrow()}}),
+    ("daily", "PUT/DELETE /daily/{taskname}", lambda: {"name": "x"}),
+    ("daily", "GET /daily?start_date&end_date, archiving", lambda: {"date": {"$gte": "2024-01-01", "$lte": "2024-01-31"}}),
+    ("daily_archive", "PUT/DELETE /daily/{taskname} (archived)", lambda: {"name": "x"}),
+    ("tasks", "GET /search (tasks)", lambda: {"$text": {"$search": "x"}}),
+    ("daily", "GET /search (daily)", lambda: {"$text": {"$search": "x"}}),
+    ("teams", "member lookup by name", lambda: {"name": "x"}),
+    ("teams", "reminder email lookup", lambda: {"name": {"$in": ["x", "y"]}}),
+    ("leaves", "PUT/DELETE /leaves/{member}/{start}", lambda: {"member_name": "x", "start_date": _today()}),
+    ("leaves", "GET /leaves?member_name&status", lambda: {"member_name": "x", "status": "approved"}),
+    ("leaves", "GET /availability (leaves)", lambda: {"start_date": {"$gte": _today() - timedelta(days=30), "$lte": _tomorrow()},
+                                                      "end_date": {"$gte": _today()}, "status": {"$in": ["approved", "pending"]}}),
+    ("presence_buckets", "GET /presence?member_name&date, marking", lambda: {"member_name": "x", "month": _month()}),
+    ("presence_buckets", "GET /presence?date, /availability (absences)", lambda: {"month": {"$gte": _month(), "$lte": _month()}}),
+    ("presence_archive", "GET /presence?member_name (archived)", lambda: {"member_name": "x"}),
+    ("mail_queue", "mail worker claim", lambda: {"status": "pending", "next_attempt_at": {"$lte": datetime.utcnow()}}),
+]
+
+
+def ensure_indexes(database=None):
+    """Create every declared index; returns {collection: [created names]}"""
+    database = database if database is not None else db.get_database()
+    created = {}
+    for name, models in INDEXES.items():
+        col = database[name]
+        created[name] = []
+        for model in models:
+            try:
+                created[name].extend(col.create_indexes([model]))
+            except OperationFailure as e:
+                # Usually existing duplicates blocking a unique index
+                print(f"Could not create index {model.document['name']} on {name}: {e}")
+    return created
+
+
+def _stages(plan):
+    stages = [plan.get("stage")]
+    if "inputStage" in plan:
+        stages.extend(_stages(plan["inputStage"]))
+    for child in plan.get("inputStages", []):
+        stages.extend(_stages(child))
+    return [s for s in stages if s]
+
+
+def explain_queries(database=None):
+    """Explain every query shape and report the winning plan"""
+    database = database if database is not None else db.get_database()
+    report = []
+    for name, description, make_filter in QUERY_SHAPES:
+        explain = database[name].find(make_filter()).explain()
+        winning = explain.get("queryPlanner", {}).get("winningPlan", {})
+        # Newer servers nest the classic plan under queryPlan
+        winning = winning.get("queryPlan", winning)
+        stats = explain.get("executionStats", {})
+        stages = _stages(winning)
+        report.append({
+            "collection": name,
+            "query": description,
+            "stages": stages,
+            "unindexed": "COLLSCAN" in stages,
+            "docs_examined": stats.get("totalDocsExamined"),
+            "keys_examined": stats.get("totalKeysExamined"),
+            "execution_ms": stats.get("executionTimeMillis")
+        })
+    return report
+
+
+def slow_queries(database=None, limit=20):
+    """Most recent entries from the database profiler, if it is enabled"""
+    database = database if database is not None else db.get_database()
+    entries = database["system.profile"].find(
+        {"ns": {"$ne": f"{database.name}.system.profile"}},
+        {"_id": 0, "op": 1, "ns": 1, "millis": 1, "planSummary": 1, "docsExamined": 1, "keysExamined": 1, "ts": 1}
+    ).sort("ts", -1).limit(limit)
+    return list(entries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage indexes and inspect query plans")
+    parser.add_argument("command", choices=["create", "report", "slow"])
+    parser.add_argument("--slowms", type=int, default=100, help="profiler threshold for the slow command")
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    database = db.get_database()
+    if args.command == "create":
+        print(json.dumps(ensure_indexes(database), indent=2))
+    elif args.command == "report":
+        for row in explain_queries(database):
+            flag = "UNINDEXED" if row["unindexed"] else "ok"
+            print(f"{flag:9} {row['collection']:10} {row['query']:40} {'>'.join(row['stages'])} "
+                  f"docs={row['docs_examined']} keys={row['keys_examined']} ms={row['execution_ms']}")
+    else:
+        database.command("profile", 1, slowms=args.slowms)
+        print(json.dumps(slow_queries(database, args.limit), indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
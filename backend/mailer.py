@@ -0,0 +1,256 @@
+"""Outbound email queue.
+
+Routes and jobs never talk to the SMTP server themselves. They insert a
+message into the `mail_queue` collection and return. A single worker thread
+claims queued messages in batches and delivers them over one authenticated
+SMTP session, which stays open between batches until it has been idle for
+MAIL_IDLE_TIMEOUT seconds. Failed deliveries are retried with exponential
+backoff until MAIL_MAX_ATTEMPTS is reached.
+
+For local testing point it at an aiosmtpd stand-in:
+
+    python -m aiosmtpd -n -l localhost:8025
+    SMTP_SERVER=localhost SMTP_PORT=8025 SMTP_USE_SSL=false SMTP_USER=dev@localhost
+"""
+import os
+import smtplib
+import threading
+import time
+from datetime import datetime, timedelta
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError
+
+import db
+import metrics
+
+SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", 465))
+SMTP_USER = os.getenv("SMTP_USER")
+SMTP_PASS = os.getenv("SMTP_PASS")
+SMTP_USE_SSL = os.getenv("SMTP_USE_SSL", "true").lower() == "true"
+
+MAIL_BATCH_SIZE = int(os.getenv("MAIL_BATCH_SIZE", 50))
+MAIL_MAX_ATTEMPTS = int(os.getenv("MAIL_MAX_ATTEMPTS", 5))
+MAIL_RETRY_BASE_SECONDS = int(os.getenv("MAIL_RETRY_BASE_SECONDS", 30))
+MAIL_POLL_SECONDS = float(os.getenv("MAIL_POLL_SECONDS", 5))
+MAIL_IDLE_TIMEOUT = float(os.getenv("MAIL_IDLE_TIMEOUT", 30))
+# A claimed message whose worker died is picked up again after this long
+MAIL_LOCK_SECONDS = int(os.getenv("MAIL_LOCK_SECONDS", 300))
+
+mail_queue_col = db.AsyncCollection('mail_queue')
+_wakeup = threading.Event()
+
+
+def mail_enabled():
+    return bool(SMTP_USER)
+
+
+def _message_doc(to_email, subject, body):
+    now = datetime.utcnow()
+    return {
+        "to": to_email,
+        "subject": subject,
+        "body": body,
+        "status": "pending",
+        "attempts": 0,
+        "next_attempt_at": now,
+        "created_at": now
+    }
+
+
+def queue_email(to_email, subject, body):
+    """Queue an email from synchronous code (scheduler jobs, worker threads)"""
+    if not mail_enabled():
+        print("SMTP credentials not set, skipping email")
+        return
+    mail_queue_col.sync.insert_one(_message_doc(to_email, subject, body))
+    _wakeup.set()
+
+
+def queue_emails(messages, keys=None):
+    """Queue many (to_email, subject, body) messages with one insert.
+
+    With `keys`, each message is stored under its idempotency key as `_id`
+    and messages whose key was queued before are skipped. Returns the number
+    of messages queued.
+    """
+    if not mail_enabled():
+        print("SMTP credentials not set, skipping email")
+        return 0
+    if not messages:
+        return 0
+    docs = [_message_doc(*m) for m in messages]
+    if keys is not None:
+        for doc, key in zip(docs, keys):
+            doc["_id"] = key
+    try:
+        queued = len(mail_queue_col.sync.insert_many(docs, ordered=False).inserted_ids)
+    except BulkWriteError as e:
+        if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+            raise
+        queued = e.details.get("nInserted", 0)
+    if queued:
+        _wakeup.set()
+    return queued
+
+
+async def enqueue_email(to_email, subject, body):
+    """Queue an email from a route without waiting for delivery"""
+    if not mail_enabled():
+        print("SMTP credentials not set, skipping email")
+        return
+    await mail_queue_col.insert_one(_message_doc(to_email, subject, body))
+    _wakeup.set()
+
+
+async def enqueue_emails(messages):
+    """Queue many (to_email, subject, body) messages from a route with one insert"""
+    if not mail_enabled():
+        print("SMTP credentials not set, skipping email")
+        return
+    if not messages:
+        return
+    await mail_queue_col.insert_many([_message_doc(*m) for m in messages])
+    _wakeup.set()
+
+
+def build_message(to_email, subject, body):
+    msg = MIMEMultipart()
+    msg['From'] = SMTP_USER
+    msg['To'] = to_email
+    msg['Subject'] = subject
+    msg.attach(MIMEText(body, 'plain'))
+    return msg.as_string()
+
+
+class MailWorker(threading.Thread):
+    """Delivers queued messages over a reused SMTP session"""
+
+    def __init__(self):
+        super().__init__(name="mail-worker", daemon=True)
+        self._stop_event = threading.Event()
+        self._server = None
+        self._last_used = 0.0
+
+    def stop(self):
+        self._stop_event.set()
+        _wakeup.set()
+
+    def run(self):
+        print("Mail worker started")
+        while not self._stop_event.is_set():
+            _wakeup.clear()
+            try:
+                sent = self.process_batch()
+            except Exception as e:
+                print(f"Mail worker error: {e}")
+                self._close()
+                sent = 0
+            if sent == 0:
+                if self._server and time.monotonic() - self._last_used > MAIL_IDLE_TIMEOUT:
+                    self._close()
+                _wakeup.wait(MAIL_POLL_SECONDS)
+        self._close()
+        print("Mail worker stopped")
+
+    def claim_batch(self):
+        """Atomically mark up to MAIL_BATCH_SIZE due messages as ours"""
+        col = mail_queue_col.sync
+        now = datetime.utcnow()
+        batch = []
+        for _ in range(MAIL_BATCH_SIZE):
+            doc = col.find_one_and_update(
+                {"$or": [
+                    {"status": "pending", "next_attempt_at": {"$lte": now}},
+                    {"status": "sending", "locked_until": {"$lte": now}}
+                ]},
+                {"$set": {"status": "sending", "locked_until": now + timedelta(seconds=MAIL_LOCK_SECONDS)},
+                 "$inc": {"attempts": 1}},
+                sort=[("next_attempt_at", 1)],
+                return_document=ReturnDocument.AFTER
+            )
+            if doc is None:
+                break
+            batch.append(doc)
+        return batch
+
+    def process_batch(self):
+        batch = self.claim_batch()
+        sent = 0
+        for doc in batch:
+            try:
+                self._send(doc)
+            except Exception as e:
+                self._close()
+                self._mark_failed(doc, e)
+            else:
+                mail_queue_col.sync.update_one(
+                    {"_id": doc["_id"]},
+                    {"$set": {"status": "sent", "sent_at": datetime.utcnow()},
+                     "$unset": {"locked_until": "", "last_error": ""}}
+                )
+                print(f"Email sent to {doc['to']}")
+                sent += 1
+        return sent
+
+    def _mark_failed(self, doc, error):
+        attempts = doc.get("attempts", 1)
+        if attempts >= MAIL_MAX_ATTEMPTS:
+            update = {"status": "failed", "last_error": str(error)}
+            print(f"Failed to send email to {doc['to']} after {attempts} attempts: {error}")
+        else:
+            delay = MAIL_RETRY_BASE_SECONDS * (2 ** (attempts - 1))
+            update = {
+                "status": "pending",
+                "last_error": str(error),
+                "next_attempt_at": datetime.utcnow() + timedelta(seconds=delay)
+            }
+            print(f"Failed to send email to {doc['to']}, retrying in {delay}s: {error}")
+        mail_queue_col.sync.update_one({"_id": doc["_id"]}, {"$set": update, "$unset": {"locked_until": ""}})
+
+    def _connect(self):
+        if SMTP_USE_SSL:
+            server = smtplib.SMTP_SSL(SMTP_SERVER, SMTP_PORT, timeout=30)
+        else:
+            server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT, timeout=30)
+        if SMTP_PASS:
+            server.login(SMTP_USER, SMTP_PASS)
+        return server
+
+    def _session(self):
+        if self._server is not None:
+            # Skip the NOOP probe while the session is being actively used
+            if time.monotonic() - self._last_used < 5:
+                return self._server
+            try:
+                if self._server.noop()[0] == 250:
+                    return self._server
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._close()
+        self._server = self._connect()
+        self._last_used = time.monotonic()
+        return self._server
+
+    def _send(self, doc):
+        started = time.perf_counter()
+        try:
+            server = self._session()
+            server.sendmail(SMTP_USER, doc["to"], build_message(doc["to"], doc["subject"], doc["body"]))
+        except Exception:
+            metrics.SMTP_SECONDS.observe(time.perf_counter() - started, result="error")
+            raise
+        metrics.SMTP_SECONDS.observe(time.perf_counter() - started, result="sent")
+        self._last_used = time.monotonic()
+
+    def _close(self):
+        if self._server is None:
+            return
+        try:
+            self._server.quit()
+        except Exception:
+            pass
+        self._server = None
@@ -1,85 +1,136 @@
-from fastapi import FastAPI, HTTPException, Depends, status, Query
+from fastapi import FastAPI, HTTPException, Depends, status, Query, Request
+from fastapi.responses import ORJSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, model_validator
+from typing import List, Optional, Union
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
-from passlib.context import CryptContext
-from pymongo import MongoClient
+from pymongo import InsertOne
+from pymongo.errors import DuplicateKeyError
+import asyncio
 import time
-import os
 from dotenv import load_dotenv
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from apscheduler.schedulers.background import BackgroundScheduler
-from apscheduler.triggers.cron import CronTrigger
-
-# Database setup with retry logic
-def connect_to_mongodb():
-    max_retries = 10
-    retry_delay = 2
-    for attempt in range(max_retries):
-        try:
-            mongo_client = MongoClient(
-                'mongodb:27017',
-                serverSelectionTimeoutMS=5000,
-                connectTimeoutMS=5000,
-                socketTimeoutMS=5000
-            )
-            # Test the connection
-            mongo_client.admin.command('ping')
-            print("Successfully connected to MongoDB")
-            return mongo_client
-        except Exception as e:
-            print(f"MongoDB connection attempt {attempt + 1} failed: {e}")
-            if attempt < max_retries - 1:
-                time.sleep(retry_delay)
-            else:
-                raise e
-
-mongo_client = connect_to_mongodb()
-mongo_db = mongo_client['task_manager']
-users_col = mongo_db['users']
-tasks_col = mongo_db['tasks']
-daily_col = mongo_db['daily']
-team_col = mongo_db['teams']
-leaves_col = mongo_db['leaves']
-presence_col = mongo_db['presence']
+
+import db
+import mailer
+import reminders
+import scheduler
+import indexes
+import stats
+import analytics
+import availability
+import dates
+import rollups
+import buckets
+import search
+import events
+import passwords
+import metrics
+import profiler
+from passwords import verify_password, get_password_hash
+from bulk import bulk_apply, check_size
+from dates import DateStr
+from export import export_response
+from token_cache import TokenCache
+from response_cache import conditional_get, response_cache
+from admission import admission
+from pagination import Page, Resource, MAX_PAGE_SIZE, fetch_all, fetch_page, wants_page
+from db import users_col, tasks_col, daily_col, team_col, leaves_col, presence_col
+from archive import daily_tiers
+from buckets import presence_rows
 
 # Load environment variables
 load_dotenv()
 
-# SMTP settings
-SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com")
-SMTP_PORT = int(os.getenv("SMTP_PORT", 465))
-SMTP_USER = os.getenv("SMTP_USER")
-SMTP_PASS = os.getenv("SMTP_PASS")
-
-def send_email(to_email, task_name, assign):
-    if not SMTP_USER or not SMTP_PASS:
-        print("SMTP credentials not set, skipping email")
-        return
-    msg = MIMEMultipart()
-    msg['From'] = SMTP_USER
-    msg['To'] = to_email
-    msg['Subject'] = f"Task Assigned: {task_name}"
+def task_assigned_email(to_email, task_name):
+    subject = f"Task Assigned: {task_name}"
     body = f"Hello,\n\nYou have been assigned the task: {task_name}.\n\nBest regards,\nTask Manager"
-    msg.attach(MIMEText(body, 'plain'))
+    return to_email, subject, body
+
+async def send_email(to_email, task_name, assign):
+    """Queue a task assignment email; the mail worker delivers it"""
+    await mailer.enqueue_email(*task_assigned_email(to_email, task_name))
+
+# Background services; started by the lifespan handler once MongoDB answers
+mail_worker = mailer.MailWorker()
+reminder_scheduler = scheduler.Coordinator()
+
+startup_status = {"ready": False, "error": None, "steps": {}}
+
+async def start_services():
+    """Connect, build indexes and start the workers, recording how long each step took"""
+    async def step(name, coro):
+        started = time.perf_counter()
+        result = await coro
+        startup_status["steps"][name] = round((time.perf_counter() - started) * 1000, 2)
+        return result
+
+    async def start_workers():
+        mail_worker.start()
+        reminder_scheduler.start()
+        if profiler.PROFILE_SLOW_MS > 0:
+            profiler.start()
+
+    async def prepare():
+        await step("dates_ms", db.run(dates.migrate_once))
+        await step("presence_buckets_ms", db.run(buckets.migrate_once))
+        await step("indexes_ms", db.run(indexes.ensure_indexes))
+
     try:
-        server = smtplib.SMTP_SSL(SMTP_SERVER, SMTP_PORT)
-        server.login(SMTP_USER, SMTP_PASS)
-        text = msg.as_string()
-        server.sendmail(SMTP_USER, to_email, text)
-        server.quit()
-        print(f"Email sent to {to_email}")
+        await step("connect_ms", db.connect())
+        # Retried like connect(): another worker may hold the migration, or
+        # the database may drop out between steps
+        delay = db.MONGO_CONNECT_BASE_DELAY
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                await prepare()
+                break
+            except buckets.MigrationFailed:
+                raise
+            except Exception as e:
+                startup_status["error"] = str(e)
+                print(f"Startup attempt {attempt} failed: {e}; retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, db.MONGO_CONNECT_MAX_DELAY)
+        await step("workers_ms", start_workers())
+        startup_status["ready"] = True
+        startup_status["error"] = None
+        print(f"Startup complete: {startup_status['steps']}")
     except Exception as e:
-        print(f"Failed to send email: {e}")
+        startup_status["error"] = str(e)
+        print(f"Startup failed: {e}")
+
+@asynccontextmanager
+async def lifespan(app):
+    # Not awaited: the app serves /health/live (and anything that does not
+    # need MongoDB) while the connection is still being retried
+    startup = asyncio.create_task(start_services())
+    yield
+    startup.cancel()
+    if mail_worker.is_alive():
+        mail_worker.stop()
+    if reminder_scheduler.running:
+        reminder_scheduler.shutdown()
+    profiler.stop()
+    passwords.shutdown()
+    db.shutdown()
 
 # FastAPI app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+
+# Coalescing and per-route limits for the hot reads. Innermost, so cache
+# hits and 304s are answered without queueing
+app.middleware("http")(admission.middleware)
+# Conditional GET for the list endpoints. Registered before CORS so that
+# 304s and cached bodies still get CORS headers
+app.middleware("http")(conditional_get)
+# Outermost of the two, so /metrics latencies include cache hits and 304s
+app.middleware("http")(metrics.middleware)
 
 # CORS
 app.add_middleware(
@@ -90,55 +141,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Setup scheduler for automatic reminders
-scheduler = BackgroundScheduler()
-
-def scheduled_send_reminders():
-    """Scheduled job to send reminder emails for tasks due tomorrow"""
-    try:
-        tomorrow = (datetime.utcnow() + timedelta(days=1)).strftime("%Y-%m-%d")
-        tasks_to_remind = tasks_col.find({"sendReminder": True, "enddate": tomorrow})
-        sent_count = 0
-
-        for task in tasks_to_remind:
-            assign = task.get("assign")
-            taskname = task.get("taskname")
-            if assign:
-                member = team_col.find_one({"name": assign})
-                if member:
-                    email = member.get("email")
-                    if email:
-                        send_email(email, f"Reminder: {taskname}", assign)
-                        sent_count += 1
-
-        if sent_count > 0:
-            print(f"Scheduled reminder job: Sent {sent_count} reminder emails for {tomorrow}")
-        else:
-            print(f"Scheduled reminder job: No reminders to send for {tomorrow}")
-
-    except Exception as e:
-        print(f"Error in scheduled reminder job: {e}")
-
-# Schedule the job to run daily at 9:00 AM
-scheduler.add_job(
-    scheduled_send_reminders,
-    CronTrigger(hour=9, minute=0),  # 9:00 AM daily
-    id='daily_reminders',
-    name='Send daily task reminders',
-    replace_existing=True
-)
-
-# Start the scheduler
-scheduler.start()
-print("Reminder scheduler started - will send daily reminders at 9:00 AM")
-
 # Security
 SECRET_KEY = "your-secret-key"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
+token_cache = TokenCache()
 
 # Models
 class UserCreate(BaseModel):
@@ -166,28 +176,16 @@ class ResetPasswordRequest(BaseModel):
 # Add route for forgot password
 @app.post("/forgot-password")
 async def forgot_password(request: ForgotPasswordRequest):
-    user = users_col.find_one({"email": request.email})
+    user = await users_col.find_one({"email": request.email})
     if not user:
         # To prevent user enumeration, respond with success even if user not found
         return {"message": "If an account with that email exists, a password reset link has been sent."}
     # Generate a password reset token (for simplicity, reuse access token with short expiry)
     reset_token = create_access_token(data={"sub": user["username"]}, expires_delta=timedelta(minutes=15))
     reset_link = f"http://localhost:8080/reset-password.html?token={reset_token}"
-    # Send email with reset link
-    try:
-        msg = MIMEMultipart()
-        msg['From'] = SMTP_USER
-        msg['To'] = request.email
-        msg['Subject'] = "Password Reset Request"
-        body = f"Hello,\n\nTo reset your password, please click the following link:\n{reset_link}\n\nIf you did not request this, please ignore this email."
-        msg.attach(MIMEText(body, 'plain'))
-        server = smtplib.SMTP_SSL(SMTP_SERVER, SMTP_PORT)
-        server.login(SMTP_USER, SMTP_PASS)
-        server.sendmail(SMTP_USER, request.email, msg.as_string())
-        server.quit()
-    except Exception as e:
-        print(f"Failed to send password reset email: {e}")
-        raise HTTPException(status_code=500, detail="Failed to send email")
+    # Queue email with reset link
+    body = f"Hello,\n\nTo reset your password, please click the following link:\n{reset_link}\n\nIf you did not request this, please ignore this email."
+    await mailer.enqueue_email(request.email, "Password Reset Request", body)
     return {"message": "If an account with that email exists, a password reset link has been sent."}
 
 # Add route for reset password
@@ -201,20 +199,18 @@ async def reset_password(request: ResetPasswordRequest):
     except JWTError:
         raise HTTPException(status_code=400, detail="Invalid or expired token")
 
-    user = users_col.find_one({"username": username})
-    if not user:
+    hashed_password = await get_password_hash(request.new_password)
+    result = await users_col.update_one({"username": username}, {"$set": {"hashed_password": hashed_password}})
+    if result.matched_count == 0:
         raise HTTPException(status_code=400, detail="User not found")
-
-    hashed_password = get_password_hash(request.new_password)
-    users_col.update_one({"username": username}, {"$set": {"hashed_password": hashed_password}})
     return {"message": "Password reset successfully"}
 
 class Task(BaseModel):
     taskname: str
     assign: str
     status: str
-    startdate: str
-    enddate: str
+    startdate: DateStr
+    enddate: DateStr
     email: Optional[str] = None
     send_reminder: Optional[bool] = False
 
@@ -232,25 +228,69 @@ class TeamMember(BaseModel):
 
 class LeaveRequest(BaseModel):
     member_name: str
-    start_date: str
-    end_date: str
+    start_date: DateStr
+    end_date: DateStr
     reason: str
     status: str = "pending"  # pending, approved, rejected
     requested_by: str
     approved_by: Optional[str] = None
 
+    @model_validator(mode="after")
+    def check_range(self):
+        if self.end_date < self.start_date:
+            raise ValueError("end_date must not be before start_date")
+        return self
+
 class Presence(BaseModel):
     member_name: str
-    date: str
+    date: DateStr
     status: str  # present, absent
 
-# Utils
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+# API field name -> stored field name, for paged and projected list responses
+TASK_RESOURCE = Resource(
+    {"taskname": "taskname", "assign": "assign", "status": "status", "startdate": "startdate",
+     "enddate": "enddate", "email": "email", "send_reminder": "sendReminder"},
+    defaults={"email": "", "send_reminder": False},
+    dates=("startdate", "enddate")
+)
+DAILY_RESOURCE = Resource(
+    {"name": "name", "assign": "assign", "description": "description", "date": "date", "email": "email"},
+    defaults={"assign": "", "description": "", "email": ""}
+)
+TEAM_RESOURCE = Resource({"name": "name", "email": "email", "team": "team"})
+LEAVE_RESOURCE = Resource(
+    {"member_name": "member_name", "start_date": "start_date", "end_date": "end_date", "reason": "reason",
+     "status": "status", "requested_by": "requested_by", "approved_by": "approved_by"},
+    dates=("start_date", "end_date")
+)
+PRESENCE_RESOURCE = Resource({"member_name": "member_name", "date": "date", "status": "status"}, dates=("date",))
+
+search_engine = search.create_engine({"tasks": TASK_RESOURCE, "daily": DAILY_RESOURCE})
+
+# Document builders shared by the single and bulk write routes
+def task_document(task: Task):
+    return {
+        "taskname": task.taskname,
+        "assign": task.assign,
+        "status": task.status,
+        "startdate": dates.to_db(task.startdate),
+        "enddate": dates.to_db(task.enddate),
+        "email": task.email,
+        "sendReminder": task.send_reminder
+    }
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+def leave_document(leave: LeaveRequest):
+    return {
+        "member_name": leave.member_name,
+        "start_date": dates.to_db(leave.start_date),
+        "end_date": dates.to_db(leave.end_date),
+        "reason": leave.reason,
+        "status": leave.status,
+        "requested_by": leave.requested_by,
+        "approved_by": leave.approved_by
+    }
 
+# Utils
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -261,33 +301,49 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+def verify_token(token: str):
+    """Return the username in a valid access token, else raise 401"""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
+    payload = token_cache.get(token)
+    if payload is None:
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        except JWTError:
             raise credentials_exception
-    except JWTError:
+        token_cache.put(token, payload)
+    username: str = payload.get("sub")
+    if username is None:
         raise credentials_exception
     return username
 
+def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    return verify_token(credentials.credentials)
+
 # Routes
 @app.post("/register", response_model=Token)
 async def register(user: UserCreate):
-    hashed_password = get_password_hash(user.password)
-    if users_col.find_one({"username": user.username}) or users_col.find_one({"email": user.email}):
-        raise HTTPException(status_code=400, detail="Username or email already registered")
+    hashed_password = await get_password_hash(user.password)
     user_doc = {
         "username": user.username,
         "email": user.email,
         "hashed_password": hashed_password
     }
-    users_col.insert_one(user_doc)
+    # Existence check and insert in one round trip; the unique indexes on
+    # username and email catch the remaining race
+    try:
+        result = await users_col.update_one(
+            {"$or": [{"username": user.username}, {"email": user.email}]},
+            {"$setOnInsert": user_doc},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Username or email already registered")
+    if result.upserted_id is None:
+        raise HTTPException(status_code=400, detail="Username or email already registered")
     access_token = create_access_token(data={"sub": user.username})
     return {"access_token": access_token, "token_type": "bearer"}
 
@@ -298,98 +354,126 @@ logger = logging.getLogger("uvicorn.error")
 @app.post("/token", response_model=Token)
 async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     logger.info(f"Login attempt for user: {form_data.username}")
-    user = users_col.find_one({"username": form_data.username})
+    user = await users_col.find_one({"username": form_data.username}, {"_id": 0, "hashed_password": 1})
     if not user:
         logger.warning(f"User not found: {form_data.username}")
         raise HTTPException(status_code=400, detail="Incorrect username or password")
-    if not verify_password(form_data.password, user["hashed_password"]):
+    if not await verify_password(form_data.password, user["hashed_password"]):
         logger.warning(f"Invalid password for user: {form_data.username}")
         raise HTTPException(status_code=400, detail="Incorrect username or password")
     access_token = create_access_token(data={"sub": form_data.username})
     logger.info(f"User logged in successfully: {form_data.username}")
     return {"access_token": access_token, "token_type": "bearer"}
 
-@app.get("/tasks", response_model=List[Task])
-async def get_tasks(status: Optional[str] = Query(None), assign: Optional[str] = Query(None), startdate: Optional[str] = Query(None), enddate: Optional[str] = Query(None)):
+def task_query(status=None, assign=None, startdate=None, enddate=None):
     query = {}
     if status:
         query["status"] = status
     if assign:
         query["assign"] = assign
     if startdate:
-        query["startdate"] = {"$gte": startdate}
+        query["startdate"] = {"$gte": dates.param(startdate, "startdate")}
     if enddate:
-        query["enddate"] = {"$lte": enddate}
-    tasks = []
-    for task_doc in tasks_col.find(query):
-        tasks.append(Task(
-            taskname=task_doc.get("taskname"),
-            assign=task_doc.get("assign"),
-            status=task_doc.get("status"),
-            startdate=task_doc.get("startdate"),
-            enddate=task_doc.get("enddate"),
-            email=task_doc.get("email") or "",
-            send_reminder=task_doc.get("sendReminder", False)
-        ))
-    return tasks
+        query["enddate"] = {"$lte": dates.param(enddate, "enddate")}
+    return query
+
+@app.get("/tasks", response_model=Union[List[Task], Page])
+async def get_tasks(status: Optional[str] = Query(None), assign: Optional[str] = Query(None), startdate: Optional[str] = Query(None), enddate: Optional[str] = Query(None), limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = Query(None), sort: Optional[str] = Query(None), fields: Optional[str] = Query(None)):
+    query = task_query(status, assign, startdate, enddate)
+    if wants_page(limit, cursor, fields):
+        return ORJSONResponse(await fetch_page(tasks_col, TASK_RESOURCE, query, limit, cursor, sort, fields))
+    return ORJSONResponse(await fetch_all(tasks_col, TASK_RESOURCE, query, sort))
 
 @app.post("/tasks")
 async def create_task(task: Task, current_user: str = Depends(get_current_user)):
     if not current_user:
         raise HTTPException(status_code=401, detail="Could not validate credentials")
-    task_doc = {
-        "taskname": task.taskname,
-        "assign": task.assign,
-        "status": task.status,
-        "startdate": task.startdate,
-        "enddate": task.enddate,
-        "email": task.email,
-        "sendReminder": task.send_reminder
-    }
-    tasks_col.insert_one(task_doc)
+    await tasks_col.insert_one(task_document(task))
+    await events.publish("tasks", "created", {"taskname": task.taskname}, task.model_dump())
     if task.email:
-        send_email(task.email, task.taskname, task.assign)
+        await send_email(task.email, task.taskname, task.assign)
     return {"message": "Task created"}
 
+@app.post("/tasks/bulk")
+async def create_tasks_bulk(tasks: List[Task], current_user: str = Depends(get_current_user)):
+    """Create many tasks in one unordered bulk write"""
+    check_size(tasks)
+    outcome = await bulk_apply(tasks_col, [InsertOne(task_document(task)) for task in tasks])
+    emails = [
+        task_assigned_email(task.email, task.taskname)
+        for task, result in zip(tasks, outcome["results"])
+        if task.email and result["status"] == "created"
+    ]
+    await mailer.enqueue_emails(emails)
+    await events.publish_many("tasks", [
+        ("created", {"taskname": task.taskname}, task.model_dump())
+        for task, result in zip(tasks, outcome["results"])
+        if result["status"] == "created"
+    ])
+    return outcome
+
 @app.put("/tasks/{taskname}")
 async def update_task(taskname: str, task: Task, current_user: str = Depends(get_current_user)):
-    tasks_col.update_one(
+    result = await tasks_col.update_one(
         {"taskname": taskname},
         {"$set": {
             "assign": task.assign,
             "status": task.status,
-            "startdate": task.startdate,
-            "enddate": task.enddate,
+            "startdate": dates.to_db(task.startdate),
+            "enddate": dates.to_db(task.enddate),
             "email": task.email,
             "sendReminder": task.send_reminder
         }}
     )
+    if result.matched_count:
+        await events.publish("tasks", "updated", {"taskname": taskname}, dict(task.model_dump(), taskname=taskname))
     return {"message": "Task updated"}
 
 @app.delete("/tasks/{taskname}")
 async def delete_task(taskname: str, current_user: str = Depends(get_current_user)):
-    tasks_col.delete_one({"taskname": taskname})
+    result = await tasks_col.delete_one({"taskname": taskname})
+    if result.deleted_count:
+        await events.publish("tasks", "deleted", {"taskname": taskname})
     return {"message": "Task deleted"}
 
-@app.get("/daily", response_model=List[DailyTask])
-async def get_daily_tasks(current_user: str = Depends(get_current_user)):
-    tasks = []
-    for task_doc in daily_col.find():
-        tasks.append(DailyTask(
-            name=task_doc.get("name"),
-            assign=task_doc.get("assign") or "",
-            description=task_doc.get("description") or "",
-            date=task_doc.get("date"),
-            email=task_doc.get("email") or ""
-        ))
-    return tasks
+@app.get("/analytics/tasks")
+async def get_task_analytics(status: Optional[str] = Query(None), assign: Optional[str] = Query(None), team: Optional[str] = Query(None), startdate: Optional[str] = Query(None), enddate: Optional[str] = Query(None)):
+    """Status, done-by-weekday, by-month and by-assignee counts for the charts page"""
+    return await analytics.task_analytics(task_query(status, assign, startdate, enddate), team)
+
+@app.get("/search")
+async def search_tasks(q: str = Query(..., min_length=1), kinds: Optional[str] = Query(None), assign: Optional[str] = Query(None), status: Optional[str] = Query(None), start_date: Optional[str] = Query(None), end_date: Optional[str] = Query(None), limit: int = Query(search.DEFAULT_LIMIT, ge=1, le=search.MAX_LIMIT), cursor: Optional[str] = Query(None), current_user: str = Depends(get_current_user)):
+    """Tasks and daily tasks matching any word of `q`, best match first"""
+    offset = search.decode_cursor(cursor)
+    if offset >= search.SEARCH_MAX_RESULTS:
+        raise HTTPException(status_code=400, detail=f"Search results are limited to the first {search.SEARCH_MAX_RESULTS}")
+    return await search_engine.search(q, search.parse_kinds(kinds), assign, status, dates.param(start_date, "start_date"),
+                                      dates.param(end_date, "end_date"), limit, offset)
+
+def daily_query(start_date=None, end_date=None):
+    # Daily task dates are stored as "YYYY-MM-DD" strings
+    query = {}
+    if start_date or end_date:
+        query["date"] = {}
+        if start_date:
+            query["date"]["$gte"] = dates.to_api(dates.param(start_date, "start_date"))
+        if end_date:
+            query["date"]["$lte"] = dates.to_api(dates.param(end_date, "end_date"))
+    return query
+
+@app.get("/daily", response_model=Union[List[DailyTask], Page])
+async def get_daily_tasks(start_date: Optional[str] = Query(None), end_date: Optional[str] = Query(None), limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = Query(None), sort: Optional[str] = Query(None), fields: Optional[str] = Query(None), current_user: str = Depends(get_current_user)):
+    query = daily_query(start_date, end_date)
+    if wants_page(limit, cursor, fields):
+        return ORJSONResponse(await fetch_page(daily_tiers, DAILY_RESOURCE, query, limit, cursor, sort, fields))
+    return ORJSONResponse(await fetch_all(daily_tiers, DAILY_RESOURCE, query, sort))
 
 @app.post("/daily")
 async def create_daily_task(task: DailyTask, current_user: str = Depends(get_current_user)):
     # Lookup email if not provided
     email_to_send = task.email
     if not email_to_send and task.assign:
-        member = team_col.find_one({"name": task.assign})
+        member = await team_col.find_one({"name": task.assign})
         if member:
             email_to_send = member.get("email")
     task_doc = {
@@ -399,9 +483,10 @@ async def create_daily_task(task: DailyTask, current_user: str = Depends(get_cur
         "date": task.date,
         "email": email_to_send
     }
-    daily_col.insert_one(task_doc)
+    await daily_col.insert_one(task_doc)
+    await events.publish("daily", "created", {"name": task.name}, dict(task.model_dump(), email=email_to_send))
     if email_to_send:
-        send_email(email_to_send, task.name, task.assign)
+        await send_email(email_to_send, task.name, task.assign)
     return {"message": "Daily task created"}
 
 @app.put("/daily/{taskname}")
@@ -409,10 +494,10 @@ async def update_daily_task(taskname: str, task: DailyTask, current_user: str =
     # Lookup email if not provided
     email_to_send = task.email
     if not email_to_send and task.assign:
-        member = team_col.find_one({"name": task.assign})
+        member = await team_col.find_one({"name": task.assign})
         if member:
             email_to_send = member.get("email")
-    daily_col.update_one(
+    result = await daily_tiers.update_one(
         {"name": taskname},
         {"$set": {
             "assign": task.assign,
@@ -421,231 +506,413 @@ async def update_daily_task(taskname: str, task: DailyTask, current_user: str =
             "email": email_to_send
         }}
     )
-    if email_to_send:
-        send_email(email_to_send, task.name, task.assign)
+    if result.matched_count:
+        await events.publish("daily", "updated", {"name": taskname}, dict(task.model_dump(), name=taskname, email=email_to_send))
+        if email_to_send:
+            await send_email(email_to_send, task.name, task.assign)
     return {"message": "Daily task updated"}
 
 @app.delete("/daily/{taskname}")
 async def delete_daily_task(taskname: str, current_user: str = Depends(get_current_user)):
-    daily_col.delete_one({"name": taskname})
+    result = await daily_tiers.delete_one({"name": taskname})
+    if result.deleted_count:
+        await events.publish("daily", "deleted", {"name": taskname})
     return {"message": "Daily task deleted"}
 
-@app.get("/teams", response_model=List[TeamMember])
-async def get_teams():
-    members = []
-    for member_doc in team_col.find():
-        members.append(TeamMember(
-            name=member_doc.get("name"),
-            email=member_doc.get("email"),
-            team=member_doc.get("team")
-        ))
-    return members
+@app.get("/teams", response_model=Union[List[TeamMember], Page])
+async def get_teams(limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = Query(None), sort: Optional[str] = Query(None), fields: Optional[str] = Query(None)):
+    if wants_page(limit, cursor, fields):
+        return ORJSONResponse(await fetch_page(team_col, TEAM_RESOURCE, {}, limit, cursor, sort, fields))
+    return ORJSONResponse(await fetch_all(team_col, TEAM_RESOURCE, {}, sort))
+
+@app.get("/teams/dashboard")
+async def get_team_dashboard(team: Optional[str] = Query(None), date: Optional[str] = Query(None)):
+    """Members with leave totals and presence for `date` (default today) in one request"""
+    date = date or datetime.utcnow().strftime("%Y-%m-%d")
+    return {"date": date, "members": await stats.team_dashboard(team, dates.param(date))}
 
 @app.post("/teams")
 async def create_team_member(member: TeamMember):
-    if team_col.find_one({"name": member.name}):
+    if await team_col.find_one({"name": member.name}):
         raise HTTPException(status_code=400, detail="Member name already exists")
     member_doc = {
         "name": member.name,
         "email": member.email,
         "team": member.team
     }
-    team_col.insert_one(member_doc)
+    try:
+        await team_col.insert_one(member_doc)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Member name already exists")
+    await events.publish("teams", "created", {"name": member.name}, member.model_dump())
     return {"message": "Team member added"}
 
 @app.put("/teams/{name}")
 async def update_team_member(name: str, member: TeamMember):
-    team_col.update_one(
-        {"name": name},
-        {"$set": {
-            "name": member.name,
-            "email": member.email,
-            "team": member.team
-        }}
-    )
+    try:
+        result = await team_col.update_one(
+            {"name": name},
+            {"$set": {
+                "name": member.name,
+                "email": member.email,
+                "team": member.team
+            }}
+        )
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Member name already exists")
+    if result.matched_count:
+        await events.publish("teams", "updated", {"name": name}, member.model_dump())
     return {"message": "Team member updated"}
 
 @app.delete("/teams/{name}")
 async def delete_team_member(name: str):
-    team_col.delete_one({"name": name})
+    result = await team_col.delete_one({"name": name})
+    if result.deleted_count:
+        await events.publish("teams", "deleted", {"name": name})
     return {"message": "Team member deleted"}
 
 @app.post("/send_reminders")
 async def send_reminders():
-    tomorrow = (datetime.utcnow() + timedelta(days=1)).strftime("%Y-%m-%d")
-    tasks_to_remind = tasks_col.find({"sendReminder": True, "enddate": tomorrow})
-    sent_count = 0
-    for task in tasks_to_remind:
-        assign = task.get("assign")
-        taskname = task.get("taskname")
-        if assign:
-            member = team_col.find_one({"name": assign})
-            if member:
-                email = member.get("email")
-                if email:
-                    send_email(email, f"{taskname} - Reminder", assign)
-                    sent_count += 1
-    return {"message": f"Sent {sent_count} reminder emails"}
+    stats = await db.run(reminders.run_reminders)
+    return {"message": f"Queued {stats['queued']} reminder emails for {stats['recipients']} recipients", "stats": stats}
+
+@app.get("/send_reminders/stats")
+async def get_reminder_stats():
+    """Statistics from the most recent reminder run in this process, and recent scheduled runs"""
+    return {"last_run": reminders.last_run, "scheduled_runs": await db.run(scheduler.recent_runs, 5)}
 
 # Leave endpoints
-@app.get("/leaves", response_model=List[LeaveRequest])
-async def get_leaves(member_name: Optional[str] = Query(None), status: Optional[str] = Query(None)):
+def leave_query(member_name=None, status=None):
     query = {}
     if member_name:
         query["member_name"] = member_name
     if status:
         query["status"] = status
-    leaves = []
-    for leave_doc in leaves_col.find(query):
-        leaves.append(LeaveRequest(
-            member_name=leave_doc.get("member_name"),
-            start_date=leave_doc.get("start_date"),
-            end_date=leave_doc.get("end_date"),
-            reason=leave_doc.get("reason"),
-            status=leave_doc.get("status"),
-            requested_by=leave_doc.get("requested_by"),
-            approved_by=leave_doc.get("approved_by")
-        ))
-    return leaves
+    return query
+
+@app.get("/leaves", response_model=Union[List[LeaveRequest], Page])
+async def get_leaves(member_name: Optional[str] = Query(None), status: Optional[str] = Query(None), limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = Query(None), sort: Optional[str] = Query(None), fields: Optional[str] = Query(None)):
+    query = leave_query(member_name, status)
+    if wants_page(limit, cursor, fields):
+        return ORJSONResponse(await fetch_page(leaves_col, LEAVE_RESOURCE, query, limit, cursor, sort, fields))
+    return ORJSONResponse(await fetch_all(leaves_col, LEAVE_RESOURCE, query, sort))
 
 @app.post("/leaves")
 async def create_leave_request(leave: LeaveRequest, current_user: str = Depends(get_current_user)):
-    leave_doc = {
-        "member_name": leave.member_name,
-        "start_date": leave.start_date,
-        "end_date": leave.end_date,
-        "reason": leave.reason,
-        "status": leave.status,
-        "requested_by": leave.requested_by,
-        "approved_by": leave.approved_by
-    }
-    leaves_col.insert_one(leave_doc)
-    return {"message": "Leave request created"}
+    # Overlaps are reported, not refused: a manager may still approve both
+    overlaps = (await availability.find_overlaps([leave.model_dump()]))[0]
+    await leaves_col.insert_one(leave_document(leave))
+    await availability.record_spans([availability.span_days(leave.start_date, leave.end_date)])
+    await rollups.record_change("leaves", leave.member_name, leave.start_date, None, leave.status)
+    await events.publish("leaves", "created", {"member_name": leave.member_name, "start_date": leave.start_date}, leave.model_dump())
+    return {"message": "Leave request created", "overlaps": overlaps}
+
+@app.post("/leaves/bulk")
+async def create_leave_requests_bulk(leaves: List[LeaveRequest], current_user: str = Depends(get_current_user)):
+    """Create many leave requests in one unordered bulk write"""
+    check_size(leaves)
+    overlaps = await availability.find_overlaps([leave.model_dump() for leave in leaves])
+    outcome = await bulk_apply(leaves_col, [InsertOne(leave_document(leave)) for leave in leaves])
+    created = [leave for leave, result in zip(leaves, outcome["results"]) if result["status"] == "created"]
+    for result, found in zip(outcome["results"], overlaps):
+        if result["status"] == "created" and found:
+            result["overlaps"] = found
+    await availability.record_spans(availability.span_days(leave.start_date, leave.end_date) for leave in created)
+    await rollups.record_changes("leaves", [(leave.member_name, leave.start_date, None, leave.status) for leave in created])
+    await events.publish_many("leaves", [
+        ("created", {"member_name": leave.member_name, "start_date": leave.start_date}, leave.model_dump())
+        for leave in created
+    ])
+    return outcome
 
 @app.put("/leaves/{member_name}/{start_date}")
 async def update_leave_request(member_name: str, start_date: str, leave: LeaveRequest, current_user: str = Depends(get_current_user)):
-    leaves_col.update_one(
-        {"member_name": member_name, "start_date": start_date},
+    previous = await leaves_col.find_one_and_update(
+        {"member_name": member_name, "start_date": dates.param(start_date, "start_date")},
         {"$set": {
-            "end_date": leave.end_date,
+            "end_date": dates.to_db(leave.end_date),
             "reason": leave.reason,
             "status": leave.status,
             "approved_by": leave.approved_by
-        }}
+        }},
+        projection={"_id": 0, "status": 1}
     )
+    if previous:
+        await availability.record_spans([availability.span_days(start_date, leave.end_date)])
+        await rollups.record_change("leaves", member_name, start_date, previous.get("status"), leave.status)
+        await events.publish("leaves", "updated", {"member_name": member_name, "start_date": start_date},
+                             dict(leave.model_dump(), member_name=member_name, start_date=start_date))
     return {"message": "Leave request updated"}
 
 @app.delete("/leaves/{member_name}/{start_date}")
 async def delete_leave_request(member_name: str, start_date: str, current_user: str = Depends(get_current_user)):
-    leaves_col.delete_one({"member_name": member_name, "start_date": start_date})
+    previous = await leaves_col.find_one_and_delete({"member_name": member_name, "start_date": dates.param(start_date, "start_date")}, {"_id": 0, "status": 1})
+    if previous:
+        await rollups.record_change("leaves", member_name, start_date, previous.get("status"), None)
+        await events.publish("leaves", "deleted", {"member_name": member_name, "start_date": start_date})
     return {"message": "Leave request deleted"}
 
 # Presence endpoints
-@app.get("/presence", response_model=List[Presence])
-async def get_presence(member_name: Optional[str] = Query(None), date: Optional[str] = Query(None)):
+def presence_query(member_name=None, date=None, start_date=None, end_date=None):
     query = {}
     if member_name:
         query["member_name"] = member_name
     if date:
-        query["date"] = date
-    presence_records = []
-    for presence_doc in presence_col.find(query):
-        presence_records.append(Presence(
-            member_name=presence_doc.get("member_name"),
-            date=presence_doc.get("date"),
-            status=presence_doc.get("status")
-        ))
-    return presence_records
+        query["date"] = dates.param(date)
+    elif start_date or end_date:
+        query["date"] = {}
+        if start_date:
+            query["date"]["$gte"] = dates.param(start_date, "start_date")
+        if end_date:
+            query["date"]["$lte"] = dates.param(end_date, "end_date")
+    return query
+
+@app.get("/presence", response_model=Union[List[Presence], Page])
+async def get_presence(member_name: Optional[str] = Query(None), date: Optional[str] = Query(None), start_date: Optional[str] = Query(None), end_date: Optional[str] = Query(None), limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = Query(None), sort: Optional[str] = Query(None), fields: Optional[str] = Query(None)):
+    query = presence_query(member_name, date, start_date, end_date)
+    if wants_page(limit, cursor, fields):
+        return ORJSONResponse(await fetch_page(presence_rows, PRESENCE_RESOURCE, query, limit, cursor, sort, fields))
+    return ORJSONResponse(await fetch_all(presence_rows, PRESENCE_RESOURCE, query, sort))
 
 @app.post("/presence")
 async def mark_presence(presence: Presence, current_user: str = Depends(get_current_user)):
-    presence_doc = {
-        "member_name": presence.member_name,
-        "date": presence.date,
-        "status": presence.status
-    }
-    presence_col.insert_one(presence_doc)
+    # One record per member per day; re-marking overwrites the status
+    old_status = await buckets.mark(presence.member_name, dates.to_db(presence.date), presence.status)
+    await rollups.record_change("presence", presence.member_name, presence.date, old_status, presence.status)
+    await events.publish("presence", "updated" if old_status is not None else "created",
+                         {"member_name": presence.member_name, "date": presence.date}, presence.model_dump())
     return {"message": "Presence marked"}
 
+@app.post("/presence/bulk")
+async def mark_presence_bulk(records: List[Presence], current_user: str = Depends(get_current_user)):
+    """Mark presence for many members at once, upserting on (member_name, date)"""
+    check_size(records)
+    pairs = [(p.member_name, dates.to_db(p.date)) for p in records]
+    previous = await buckets.statuses(pairs)
+    await buckets.restore_months(pairs)
+    outcome = await bulk_apply(presence_col, [buckets.upsert_op(member, day, p.status) for (member, day), p in zip(pairs, records)])
+    changes = []
+    for p, result in zip(records, outcome["results"]):
+        if result["status"] != "error":
+            key = (p.member_name, p.date)
+            # The upsert reports whether the month was new; report the day instead
+            result["status"] = "updated" if previous.get(key) is not None else "created"
+            changes.append((p.member_name, p.date, previous.get(key), p.status))
+            # Later duplicates in the same batch see this write as the old value
+            previous[key] = p.status
+    outcome["summary"]["created"] = sum(1 for r in outcome["results"] if r["status"] == "created")
+    outcome["summary"]["updated"] = sum(1 for r in outcome["results"] if r["status"] == "updated")
+    await rollups.record_changes("presence", changes)
+    await events.publish_many("presence", [
+        ("created" if old is None else "updated", {"member_name": member, "date": date},
+         {"member_name": member, "date": date, "status": new})
+        for member, date, old, new in changes
+    ])
+    return outcome
+
 @app.put("/presence/{member_name}/{date}")
 async def update_presence(member_name: str, date: str, presence: Presence, current_user: str = Depends(get_current_user)):
-    presence_col.update_one(
-        {"member_name": member_name, "date": date},
-        {"$set": {
-            "status": presence.status
-        }}
-    )
+    previous = await buckets.update(member_name, dates.param(date), presence.status)
+    if previous is not None:
+        await rollups.record_change("presence", member_name, date, previous, presence.status)
+        await events.publish("presence", "updated", {"member_name": member_name, "date": date},
+                             {"member_name": member_name, "date": date, "status": presence.status})
     return {"message": "Presence updated"}
 
 @app.delete("/presence/{member_name}/{date}")
 async def delete_presence(member_name: str, date: str, current_user: str = Depends(get_current_user)):
-    presence_col.delete_one({"member_name": member_name, "date": date})
+    previous = await buckets.unmark(member_name, dates.param(date))
+    if previous is not None:
+        await rollups.record_change("presence", member_name, date, previous, None)
+        await events.publish("presence", "deleted", {"member_name": member_name, "date": date})
     return {"message": "Presence record deleted"}
 
 # Additional endpoints for better functionality
-@app.get("/leaves/{member_name}")
+@app.get("/leaves/{member_name}", response_model=List[LeaveRequest])
 async def get_member_leaves(member_name: str):
     """Get all leaves for a specific member"""
-    leaves = []
-    for leave_doc in leaves_col.find({"member_name": member_name}):
-        leaves.append(LeaveRequest(
-            member_name=leave_doc.get("member_name"),
-            start_date=leave_doc.get("start_date"),
-            end_date=leave_doc.get("end_date"),
-            reason=leave_doc.get("reason"),
-            status=leave_doc.get("status"),
-            requested_by=leave_doc.get("requested_by"),
-            approved_by=leave_doc.get("approved_by")
-        ))
-    return leaves
-
-@app.get("/presence/{member_name}")
+    return ORJSONResponse(await fetch_all(leaves_col, LEAVE_RESOURCE, {"member_name": member_name}))
+
+@app.get("/presence/{member_name}", response_model=List[Presence])
 async def get_member_presence(member_name: str):
     """Get all presence records for a specific member"""
-    presence_records = []
-    for presence_doc in presence_col.find({"member_name": member_name}):
-        presence_records.append(Presence(
-            member_name=presence_doc.get("member_name"),
-            date=presence_doc.get("date"),
-            status=presence_doc.get("status")
-        ))
-    return presence_records
+    return ORJSONResponse(await fetch_all(presence_rows, PRESENCE_RESOURCE, {"member_name": member_name}))
 
 @app.get("/leaves/stats/{member_name}")
-async def get_member_leave_stats(member_name: str):
+async def get_member_leave_stats(member_name: str, start_date: Optional[str] = Query(None), end_date: Optional[str] = Query(None)):
     """Get leave statistics for a member"""
-    total_leaves = leaves_col.count_documents({"member_name": member_name})
-    approved_leaves = leaves_col.count_documents({"member_name": member_name, "status": "approved"})
-    pending_leaves = leaves_col.count_documents({"member_name": member_name, "status": "pending"})
-    rejected_leaves = leaves_col.count_documents({"member_name": member_name, "status": "rejected"})
-
-    return {
-        "member_name": member_name,
-        "total_leaves": total_leaves,
-        "approved_leaves": approved_leaves,
-        "pending_leaves": pending_leaves,
-        "rejected_leaves": rejected_leaves
-    }
+    rows = await stats.leave_stats([member_name], dates.param(start_date, "start_date"), dates.param(end_date, "end_date"))
+    return rows[0]
 
 @app.get("/presence/stats/{member_name}")
-async def get_member_presence_stats(member_name: str):
+async def get_member_presence_stats(member_name: str, start_date: Optional[str] = Query(None), end_date: Optional[str] = Query(None)):
     """Get presence statistics for a member"""
-    total_days = presence_col.count_documents({"member_name": member_name})
-    present_days = presence_col.count_documents({"member_name": member_name, "status": "present"})
-    absent_days = presence_col.count_documents({"member_name": member_name, "status": "absent"})
+    rows = await stats.presence_stats([member_name], dates.param(start_date, "start_date"), dates.param(end_date, "end_date"))
+    return rows[0]
 
-    attendance_rate = (present_days / total_days * 100) if total_days > 0 else 0
+@app.get("/stats/rollups")
+async def get_rollup_series(kind: str = Query("presence", pattern="^(presence|leaves)$"), scope: str = Query("all", pattern="^(member|team|all)$"), key: str = Query("*"), granularity: str = Query("month", pattern="^(month|day)$"), start: Optional[str] = Query(None), end: Optional[str] = Query(None)):
+    """Per-month or per-day counters for a member, a team, or everyone"""
+    return {"kind": kind, "scope": scope, "key": key, "series": await rollups.series(kind, scope, key, granularity, start, end)}
 
+async def stats_members(member_name, team):
+    """Resolve the member filter for team-wide stats; None means everyone"""
+    if member_name:
+        return [name.strip() for name in member_name.split(",") if name.strip()]
+    if team:
+        return await stats.team_members(team)
+    return None
+
+@app.get("/stats/leaves")
+async def get_leave_stats(member_name: Optional[str] = Query(None), team: Optional[str] = Query(None), start_date: Optional[str] = Query(None), end_date: Optional[str] = Query(None)):
+    """Leave statistics for several members, a team, or everyone, in one query"""
+    rows = await stats.leave_stats(await stats_members(member_name, team), dates.param(start_date, "start_date"), dates.param(end_date, "end_date"))
+    return {"members": rows, "totals": stats.leave_totals(rows)}
+
+@app.get("/stats/presence")
+async def get_presence_stats(member_name: Optional[str] = Query(None), team: Optional[str] = Query(None), start_date: Optional[str] = Query(None), end_date: Optional[str] = Query(None)):
+    """Presence statistics for several members, a team, or everyone, in one query"""
+    rows = await stats.presence_stats(await stats_members(member_name, team), dates.param(start_date, "start_date"), dates.param(end_date, "end_date"))
+    return {"members": rows, "totals": stats.presence_totals(rows)}
+
+# Availability
+@app.get("/availability")
+async def get_availability(start_date: str = Query(...), end_date: Optional[str] = Query(None), team: Optional[str] = Query(None), member_name: Optional[str] = Query(None), leave_status: Optional[str] = Query(None)):
+    """Members on leave or absent at any point between start_date and end_date (default: start_date)"""
+    start = dates.param(start_date, "start_date")
+    end = dates.param(end_date, "end_date") or start
+    if end < start:
+        raise HTTPException(status_code=400, detail="end_date must not be before start_date")
+    statuses = [s.strip() for s in leave_status.split(",") if s.strip()] if leave_status else None
+    return await availability.availability(start, end, team, await stats_members(member_name, None), statuses)
+
+@app.get("/availability/overlaps")
+async def get_leave_overlaps(member_name: str = Query(...), start_date: str = Query(...), end_date: str = Query(...)):
+    """Active leaves of `member_name` that a request for these dates would overlap"""
+    start = dates.param(start_date, "start_date")
+    end = dates.param(end_date, "end_date")
+    if end < start:
+        raise HTTPException(status_code=400, detail="end_date must not be before start_date")
+    return {"overlaps": (await availability.find_overlaps([{"member_name": member_name, "start_date": start, "end_date": end}]))[0]}
+
+# Change feed
+@app.get("/events")
+async def stream_events(request: Request, since: Optional[int] = Query(None), types: Optional[str] = Query(None), token: Optional[str] = Query(None), credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)):
+    """Server-sent events for every write to tasks, daily, teams, presence and leaves.
+
+    EventSource cannot send headers, so the token may also be passed as
+    ?token=. Resume with ?since=<seq> or the Last-Event-ID header.
+    """
+    verify_token(credentials.credentials if credentials else token or "")
+    resources = None
+    if types:
+        resources = {t.strip() for t in types.split(",") if t.strip()}
+        unknown = resources - set(events.RESOURCES)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown event types: {', '.join(sorted(unknown))}")
+    last_event_id = request.headers.get("last-event-id")
+    if since is None and last_event_id and last_event_id.isdigit():
+        since = int(last_event_id)
+    return StreamingResponse(
+        events.stream(since, resources),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Export endpoints
+@app.get("/export/tasks")
+async def export_tasks(format: str = Query("ndjson"), status: Optional[str] = Query(None), assign: Optional[str] = Query(None), startdate: Optional[str] = Query(None), enddate: Optional[str] = Query(None), fields: Optional[str] = Query(None), sort: Optional[str] = Query(None), current_user: str = Depends(get_current_user)):
+    query = task_query(status, assign, startdate, enddate)
+    return export_response(tasks_col, TASK_RESOURCE, query, "tasks", format, fields, sort)
+
+@app.get("/export/leaves")
+async def export_leaves(format: str = Query("ndjson"), member_name: Optional[str] = Query(None), status: Optional[str] = Query(None), fields: Optional[str] = Query(None), sort: Optional[str] = Query(None), current_user: str = Depends(get_current_user)):
+    query = leave_query(member_name, status)
+    return export_response(leaves_col, LEAVE_RESOURCE, query, "leaves", format, fields, sort)
+
+@app.get("/export/presence")
+async def export_presence(format: str = Query("ndjson"), member_name: Optional[str] = Query(None), date: Optional[str] = Query(None), start_date: Optional[str] = Query(None), end_date: Optional[str] = Query(None), fields: Optional[str] = Query(None), sort: Optional[str] = Query(None), current_user: str = Depends(get_current_user)):
+    query = presence_query(member_name, date, start_date, end_date)
+    return export_response(presence_rows, PRESENCE_RESOURCE, query, "presence", format, fields, sort)
+
+# Admin endpoints
+@app.get("/admin/query-plans")
+async def get_query_plans(current_user: str = Depends(get_current_user)):
+    """Explain the app's query shapes and list recent slow queries from the profiler"""
+    plans = await db.run(indexes.explain_queries)
+    slow = await db.run(indexes.slow_queries)
     return {
-        "member_name": member_name,
-        "total_days": total_days,
-        "present_days": present_days,
-        "absent_days": absent_days,
-        "attendance_rate": round(attendance_rate, 2)
+        "unindexed": [p for p in plans if p["unindexed"]],
+        "plans": plans,
+        "slow_queries": slow
     }
 
-# Shutdown handler to stop the scheduler
-@app.on_event("shutdown")
-def shutdown_event():
-    scheduler.shutdown()
-    print("Reminder scheduler stopped")
+@app.post("/admin/rollups/rebuild")
+async def rebuild_rollups(current_user: str = Depends(get_current_user)):
+    """Recompute the presence and leave rollups from history"""
+    return await db.run(rollups.rebuild)
+
+@app.get("/admin/auth-cache")
+async def get_auth_cache_stats(current_user: str = Depends(get_current_user)):
+    """Hit/miss counters for the verified-token cache"""
+    return token_cache.stats()
+
+@app.get("/admin/search")
+async def get_search_stats(current_user: str = Depends(get_current_user)):
+    """Which search engine is in use, and the local index's size and sync position"""
+    return search_engine.stats()
+
+@app.get("/admin/response-cache")
+async def get_response_cache_stats(current_user: str = Depends(get_current_user)):
+    """Hit, miss and 304 counters for the list-endpoint response cache"""
+    return response_cache.stats()
+
+@app.get("/admin/admission")
+async def get_admission_stats(current_user: str = Depends(get_current_user)):
+    """Per-route concurrency, queue depth, coalesced and shed counts for the hot reads"""
+    return admission.stats()
+
+# Health checks
+@app.get("/health/live")
+async def liveness():
+    """The process is up and the event loop is responsive"""
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def readiness():
+    """Ready once startup has finished and MongoDB still answers a ping"""
+    if not startup_status["ready"]:
+        raise HTTPException(status_code=503, detail={"status": "starting", **startup_status})
+    try:
+        await db.ping()
+    except Exception as e:
+        raise HTTPException(status_code=503, detail={"status": "database unavailable", "error": str(e)})
+    return {"status": "ready", "steps": startup_status["steps"]}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus scrape endpoint"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/admin/profiler")
+async def get_profiler_status(current_user: str = Depends(get_current_user)):
+    return profiler.stats()
+
+@app.post("/admin/profiler")
+async def set_profiler(enabled: bool = Query(...), slow_ms: Optional[float] = Query(None, gt=0), current_user: str = Depends(get_current_user)):
+    """Turn the slow-request sampling profiler on or off"""
+    if enabled:
+        profiler.start(slow_ms)
+    else:
+        profiler.stop()
+    return profiler.stats()
+
+@app.get("/admin/scheduler")
+async def get_scheduler_status(current_user: str = Depends(get_current_user)):
+    """Leader lease, this instance's role and recent scheduled runs"""
+    return await db.run(reminder_scheduler.status)
+
+@app.get("/admin/password-pool")
+async def get_password_pool_stats(current_user: str = Depends(get_current_user)):
+    """Concurrency and queue-depth metrics for the bcrypt worker pool"""
+    return passwords.stats()
@@ -0,0 +1,197 @@
+"""Request, admission, MongoDB, SMTP and bcrypt metrics in Prometheus text format.
+
+A small in-process registry of counters and histograms, rendered by
+GET /metrics. Instruments are updated from the event loop, the database pool,
+the bcrypt pool and the mail worker thread, so every update takes the
+instrument's lock.
+
+Per-request accounting: the metrics middleware puts a fresh RequestStats in
+`current_request` before calling the route. Database calls made from the
+request add to it (AsyncCollection records on the event loop side, where the
+context variable is visible), and the totals are observed per route when the
+response is ready.
+"""
+import asyncio
+import contextvars
+import threading
+import time
+
+import profiler
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+def _label_string(labelnames, values):
+    if not labelnames:
+        return ""
+    pairs = []
+    for name, value in zip(labelnames, values):
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_string(self.labelnames, key)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # key -> [bucket counts..., sum, count]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[i] += 1
+            entry[-2] += value
+            entry[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        names = self.labelnames + ("le",)
+        with self._lock:
+            for key, entry in sorted(self._values.items()):
+                for bound, count in zip(self.buckets + (float("inf"),), entry[:len(self.buckets)] + [entry[-1]]):
+                    lines.append(f"{self.name}_bucket{_label_string(names, key + (_number(bound),))} {count}")
+                labels = _label_string(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {_number(entry[-2])}")
+                lines.append(f"{self.name}_count{labels} {entry[-1]}")
+        return lines
+
+
+REGISTRY = []
+
+
+def _register(instrument):
+    REGISTRY.append(instrument)
+    return instrument
+
+
+REQUEST_SECONDS = _register(Histogram(
+    "http_request_duration_seconds", "Time to produce the response, by route template",
+    ("method", "route", "status")))
+REQUEST_MONGO_CALLS = _register(Histogram(
+    "http_request_mongo_calls", "MongoDB calls made while handling one request",
+    ("method", "route"), COUNT_BUCKETS))
+REQUEST_MONGO_SECONDS = _register(Histogram(
+    "http_request_mongo_seconds", "Time spent waiting on MongoDB while handling one request",
+    ("method", "route")))
+MONGO_OPERATIONS = _register(Counter(
+    "mongo_operations_total", "MongoDB calls by collection and operation",
+    ("collection", "operation")))
+MONGO_SECONDS = _register(Histogram(
+    "mongo_operation_duration_seconds", "MongoDB call time, including the wait for a pool thread",
+    ("collection", "operation")))
+SMTP_SECONDS = _register(Histogram(
+    "smtp_send_duration_seconds", "Time to deliver one message, including connecting when needed",
+    ("result",)))
+BCRYPT_SECONDS = _register(Histogram(
+    "bcrypt_duration_seconds", "Time spent hashing or verifying one password",
+    ("operation",)))
+BCRYPT_WAIT_SECONDS = _register(Histogram(
+    "bcrypt_queue_wait_seconds", "Time a password operation waited for a free worker",
+    ("operation",)))
+REQUESTS_COALESCED = _register(Counter(
+    "http_requests_coalesced_total", "Reads answered with the response of an identical request already in flight",
+    ("route",)))
+REQUESTS_QUEUED = _register(Counter(
+    "http_requests_queued_total", "Reads that waited for a slot under their route's concurrency limit",
+    ("route",)))
+REQUESTS_SHED = _register(Counter(
+    "http_requests_shed_total", "Reads refused with 503 by admission control",
+    ("route", "reason")))
+QUEUE_WAIT_SECONDS = _register(Histogram(
+    "http_request_queue_wait_seconds", "Time a queued read waited for a slot",
+    ("route",)))
+
+
+class RequestStats:
+    __slots__ = ("mongo_calls", "mongo_seconds")
+
+    def __init__(self):
+        self.mongo_calls = 0
+        self.mongo_seconds = 0.0
+
+
+current_request = contextvars.ContextVar("current_request", default=None)
+
+
+def record_mongo(collection, operation, seconds):
+    MONGO_OPERATIONS.inc(collection=collection, operation=operation)
+    MONGO_SECONDS.observe(seconds, collection=collection, operation=operation)
+    stats = current_request.get()
+    if stats is not None:
+        stats.mongo_calls += 1
+        stats.mongo_seconds += seconds
+
+
+def route_template(request):
+    """The matched route's path template, so /tasks/{taskname} is one series"""
+    route = request.scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+async def middleware(request, call_next):
+    """HTTP middleware: per-route latency and per-request MongoDB usage.
+
+    Also hands slow requests to the profiler when it is enabled.
+    """
+    stats = RequestStats()
+    current_request.set(stats)
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        finished = time.perf_counter()
+        route = route_template(request)
+        REQUEST_SECONDS.observe(finished - started, method=request.method, route=route, status=status)
+        REQUEST_MONGO_CALLS.observe(stats.mongo_calls, method=request.method, route=route)
+        REQUEST_MONGO_SECONDS.observe(stats.mongo_seconds, method=request.method, route=route)
+        if profiler.enabled() and (finished - started) * 1000 >= profiler.slow_ms:
+            # Written off the loop; the response does not wait for the file
+            asyncio.get_running_loop().run_in_executor(None, profiler.dump, route, request.method, started, finished)
+
+
+def render():
+    lines = []
+    for instrument in REGISTRY:
+        lines.extend(instrument.render())
+    return "\n".join(lines) + "\n"
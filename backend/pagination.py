@@ -0,0 +1,154 @@
+"""Keyset pagination and field projection for the list endpoints.
+
+A page is requested with `limit` and/or an opaque `cursor` (returned as
+`next_cursor` by the previous page). Pages are ordered by the requested sort
+field with `_id` as tie-breaker, and the cursor stores the last row's
+(sort value, _id), so each page is an indexed range query instead of a skip.
+`fields` restricts the returned keys and is pushed down as a Mongo projection.
+
+Without paging parameters, fetch_all() returns every match. Both build the
+API dicts straight from the projected documents; routes return them as
+ORJSONResponse, so no Pydantic model is built or validated per document.
+"""
+import base64
+
+from bson import json_util
+
+import dates
+from fastapi import HTTPException
+from pydantic import BaseModel
+from typing import List, Optional
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+class Page(BaseModel):
+    items: List[dict]
+    next_cursor: Optional[str] = None
+
+
+class Resource:
+    """How one collection is exposed: API field name -> stored field name"""
+
+    def __init__(self, fields, defaults=None, sortable=None, dates=()):
+        self.fields = fields
+        self.defaults = defaults or {}
+        self.sortable = sortable or list(fields)
+        # API fields stored as BSON dates and returned as "YYYY-MM-DD"
+        self.dates = set(dates)
+
+    def select(self, fields):
+        if not fields:
+            return list(self.fields)
+        selected = [f.strip() for f in fields.split(",") if f.strip()]
+        unknown = [f for f in selected if f not in self.fields]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+        return selected
+
+    def projection(self, selected):
+        return {self.fields[f]: 1 for f in selected}
+
+    def converter(self, selected):
+        """doc -> API dict for `selected`, with the per-field lookups done once"""
+        plan = [(f, self.fields[f], self.defaults.get(f), f in self.dates) for f in selected]
+
+        def convert(doc):
+            item = {}
+            for name, stored, default, is_date in plan:
+                value = doc.get(stored)
+                if value is None:
+                    value = default
+                elif is_date:
+                    value = dates.to_api(value)
+                item[name] = value
+            return item
+        return convert
+
+    def to_api(self, doc, selected):
+        return self.converter(selected)(doc)
+
+    def sort_spec(self, sort):
+        """Parse `field` / `-field` into a pymongo sort list ending with _id"""
+        if not sort:
+            return [("_id", 1)]
+        direction = -1 if sort.startswith("-") else 1
+        name = sort.lstrip("-")
+        if name not in self.sortable:
+            raise HTTPException(status_code=400, detail=f"Cannot sort by {name}")
+        return [(self.fields[name], direction), ("_id", direction)]
+
+
+def encode_cursor(doc, sort_spec):
+    field = sort_spec[0][0]
+    payload = {"i": doc["_id"]}
+    if field != "_id":
+        payload["v"] = doc.get(field)
+    # Extended JSON keeps ObjectId and date values intact across the round trip
+    return base64.urlsafe_b64encode(json_util.dumps(payload).encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        payload = json_util.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        payload = None
+    if not isinstance(payload, dict) or "i" not in payload:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return payload
+
+
+def keyset_filter(query, sort_spec, cursor):
+    if not cursor:
+        return query
+    position = decode_cursor(cursor)
+    field, direction = sort_spec[0]
+    op = "$gt" if direction == 1 else "$lt"
+    if field == "_id":
+        return _and(query, {"_id": {op: position["i"]}})
+    value = position.get("v")
+    ties = {field: value, "_id": {op: position["i"]}}
+    # Null and missing values sort before everything else, and range operators
+    # never match them, so they need their own branches
+    if value is None:
+        after = {"$or": [ties, {field: {"$ne": None}}]} if direction == 1 else ties
+    elif direction == 1:
+        after = {"$or": [{field: {op: value}}, ties]}
+    else:
+        after = {"$or": [{field: {op: value}}, ties, {field: None}]}
+    return _and(query, after)
+
+
+def _and(query, after):
+    return {"$and": [query, after]} if query else after
+
+
+def wants_page(limit, cursor, fields):
+    return limit is not None or cursor is not None or fields is not None
+
+
+async def fetch_page(col, resource, query, limit=None, cursor=None, sort=None, fields=None):
+    """Fetch one page of `col` as API dicts plus the cursor for the next page"""
+    selected = resource.select(fields)
+    spec = resource.sort_spec(sort)
+    limit = min(limit or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+    projection = resource.projection(selected)
+    # The cursor needs the sort key even if the caller did not ask for it
+    projection[spec[0][0]] = 1
+    docs = await col.find(keyset_filter(query, spec, cursor), projection, sort=spec, limit=limit + 1)
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor(docs[-1], spec)
+    convert = resource.converter(selected)
+    return {"items": [convert(doc) for doc in docs], "next_cursor": next_cursor}
+
+
+async def fetch_all(col, resource, query, sort=None):
+    """Every document matching `query` as API dicts, reading only the resource's fields"""
+    selected = list(resource.fields)
+    projection = dict(resource.projection(selected), _id=0)
+    docs = await col.find(query, projection, sort=resource.sort_spec(sort))
+    convert = resource.converter(selected)
+    return [convert(doc) for doc in docs]
@@ -0,0 +1,96 @@
+"""Password hashing on a dedicated, size-limited worker pool.
+
+A bcrypt hash or verify costs 100-300 ms of CPU. Running it inside an async
+handler freezes the event loop for that long, so every call goes through a
+small thread pool instead (bcrypt releases the GIL while hashing). At most
+PASSWORD_HASH_WORKERS operations run at once and the rest wait in line. The
+wait is bounded by time, not by queue length: an operation that has waited
+PASSWORD_HASH_QUEUE_TIMEOUT_MS by the time a worker picks it up is dropped
+with 503, since its client has most likely given up. A burst is therefore
+served in full, only slower, unless it would take longer than that to drain.
+"""
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException
+from passlib.context import CryptContext
+
+import metrics
+
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", min(4, os.cpu_count() or 1)))
+# Common proxy and load balancer idle timeouts are 60 s
+PASSWORD_HASH_QUEUE_TIMEOUT_MS = int(os.getenv("PASSWORD_HASH_QUEUE_TIMEOUT_MS", 60000))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+
+_pending = 0
+_metrics = {
+    "completed": 0,
+    "rejected": 0,
+    "max_queue_depth": 0,
+    "total_seconds": 0.0,
+    "total_wait_seconds": 0.0,
+}
+
+_EXPIRED = object()
+
+
+async def _submit(operation, fn, *args):
+    global _pending
+    _pending += 1
+    _metrics["max_queue_depth"] = max(_metrics["max_queue_depth"], max(0, _pending - PASSWORD_HASH_WORKERS))
+    submitted = time.perf_counter()
+    started = None
+
+    def timed():
+        nonlocal started
+        started = time.perf_counter()
+        if started - submitted > PASSWORD_HASH_QUEUE_TIMEOUT_MS / 1000:
+            return _EXPIRED
+        return fn(*args)
+
+    try:
+        result = await asyncio.get_running_loop().run_in_executor(_executor, timed)
+    finally:
+        _pending -= 1
+    finished = time.perf_counter()
+    metrics.BCRYPT_WAIT_SECONDS.observe(started - submitted, operation=operation)
+    _metrics["total_wait_seconds"] += started - submitted
+    if result is _EXPIRED:
+        _metrics["rejected"] += 1
+        raise HTTPException(status_code=503, detail="Server busy, please retry", headers={"Retry-After": "1"})
+    metrics.BCRYPT_SECONDS.observe(finished - started, operation=operation)
+    _metrics["completed"] += 1
+    _metrics["total_seconds"] += finished - started
+    return result
+
+
+async def verify_password(plain_password, hashed_password):
+    return await _submit("verify", pwd_context.verify, plain_password, hashed_password)
+
+
+async def get_password_hash(password):
+    return await _submit("hash", pwd_context.hash, password)
+
+
+def stats():
+    completed = _metrics["completed"]
+    waited = completed + _metrics["rejected"]
+    return {
+        "workers": PASSWORD_HASH_WORKERS,
+        "queue_timeout_ms": PASSWORD_HASH_QUEUE_TIMEOUT_MS,
+        "in_flight": min(_pending, PASSWORD_HASH_WORKERS),
+        "queue_depth": max(0, _pending - PASSWORD_HASH_WORKERS),
+        "max_queue_depth": _metrics["max_queue_depth"],
+        "completed": completed,
+        "rejected": _metrics["rejected"],
+        "avg_hash_ms": round(_metrics["total_seconds"] / completed * 1000, 2) if completed else 0.0,
+        "avg_wait_ms": round(_metrics["total_wait_seconds"] / waited * 1000, 2) if waited else 0.0,
+    }
+
+
+def shutdown():
+    _executor.shutdown(wait=False)
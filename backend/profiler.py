@@ -0,0 +1,138 @@
+"""Opt-in sampling profiler that dumps stacks for slow requests.
+
+While enabled, a background thread records the stack of every other thread
+each PROFILE_INTERVAL_MS into a bounded ring buffer. When a request takes at
+least `slow_ms`, the samples taken during that request are written to
+PROFILE_DIR as folded stacks ("thread;frame;frame count" per line), the
+input format of flamegraph.pl, speedscope and inferno.
+
+Async handlers share the event loop thread, so a dump also contains whatever
+other requests ran on the loop at the same time; the mongo-*, bcrypt-* and
+mail threads show where offloaded work went. Idle pool threads are skipped.
+
+Enable with PROFILE_SLOW_MS=<ms> at startup, or at runtime through
+POST /admin/profiler.
+"""
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter, deque
+
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", 0))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", 5))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_BUFFER_SAMPLES = int(os.getenv("PROFILE_BUFFER_SAMPLES", 200000))
+MAX_DEPTH = 128
+
+# Leaf frames that mean the thread is parked waiting for work
+_IDLE_FILES = ("threading.py", "queue.py")
+_IDLE_FUNCTIONS = {("thread.py", "_worker")}
+
+
+def _idle(frame):
+    name = os.path.basename(frame.f_code.co_filename)
+    return name in _IDLE_FILES or (name, frame.f_code.co_name) in _IDLE_FUNCTIONS
+
+
+def _stack(frame):
+    names = []
+    while frame is not None and len(names) < MAX_DEPTH:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    names.reverse()
+    return tuple(names)
+
+
+class Sampler(threading.Thread):
+    def __init__(self, interval):
+        super().__init__(daemon=True, name="profiler")
+        self.interval = interval
+        self.samples = deque(maxlen=PROFILE_BUFFER_SAMPLES)
+        self.lock = threading.Lock()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            now = time.perf_counter()
+            names = {t.ident: t.name for t in threading.enumerate()}
+            taken = []
+            for ident, frame in sys._current_frames().items():
+                if ident == self.ident:
+                    continue
+                if _idle(frame):
+                    continue
+                taken.append((now, names.get(ident, str(ident)), _stack(frame)))
+            with self.lock:
+                self.samples.extend(taken)
+
+    def between(self, start, end):
+        with self.lock:
+            return [(thread, stack) for t, thread, stack in self.samples if start <= t <= end]
+
+    def stop(self):
+        self._stop_event.set()
+
+
+_sampler = None
+slow_ms = PROFILE_SLOW_MS
+dumps = 0
+
+
+def enabled():
+    return _sampler is not None
+
+
+def start(threshold_ms=None):
+    global _sampler, slow_ms
+    if threshold_ms is not None:
+        slow_ms = threshold_ms
+    if _sampler is None:
+        _sampler = Sampler(PROFILE_INTERVAL_MS / 1000)
+        _sampler.start()
+        print(f"Profiler started - dumping requests slower than {slow_ms} ms to {PROFILE_DIR}")
+
+
+def stop():
+    global _sampler
+    if _sampler is not None:
+        _sampler.stop()
+        _sampler = None
+        print("Profiler stopped")
+
+
+def folded(samples):
+    counts = Counter(";".join((thread,) + stack) for thread, stack in samples)
+    return "".join(f"{stack} {count}\n" for stack, count in counts.most_common())
+
+
+def dump(route, method, started, finished):
+    """Write the samples taken between `started` and `finished` (perf_counter)"""
+    global dumps
+    sampler = _sampler
+    if sampler is None:
+        return None
+    samples = sampler.between(started, finished)
+    if not samples:
+        return None
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", f"{method}_{route}").strip("_")
+    elapsed_ms = (finished - started) * 1000
+    path = os.path.join(PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{slug}-{elapsed_ms:.0f}ms.folded")
+    with open(path, "w") as f:
+        f.write(folded(samples))
+    dumps += 1
+    return path
+
+
+def stats():
+    return {
+        "enabled": enabled(),
+        "slow_ms": slow_ms,
+        "interval_ms": PROFILE_INTERVAL_MS,
+        "directory": PROFILE_DIR,
+        "buffered_samples": len(_sampler.samples) if _sampler else 0,
+        "dumps": dumps
+    }
@@ -0,0 +1,96 @@
+"""Reminder engine shared by the daily cron job and POST /send_reminders.
+
+One pass over the tasks due on the target date (projected down to the two
+fields we need), one batched `$in` lookup per LOOKUP_BATCH_SIZE assignees to
+resolve emails, then one digest email per recipient queued with a single
+insert. The whole run is synchronous; routes call it through db.run().
+
+Each digest is queued under the idempotency key
+reminder:<due date>:<email>:<hash of the task names>, so running again for
+the same date (a retried or overlapping scheduler run, or a manual POST
+/send_reminders) never emails a recipient the same digest twice. If their
+tasks due that day have changed since, the new digest is sent.
+"""
+import hashlib
+import time
+from datetime import datetime, timedelta
+
+import dates
+import mailer
+from db import tasks_col, team_col
+
+LOOKUP_BATCH_SIZE = 1000
+
+last_run = None
+
+
+def resolve_emails(names):
+    """Map team member name -> email for every name, in batched $in queries"""
+    names = list(names)
+    emails = {}
+    for i in range(0, len(names), LOOKUP_BATCH_SIZE):
+        chunk = names[i:i + LOOKUP_BATCH_SIZE]
+        for member in team_col.sync.find({"name": {"$in": chunk}}, {"_id": 0, "name": 1, "email": 1}):
+            if member.get("email"):
+                emails[member["name"]] = member["email"]
+    return emails
+
+
+def reminder_key(due_date, email, tasknames):
+    digest = hashlib.sha1("\n".join(sorted(tasknames)).encode()).hexdigest()[:16]
+    return f"reminder:{due_date}:{email}:{digest}"
+
+
+def digest_message(due_date, tasknames):
+    if len(tasknames) == 1:
+        subject = f"Reminder: {tasknames[0]} is due {due_date}"
+    else:
+        subject = f"Reminder: {len(tasknames)} tasks due {due_date}"
+    lines = "\n".join(f"  - {name}" for name in tasknames)
+    body = f"Hello,\n\nThe following tasks assigned to you are due on {due_date}:\n\n{lines}\n\nBest regards,\nTask Manager"
+    return subject, body
+
+
+def run_reminders(due_date=None):
+    """Queue one digest per recipient for tasks due on due_date (default: tomorrow)"""
+    global last_run
+    started = time.perf_counter()
+    if due_date is None:
+        due_date = (datetime.utcnow() + timedelta(days=1)).strftime("%Y-%m-%d")
+
+    tasks_by_assignee = {}
+    tasks_scanned = 0
+    cursor = tasks_col.sync.find(
+        {"sendReminder": True, "enddate": dates.to_db(due_date)},
+        {"_id": 0, "taskname": 1, "assign": 1}
+    )
+    for task in cursor:
+        tasks_scanned += 1
+        assign = task.get("assign")
+        if assign:
+            tasks_by_assignee.setdefault(assign, []).append(task.get("taskname"))
+
+    emails = resolve_emails(tasks_by_assignee.keys())
+
+    tasks_by_email = {}
+    for assign, tasknames in tasks_by_assignee.items():
+        email = emails.get(assign)
+        if email:
+            tasks_by_email.setdefault(email, []).extend(tasknames)
+
+    messages = [(email, *digest_message(due_date, tasknames)) for email, tasknames in tasks_by_email.items()]
+    keys = [reminder_key(due_date, email, tasknames) for email, tasknames in tasks_by_email.items()]
+    queued = mailer.queue_emails(messages, keys=keys)
+
+    last_run = {
+        "due_date": due_date,
+        "tasks_scanned": tasks_scanned,
+        "tasks_reminded": sum(len(t) for t in tasks_by_email.values()),
+        "assignees": len(tasks_by_assignee),
+        "unresolved_assignees": len(tasks_by_assignee) - len(emails),
+        "recipients": len(tasks_by_email),
+        "queued": queued,
+        "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+        "finished_at": datetime.utcnow().isoformat()
+    }
+    return last_run
@@ -0,0 +1,118 @@
+"""ETags and conditional GET for the read-heavy list endpoints.
+
+Every write to tasks, teams, leaves or presence publishes a change-feed event,
+and publishing bumps a per-resource version in the same atomic update as the
+event sequence (see events.py). A list response is therefore fully described
+by (resource, version, path and query string), and the ETag is built from
+exactly that, so it is the same on every worker without hashing the body.
+
+For GET /tasks, /teams, /leaves and /presence the middleware reads the current
+version (one point lookup), answers a matching If-None-Match with 304 before
+the handler runs, and otherwise serves the body from a small in-process LRU
+keyed by the same tuple. Only on a miss does the handler query the collection.
+Responses carry `Cache-Control: no-cache`, so browsers revalidate every time
+and get a 304 while nothing has changed.
+"""
+import hashlib
+import os
+from collections import OrderedDict
+
+from starlette.responses import Response
+
+import events
+
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", 256))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", 4 * 1024 * 1024))
+
+CACHED_PATHS = {"/tasks": "tasks", "/teams": "teams", "/leaves": "leaves", "/presence": "presence"}
+
+
+class ResponseCache:
+    def __init__(self, maxsize=RESPONSE_CACHE_SIZE, max_bytes=RESPONSE_CACHE_MAX_BYTES):
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.evictions = 0
+
+    @staticmethod
+    def etag(resource, version, path, query):
+        digest = hashlib.sha1(f"{path}?{query}".encode()).hexdigest()[:16]
+        return f'"{resource}-{version}-{digest}"'
+
+    def get(self, etag):
+        entry = self._entries.get(etag)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(etag)
+        self.hits += 1
+        return entry
+
+    def put(self, etag, body, media_type):
+        if len(body) > self.max_bytes:
+            return
+        self._entries[etag] = (body, media_type)
+        self._entries.move_to_end(etag)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+response_cache = ResponseCache()
+
+
+def _matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+def _headers(etag):
+    return {"ETag": etag, "Cache-Control": "no-cache"}
+
+
+async def conditional_get(request, call_next):
+    """HTTP middleware: 304 / cached body / fill cache for the list endpoints"""
+    resource = CACHED_PATHS.get(request.url.path)
+    if request.method != "GET" or resource is None:
+        return await call_next(request)
+
+    version = (await events.versions()).get(resource, 0)
+    etag = response_cache.etag(resource, version, request.url.path, request.url.query)
+    if _matches(request.headers.get("if-none-match"), etag):
+        response_cache.not_modified += 1
+        return Response(status_code=304, headers=_headers(etag))
+
+    # Lets admission.py coalesce only requests that would get the same body
+    request.state.etag = etag
+    cached = response_cache.get(etag)
+    if cached is not None:
+        body, media_type = cached
+        return Response(content=body, media_type=media_type, headers=_headers(etag))
+
+    response = await call_next(request)
+    if response.status_code != 200:
+        return response
+    body = b"".join([chunk async for chunk in response.body_iterator])
+    media_type = response.headers.get("content-type")
+    response_cache.put(etag, body, media_type)
+    return Response(content=body, media_type=media_type, headers=_headers(etag))
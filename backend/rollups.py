@@ -0,0 +1,165 @@
+"""Materialized presence and leave counters.
+
+The `rollups` collection holds one counter document per (kind, scope, key,
+period):
+
+    kind    presence | leaves
+    scope   member | team | all
+    key     member name, team name, or "*"
+    period  "all", "YYYY-MM" or "YYYY-MM-DD"
+
+with `total` and a `counts` map of status -> number. Presence records count
+towards the period of their `date`, leave requests towards the period of their
+`start_date`.
+
+Write routes report each change with record_change(kind, member, date,
+old_status, new_status). It $inc's every affected counter in one bulk write,
+so dashboard reads are one indexed lookup per member or team. Counters are
+attributed to the member's team at write time. `python rollups.py rebuild`
+recomputes everything from history, e.g. after first deploy or after members
+move teams. Reads only use the rollups after a rebuild has completed once.
+"""
+import argparse
+import time
+from datetime import datetime
+
+from pymongo import ReplaceOne, UpdateOne
+
+import buckets
+import db
+from db import leaves_col, team_col
+
+rollups_col = db.AsyncCollection('rollups')
+
+KIND_DATE_FIELD = {"presence": "date", "leaves": "start_date"}
+META_ID = "_rollup_meta"
+
+
+def rollup_id(kind, scope, key, period):
+    return f"{kind}|{scope}|{key}|{period}"
+
+
+def _periods(date):
+    if isinstance(date, datetime):
+        date = date.strftime("%Y-%m-%d")
+    periods = ["all"]
+    if date and len(date) >= 7:
+        periods.append(date[:7])
+    if date and len(date) >= 10:
+        periods.append(date[:10])
+    return periods
+
+
+def _targets(kind, member, team, date):
+    scopes = [("member", member), ("all", "*")]
+    if team:
+        scopes.append(("team", team))
+    for scope, key in scopes:
+        for period in _periods(date):
+            yield {"_id": rollup_id(kind, scope, key, period), "kind": kind, "scope": scope, "key": key, "period": period}
+
+
+def _operations(kind, member, team, date, old_status, new_status):
+    inc = {}
+    if old_status is not None:
+        inc[f"counts.{old_status}"] = -1
+        inc["total"] = -1
+    if new_status is not None:
+        inc[f"counts.{new_status}"] = inc.get(f"counts.{new_status}", 0) + 1
+        inc["total"] = inc.get("total", 0) + 1
+    inc = {k: v for k, v in inc.items() if v}
+    if not inc:
+        return []
+    ops = []
+    for target in _targets(kind, member, team, date):
+        ident = {k: v for k, v in target.items() if k != "_id"}
+        ops.append(UpdateOne({"_id": target["_id"]}, {"$inc": inc, "$setOnInsert": ident}, upsert=True))
+    return ops
+
+
+async def record_changes(kind, changes):
+    """Apply [(member, date, old_status, new_status)] to the counters"""
+    changes = [c for c in changes if c[2] != c[3]]
+    if not changes:
+        return
+    names = list({c[0] for c in changes})
+    teams = {m["name"]: m.get("team") for m in await team_col.find({"name": {"$in": names}}, {"_id": 0, "name": 1, "team": 1})}
+    ops = []
+    for member, date, old_status, new_status in changes:
+        ops.extend(_operations(kind, member, teams.get(member), date, old_status, new_status))
+    if ops:
+        await rollups_col.bulk_write(ops, ordered=False)
+
+
+async def record_change(kind, member, date, old_status, new_status):
+    await record_changes(kind, [(member, date, old_status, new_status)])
+
+
+async def is_built():
+    return await rollups_col.find_one({"_id": META_ID}) is not None
+
+
+async def get(kind, scope, keys=None, period="all"):
+    """Counters for `keys` (default: every key), as {key: {"total": n, "counts": {...}}}"""
+    if keys is None:
+        query = {"kind": kind, "scope": scope, "period": period}
+    else:
+        query = {"_id": {"$in": [rollup_id(kind, scope, key, period) for key in keys]}}
+    docs = await rollups_col.find(query, {"_id": 0, "key": 1, "total": 1, "counts": 1})
+    return {d["key"]: {"total": d.get("total", 0), "counts": d.get("counts", {})} for d in docs}
+
+
+async def series(kind, scope, key, granularity="month", start=None, end=None):
+    """Counters for one member/team/everyone over time, oldest first"""
+    query = {"kind": kind, "scope": scope, "key": key}
+    period = {"$regex": r"^\d{4}-\d{2}$" if granularity == "month" else r"^\d{4}-\d{2}-\d{2}$"}
+    if start:
+        period["$gte"] = start
+    if end:
+        period["$lte"] = end
+    query["period"] = period
+    docs = await rollups_col.find(query, {"_id": 0, "period": 1, "total": 1, "counts": 1}, sort=[("period", 1)])
+    return [{"period": d["period"], "total": d.get("total", 0), "counts": d.get("counts", {})} for d in docs]
+
+
+def rebuild():
+    """Recompute every counter from presence (both tiers) and leave history"""
+    started = time.perf_counter()
+    teams = {m["name"]: m.get("team") for m in team_col.sync.find({}, {"_id": 0, "name": 1, "team": 1})}
+    counters = {}
+    scanned = 0
+    history = (
+        ("presence", buckets.sync_rows()),
+        ("leaves", leaves_col.sync.find({}, {"_id": 0, "member_name": 1, "status": 1, "start_date": 1})),
+    )
+    for kind, docs in history:
+        date_field = KIND_DATE_FIELD[kind]
+        for doc in docs:
+            scanned += 1
+            member = doc.get("member_name")
+            status = doc.get("status")
+            for target in _targets(kind, member, teams.get(member), doc.get(date_field)):
+                counter = counters.setdefault(target["_id"], dict(target, total=0, counts={}))
+                counter["total"] += 1
+                counter["counts"][status] = counter["counts"].get(status, 0) + 1
+
+    col = rollups_col.sync
+    # Dropping the meta document first sends reads back to the raw
+    # collections until the new counters are complete
+    col.delete_many({})
+    docs = list(counters.values())
+    for i in range(0, len(docs), 1000):
+        col.bulk_write([ReplaceOne({"_id": d["_id"]}, d, upsert=True) for d in docs[i:i + 1000]], ordered=False)
+    col.insert_one({"_id": META_ID, "built_at": datetime.utcnow(), "records": scanned})
+    return {"records_scanned": scanned, "counters": len(docs), "duration_ms": round((time.perf_counter() - started) * 1000, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain presence and leave rollups")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.parse_args()
+    print(rebuild())
+
+
+if __name__ == "__main__":
+    main()
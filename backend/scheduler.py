@@ -0,0 +1,212 @@
+"""Reminder scheduling that is safe with many workers and replicas.
+
+Every API process runs a Coordinator, but only the one holding the leader
+lease (a document in `scheduler_leases` with a holder and an expiry) does any
+work. Each process renews or tries to take the lease every
+SCHEDULER_LEASE_SECONDS / 3; if the leader dies, another process takes over
+once the lease expires.
+
+On each heartbeat the leader checks whether the most recent 9:00 run
+(REMINDER_HOUR:REMINDER_MINUTE, server local time) has completed and, if not,
+runs it. The normal daily run and catching up after downtime are the same
+code path; runs missed by more than REMINDER_CATCHUP_HOURS are skipped, since
+those reminders would arrive after the tasks were due.
+
+A run is claimed by inserting `job_runs` document <job>:<date> before doing
+anything, so even two leaders (e.g. after a lease expired mid-run) cannot
+both start it. Failed runs are retried up to SCHEDULER_MAX_ATTEMPTS times,
+and a run stuck in `running` for SCHEDULER_RUN_TIMEOUT seconds is reclaimed.
+Reminder emails carry idempotency keys (see reminders.py), so a reclaimed run
+does not resend what the first attempt queued.
+
+The leader also runs the archive job (archive.py) once per day, claimed the
+same way as archive:<date>.
+"""
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+
+from apscheduler.schedulers.background import BackgroundScheduler
+from pymongo import DESCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+import archive
+import db
+import reminders
+
+SCHEDULER_LEASE_SECONDS = int(os.getenv("SCHEDULER_LEASE_SECONDS", 60))
+SCHEDULER_RUN_TIMEOUT = int(os.getenv("SCHEDULER_RUN_TIMEOUT", 900))
+SCHEDULER_MAX_ATTEMPTS = int(os.getenv("SCHEDULER_MAX_ATTEMPTS", 3))
+REMINDER_HOUR = int(os.getenv("REMINDER_HOUR", 9))
+REMINDER_MINUTE = int(os.getenv("REMINDER_MINUTE", 0))
+REMINDER_CATCHUP_HOURS = float(os.getenv("REMINDER_CATCHUP_HOURS", 12))
+
+LEASE_ID = "scheduler"
+REMINDER_JOB = "daily_reminders"
+ARCHIVE_JOB = "archive"
+
+INSTANCE_ID = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+leases_col = db.AsyncCollection('scheduler_leases')
+runs_col = db.AsyncCollection('job_runs')
+
+
+def acquire_lease(instance_id=INSTANCE_ID, now=None):
+    """Take or renew the leader lease; True if `instance_id` holds it"""
+    now = now or datetime.utcnow()
+    try:
+        leases_col.sync.find_one_and_update(
+            {"_id": LEASE_ID, "$or": [{"holder": instance_id}, {"expires_at": {"$lte": now}}]},
+            {"$set": {"holder": instance_id, "expires_at": now + timedelta(seconds=SCHEDULER_LEASE_SECONDS), "renewed_at": now}},
+            upsert=True
+        )
+        return True
+    except DuplicateKeyError:
+        # Held by someone else and not expired: the upsert collided on _id
+        return False
+
+
+def release_lease(instance_id=INSTANCE_ID):
+    leases_col.sync.delete_one({"_id": LEASE_ID, "holder": instance_id})
+
+
+def latest_fire_time(now=None):
+    """The most recent scheduled reminder time at or before `now` (local time)"""
+    now = now or datetime.now()
+    fire = now.replace(hour=REMINDER_HOUR, minute=REMINDER_MINUTE, second=0, microsecond=0)
+    if fire > now:
+        fire -= timedelta(days=1)
+    return fire
+
+
+def claim_run(job, period, instance_id=INSTANCE_ID, now=None):
+    """Claim run <job>:<period>; False if it is done, running elsewhere or out of attempts"""
+    now = now or datetime.utcnow()
+    run_id = f"{job}:{period}"
+    lease_until = now + timedelta(seconds=SCHEDULER_RUN_TIMEOUT)
+    try:
+        runs_col.sync.insert_one({
+            "_id": run_id, "job": job, "period": period, "status": "running", "owner": instance_id,
+            "attempts": 1, "started_at": now, "lease_until": lease_until
+        })
+        return True
+    except DuplicateKeyError:
+        pass
+    # Retry a failed run, or take over one whose owner died mid-run
+    doc = runs_col.sync.find_one_and_update(
+        {"_id": run_id, "attempts": {"$lt": SCHEDULER_MAX_ATTEMPTS}, "$or": [
+            {"status": "failed"},
+            {"status": "running", "lease_until": {"$lte": now}}
+        ]},
+        {"$set": {"status": "running", "owner": instance_id, "started_at": now, "lease_until": lease_until},
+         "$inc": {"attempts": 1}},
+        return_document=ReturnDocument.AFTER
+    )
+    return doc is not None
+
+
+def finish_run(job, period, result=None, error=None):
+    update = {"status": "failed" if error else "done", "finished_at": datetime.utcnow()}
+    if error:
+        update["error"] = str(error)
+    else:
+        update["result"] = result
+    runs_col.sync.update_one({"_id": f"{job}:{period}"}, {"$set": update, "$unset": {"lease_until": ""}})
+
+
+def run_reminders_for(fire_time):
+    """Claim and run the reminder job scheduled at `fire_time`; returns its stats or None"""
+    period = fire_time.strftime("%Y-%m-%d")
+    if not claim_run(REMINDER_JOB, period):
+        return None
+    due_date = (fire_time + timedelta(days=1)).strftime("%Y-%m-%d")
+    try:
+        stats = reminders.run_reminders(due_date)
+    except Exception as e:
+        finish_run(REMINDER_JOB, period, error=e)
+        print(f"Error in scheduled reminders for {period}: {e}")
+        return None
+    finish_run(REMINDER_JOB, period, result=stats)
+    print(f"Scheduled reminders for {period}: {stats['recipients']} digests for {stats['tasks_reminded']} tasks")
+    return stats
+
+
+def run_archive_for(day):
+    """Claim and run the archive job for `day`; returns what moved or None"""
+    if archive.ARCHIVE_AFTER_DAYS <= 0:
+        return None
+    period = day.strftime("%Y-%m-%d")
+    if not claim_run(ARCHIVE_JOB, period):
+        return None
+    try:
+        report = archive.run()
+    except Exception as e:
+        finish_run(ARCHIVE_JOB, period, error=e)
+        print(f"Error in scheduled archive for {period}: {e}")
+        return None
+    finish_run(ARCHIVE_JOB, period, result=report)
+    print(f"Archived before {report['boundary']}: {report['daily']} daily tasks, "
+          f"{report['presence_buckets']} presence buckets")
+    return report
+
+
+def recent_runs(limit=10):
+    return list(runs_col.sync.find({}, {"lease_until": 0}, sort=[("started_at", DESCENDING)], limit=limit))
+
+
+class Coordinator:
+    """Per-process heartbeat that keeps the lease and fires due runs when leader"""
+
+    def __init__(self):
+        self.is_leader = False
+        self._scheduler = BackgroundScheduler()
+
+    @property
+    def running(self):
+        return self._scheduler.running
+
+    def start(self):
+        self._scheduler.add_job(
+            self.heartbeat, "interval",
+            seconds=max(1, SCHEDULER_LEASE_SECONDS // 3),
+            id="scheduler_heartbeat",
+            next_run_time=datetime.now(),
+            max_instances=1,
+            coalesce=True
+        )
+        self._scheduler.start()
+        print(f"Reminder scheduler started on {INSTANCE_ID} - daily reminders at {REMINDER_HOUR:02d}:{REMINDER_MINUTE:02d}")
+
+    def heartbeat(self):
+        try:
+            leader = acquire_lease()
+            if leader != self.is_leader:
+                print(f"{INSTANCE_ID} {'is now' if leader else 'is no longer'} the scheduler leader")
+            self.is_leader = leader
+            if not leader:
+                return
+            fire_time = latest_fire_time()
+            if datetime.now() - fire_time <= timedelta(hours=REMINDER_CATCHUP_HOURS):
+                run_reminders_for(fire_time)
+            run_archive_for(datetime.now())
+        except Exception as e:
+            print(f"Scheduler heartbeat error: {e}")
+
+    def status(self):
+        lease = leases_col.sync.find_one({"_id": LEASE_ID}, {"_id": 0})
+        return {
+            "instance": INSTANCE_ID,
+            "is_leader": self.is_leader,
+            "lease": lease,
+            "next_reminder_run": (latest_fire_time() + timedelta(days=1)).isoformat(),
+            "recent_runs": recent_runs()
+        }
+
+    def shutdown(self):
+        self._scheduler.shutdown(wait=False)
+        if self.is_leader:
+            # Let another instance take over without waiting for expiry
+            release_lease()
+            self.is_leader = False
+        print("Reminder scheduler stopped")
@@ -0,0 +1,284 @@
+"""Ranked full-text search over tasks and daily tasks.
+
+Two engines answer the same queries:
+
+- `mongo` (default) uses the text indexes declared in indexes.py: task names,
+  and daily task names and descriptions (names weigh three times as much).
+  Each collection is queried with $text sorted by textScore, and the two
+  ranked lists are merged.
+- `local` keeps an inverted index in this process, for running without a
+  MongoDB server that supports $text (mongomock has no $text). It is built
+  from the collections on first use. Before each search it replays the change
+  feed since the last event it applied, so writes from any worker are seen.
+  Documents are keyed like the API keys them (taskname, daily name). Scores
+  are tf-idf with the same field weights.
+
+Select one with SEARCH_BACKEND; it defaults to `local` on DB_ENGINE=sqlite,
+which has no $text either. Queries match any of their words. Results are
+filtered by assignee, status (tasks only) and date: tasks whose start-end
+span overlaps the range, daily tasks dated inside it. They are paged with an
+opaque cursor, up to SEARCH_MAX_RESULTS deep.
+"""
+import asyncio
+import base64
+import json
+import math
+import os
+import re
+import time
+
+from fastapi import HTTPException
+
+import dates
+import db
+import events
+from archive import daily_tiers
+from db import tasks_col
+
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "local" if db.DB_ENGINE == "sqlite" else "mongo")
+SEARCH_MAX_RESULTS = 1000
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+# kind -> (collection, key field, {text field: weight})
+SOURCES = {
+    "tasks": (tasks_col, "taskname", {"taskname": 1}),
+    # Archived daily tasks are searched too (see archive.py)
+    "daily": (daily_tiers, "name", {"name": 3, "description": 1}),
+}
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    return _TOKEN.findall(str(text).lower()) if text else []
+
+
+def encode_cursor(offset):
+    return base64.urlsafe_b64encode(json.dumps({"o": offset}).encode()).decode()
+
+
+def decode_cursor(cursor):
+    if not cursor:
+        return 0
+    try:
+        offset = json.loads(base64.urlsafe_b64decode(cursor.encode()))["o"]
+    except Exception:
+        offset = None
+    if not isinstance(offset, int) or offset < 0:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return offset
+
+
+def parse_kinds(kinds):
+    if not kinds:
+        return list(SOURCES)
+    selected = [k.strip() for k in kinds.split(",") if k.strip()]
+    unknown = [k for k in selected if k not in SOURCES]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown kinds: {', '.join(unknown)}")
+    return selected
+
+
+def _page(ranked, offset, limit):
+    """[(score, kind, item)] best first -> response page"""
+    page = ranked[offset:offset + limit]
+    more = len(ranked) > offset + limit and offset + limit < SEARCH_MAX_RESULTS
+    return {
+        "items": [dict(item, kind=kind, score=round(score, 4)) for score, kind, item in page],
+        "next_cursor": encode_cursor(offset + limit) if more else None
+    }
+
+
+class MongoSearch:
+    """$text queries against the text indexes"""
+
+    backend = "mongo"
+
+    def __init__(self, resources):
+        self.resources = resources
+
+    def _filter(self, kind, q, assign, status, start, end):
+        query = {"$text": {"$search": q}}
+        if assign:
+            query["assign"] = assign
+        if kind == "tasks":
+            if status:
+                query["status"] = status
+            if end:
+                query["startdate"] = {"$lte": end}
+            if start:
+                query["enddate"] = {"$gte": start}
+        elif start or end:
+            # Daily task dates are stored as "YYYY-MM-DD" strings
+            query["date"] = {}
+            if start:
+                query["date"]["$gte"] = dates.to_api(start)
+            if end:
+                query["date"]["$lte"] = dates.to_api(end)
+        return query
+
+    async def _ranked(self, kind, q, assign, status, start, end, count):
+        col = SOURCES[kind][0]
+        resource = self.resources[kind]
+        selected = list(resource.fields)
+        projection = dict(resource.projection(selected), score={"$meta": "textScore"})
+        docs = await col.find(self._filter(kind, q, assign, status, start, end), projection,
+                              sort=[("score", {"$meta": "textScore"})], limit=count)
+        return [(doc["score"], kind, resource.to_api(doc, selected)) for doc in docs]
+
+    async def search(self, q, kinds, assign=None, status=None, start=None, end=None, limit=DEFAULT_LIMIT, offset=0):
+        if status:
+            # Only tasks have a status
+            kinds = [k for k in kinds if k == "tasks"]
+        count = offset + limit + 1
+        lists = await asyncio.gather(*(self._ranked(k, q, assign, status, start, end, count) for k in kinds))
+        ranked = sorted((hit for hits in lists for hit in hits), key=lambda hit: -hit[0])
+        return _page(ranked, offset, limit)
+
+    def stats(self):
+        return {"backend": self.backend}
+
+
+class LocalSearch:
+    """In-process inverted index kept current from the change feed"""
+
+    backend = "local"
+
+    def __init__(self, resources):
+        self.resources = resources
+        self.docs = {}        # (kind, key) -> API item
+        self.postings = {}    # term -> {(kind, key): weighted term frequency}
+        self.terms = {}       # (kind, key) -> terms, for removal
+        self.seq = None
+        self.synced_at = 0.0
+        self.builds = 0
+        self.events_applied = 0
+        self._lock = asyncio.Lock()
+
+    def _item(self, kind, data):
+        """Event data (API field names) -> item with the resource's defaults"""
+        resource = self.resources[kind]
+        item = {}
+        for f in resource.fields:
+            value = data.get(f)
+            item[f] = resource.defaults.get(f) if value is None and f in resource.defaults else value
+        return item
+
+    def _remove(self, ref):
+        for term in self.terms.pop(ref, ()):
+            posting = self.postings.get(term)
+            if posting is not None:
+                posting.pop(ref, None)
+                if not posting:
+                    del self.postings[term]
+        self.docs.pop(ref, None)
+
+    def _add(self, kind, item):
+        key_field, weights = SOURCES[kind][1], SOURCES[kind][2]
+        ref = (kind, item.get(key_field))
+        self._remove(ref)
+        counts = {}
+        for field, weight in weights.items():
+            for term in tokenize(item.get(field)):
+                counts[term] = counts.get(term, 0) + weight
+        self.docs[ref] = item
+        self.terms[ref] = list(counts)
+        for term, count in counts.items():
+            self.postings.setdefault(term, {})[ref] = count
+
+    def _apply(self, event):
+        kind = event["resource"]
+        key_field = SOURCES[kind][1]
+        ref = (kind, (event.get("key") or {}).get(key_field))
+        if event["action"] == "deleted":
+            self._remove(ref)
+        elif event["action"] == "created" or ref in self.docs:
+            # Created and updated events carry the whole document. The index
+            # holds every existing document, so an update to any other key
+            # matched nothing and must not add one
+            self._add(kind, self._item(kind, event.get("data") or {}))
+        self.events_applied += 1
+
+    async def rebuild(self):
+        # Events from now on are replayed afterwards; applying one twice is harmless
+        seq = await events.latest_seq()
+        self.docs, self.postings, self.terms = {}, {}, {}
+        for kind, (col, _, _) in SOURCES.items():
+            resource = self.resources[kind]
+            selected = list(resource.fields)
+            async for batch in col.find_batches({}, resource.projection(selected), batch_size=1000):
+                for doc in batch:
+                    self._add(kind, resource.to_api(doc, selected))
+        self.seq = seq
+        self.builds += 1
+
+    async def sync(self):
+        async with self._lock:
+            stale = time.monotonic() - self.synced_at > events.EVENT_RETENTION_HOURS * 3600 / 2
+            if self.seq is None or stale:
+                # Never built, or idle long enough that events may have expired
+                await self.rebuild()
+            while True:
+                batch, seq = await events.read_since(self.seq, set(SOURCES))
+                for event in batch:
+                    self._apply(event)
+                progressed = seq != self.seq
+                self.seq = seq
+                if not progressed:
+                    break
+            self.synced_at = time.monotonic()
+
+    def _matches(self, kind, item, assign, status, start, end):
+        if assign and item.get("assign") != assign:
+            return False
+        if kind == "tasks":
+            if status and item.get("status") != status:
+                return False
+            if end and (item.get("startdate") or "") > dates.to_api(end):
+                return False
+            if start and (item.get("enddate") or "") < dates.to_api(start):
+                return False
+        else:
+            if status:
+                return False
+            day = item.get("date") or ""
+            if (start and day < dates.to_api(start)) or (end and day > dates.to_api(end)):
+                return False
+        return True
+
+    async def search(self, q, kinds, assign=None, status=None, start=None, end=None, limit=DEFAULT_LIMIT, offset=0):
+        await self.sync()
+        total = len(self.docs) or 1
+        scores = {}
+        for term in set(tokenize(q)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + total / len(posting))
+            for ref, count in posting.items():
+                scores[ref] = scores.get(ref, 0.0) + idf * count
+        ranked = [
+            (score, ref[0], self.docs[ref])
+            for ref, score in scores.items()
+            if ref[0] in kinds and self._matches(ref[0], self.docs[ref], assign, status, start, end)
+        ]
+        ranked.sort(key=lambda hit: (-hit[0], hit[1], str(hit[2].get(SOURCES[hit[1]][1]))))
+        return _page(ranked, offset, limit)
+
+    def stats(self):
+        return {
+            "backend": self.backend,
+            "documents": len(self.docs),
+            "terms": len(self.postings),
+            "seq": self.seq,
+            "builds": self.builds,
+            "events_applied": self.events_applied
+        }
+
+
+def create_engine(resources):
+    """The engine chosen by SEARCH_BACKEND; `resources` maps kind -> pagination.Resource"""
+    if SEARCH_BACKEND == "local":
+        return LocalSearch(resources)
+    return MongoSearch(resources)
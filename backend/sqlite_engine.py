@@ -0,0 +1,1492 @@
+"""Embedded SQLite storage engine.
+
+Runs the API without a MongoDB server: set DB_ENGINE=sqlite and every
+collection is stored in one SQLite file (SQLITE_PATH, or ":memory:"). It
+implements the part of the pymongo client, database and collection API that
+AsyncCollection and the modules calling `.sync` use, with the same results,
+exceptions (DuplicateKeyError, BulkWriteError, OperationFailure) and result
+classes, so nothing above db.py knows which engine it runs on.
+
+Storage. Each collection is a table `"<database>.<collection>"` with the
+_id as primary key and the rest of the document as JSON. Values JSON cannot
+hold are tagged strings that sort correctly among themselves: datetimes as
+"\\x01D" + ISO 8601 (millisecond precision, as in MongoDB) and ObjectIds as
+"\\x01O" + hex. Indexes from indexes.py become expression indexes on
+json_extract(); text indexes are skipped, search uses SEARCH_BACKEND=local.
+
+Queries. Filters, sorts, skip and limit are compiled to one SQL statement
+whose text depends only on the filter's shape, with every value bound as a
+parameter ($in lists as one JSON array), so each shape is prepared once per
+connection and then served from the statement cache. Range operators only
+match values of the operand's type, as in MongoDB. Supported: $eq, $ne, $gt,
+$gte, $lt, $lte, $in, $nin, $exists, $type, $regex, $and, $or and $nor;
+anything else raises OperationFailure. Matching inside arrays is not
+supported either: the client remembers which fields hold arrays (from its
+own writes, and a one-time scan the first time a field is filtered or sorted
+on), and a filter or sort that compares such a field by value raises instead
+of comparing the whole array. Sorts on fields holding several types follow
+SQLite's type order. Aggregations run their leading
+$match in SQL and the remaining stages ($match, $project, $addFields,
+$unwind, $group, $facet, $sort, $skip, $limit, $count) in Python.
+
+Concurrency. The database runs in WAL mode, so reads never wait for a
+writer. Connections are pooled and used by one thread at a time. Writes take
+a process-wide lock and run in BEGIN IMMEDIATE transactions, so
+find_one_and_update and friends are atomic; other processes on the same file
+wait up to SQLITE_BUSY_TIMEOUT_MS for the write lock. TTL indexes are applied
+on writes to their collection, at most once a minute.
+"""
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+
+import orjson
+from bson import ObjectId
+from bson.errors import InvalidDocument
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from pymongo.operations import DeleteMany, DeleteOne, IndexModel, InsertOne, ReplaceOne, UpdateMany, UpdateOne
+from pymongo.results import BulkWriteResult, DeleteResult, InsertManyResult, InsertOneResult, UpdateResult
+
+SQLITE_PATH = os.getenv("SQLITE_PATH", "data/smartsheet.db")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000))
+SQLITE_CACHE_MB = int(os.getenv("SQLITE_CACHE_MB", 64))
+SQLITE_STATEMENT_CACHE = 512
+SQLITE_MAX_IDLE = 32
+TTL_INTERVAL_SECONDS = 60
+
+_DATE = "\x01D"
+_OID = "\x01O"
+_STR = "\x01S"
+# Upper bounds of the tagged ranges, for type guards
+_DATE_END = "\x01E"
+_OID_END = "\x01P"
+
+_MISSING = object()
+
+
+# Values -------------------------------------------------------------------
+
+def _iso(value):
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    # BSON dates have millisecond precision
+    return value.replace(microsecond=value.microsecond // 1000 * 1000).isoformat(timespec="microseconds")
+
+
+def encode(value):
+    """A BSON-like value as JSON-compatible data"""
+    if isinstance(value, str):
+        return _STR + value if value[:1] == "\x01" else value
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if isinstance(value, dict):
+        return {k: encode(v) for k, v in value.items()}
+    if isinstance(value, datetime):
+        return _DATE + _iso(value)
+    if isinstance(value, ObjectId):
+        return _OID + str(value)
+    if isinstance(value, (list, tuple)):
+        return [encode(v) for v in value]
+    raise InvalidDocument(f"cannot encode object: {value!r}, of type: {type(value)}")
+
+
+def decode(value):
+    if isinstance(value, str):
+        if value[:1] != "\x01":
+            return value
+        tag = value[:2]
+        if tag == _DATE:
+            return datetime.fromisoformat(value[2:])
+        if tag == _OID:
+            return ObjectId(value[2:])
+        return value[2:]
+    if isinstance(value, dict):
+        return {k: decode(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [decode(v) for v in value]
+    return value
+
+
+def _dumps(value):
+    return orjson.dumps(encode(value)).decode()
+
+
+def _body(doc):
+    """The stored JSON of a document: everything but the _id"""
+    return _dumps({k: v for k, v in doc.items() if k != "_id"})
+
+
+def _document(raw_id, text):
+    doc = {"_id": decode(raw_id)}
+    for key, value in orjson.loads(text).items():
+        doc[key] = decode(value)
+    return doc
+
+
+def _key(value):
+    """An _id as stored in the id column"""
+    value = encode(value)
+    if isinstance(value, (dict, list)) or value is None:
+        raise OperationFailure("the sqlite engine only supports scalar _id values")
+    return value
+
+
+def _order_key(value):
+    """Sort key following MongoDB's order across types"""
+    if value is None or value is _MISSING:
+        return (1, 0)
+    if isinstance(value, bool):
+        return (8, value)
+    if isinstance(value, (int, float)):
+        return (2, value)
+    if isinstance(value, str):
+        return (3, value)
+    if isinstance(value, dict):
+        return (4, _dumps(value))
+    if isinstance(value, list):
+        return (5, _dumps(value))
+    if isinstance(value, ObjectId):
+        return (7, str(value))
+    if isinstance(value, datetime):
+        return (9, value)
+    return (10, str(value))
+
+
+def _get(doc, path):
+    value = doc
+    for part in path.split("."):
+        if isinstance(value, dict):
+            value = value.get(part, _MISSING)
+        elif isinstance(value, list) and part.isdigit() and int(part) < len(value):
+            value = value[int(part)]
+        else:
+            return _MISSING
+        if value is _MISSING:
+            return _MISSING
+    return value
+
+
+def _set(doc, path, value):
+    parts = path.split(".")
+    for part in parts[:-1]:
+        child = doc.setdefault(part, {})
+        if not isinstance(child, dict):
+            raise OperationFailure(f"Cannot create field '{part}' in element {{{part}: {child!r}}}")
+        doc = child
+    doc[parts[-1]] = value
+
+
+def _unset(doc, path):
+    parts = path.split(".")
+    for part in parts[:-1]:
+        doc = doc.get(part)
+        if not isinstance(doc, dict):
+            return
+    doc.pop(parts[-1], None)
+
+
+def _list_paths(doc, prefix=""):
+    """Dotted paths of the arrays in a document"""
+    for key, value in doc.items():
+        if isinstance(value, list):
+            yield prefix + key
+        elif isinstance(value, dict):
+            yield from _list_paths(value, f"{prefix}{key}.")
+
+
+def _compared_fields(filter):
+    """Fields a filter compares by value, which MongoDB would match inside arrays"""
+    for key, cond in filter.items():
+        if key in ("$and", "$or", "$nor"):
+            for f in cond:
+                yield from _compared_fields(f)
+        elif key.startswith("$") or key == "_id":
+            continue
+        elif isinstance(cond, dict) and cond and all(k.startswith("$") for k in cond):
+            for op, value in cond.items():
+                whole = op in ("$eq", "$ne") and isinstance(value, (dict, list))
+                if not whole and op not in ("$exists", "$options") and not (op == "$type" and value == "array"):
+                    yield key
+                    break
+        elif not isinstance(cond, (dict, list)):
+            yield key
+
+
+# Filters as SQL ------------------------------------------------------------
+
+@lru_cache(maxsize=1024)
+def _path(field):
+    parts = "".join('."' + part.replace('"', '\\"') + '"' for part in field.split("."))
+    return "'$" + parts.replace("'", "''") + "'"
+
+
+def _column(field):
+    """(value expression, JSON type expression) for a field"""
+    if field == "_id":
+        return "id", "typeof(id)"
+    path = _path(field)
+    return f"json_extract(doc, {path})", f"json_type(doc, {path})"
+
+
+# $type aliases -> the JSON types (and tagged strings) they cover
+_TYPES = {
+    "double": "real", "int": "integer", "long": "integer", "bool": "bool", "null": "null",
+    "object": "object", "array": "array", "string": "string", "date": "date", "objectId": "objectId",
+}
+
+
+def _type_clause(field, value, params, bounds=(False, False)):
+    """Restrict a field to the type of `value`.
+
+    `bounds` says whether the caller already bounds the field from below and
+    above with values of that type; for tagged types those sides are left out,
+    so SQLite sees a single range to seek on an index.
+    """
+    expr, jtype = _column(field)
+    if isinstance(value, bool):
+        return f"{jtype} IN ('true', 'false')"
+    if isinstance(value, (int, float)):
+        return f"{jtype} IN ('integer', 'real')"
+    if isinstance(value, (datetime, ObjectId)):
+        start, end = (_DATE, _DATE_END) if isinstance(value, datetime) else (_OID, _OID_END)
+        clauses = []
+        if not bounds[0]:
+            clauses.append(f"{expr} >= ?")
+            params.append(start)
+        if not bounds[1]:
+            clauses.append(f"{expr} < ?")
+            params.append(end)
+        return " AND ".join(clauses) or "1"
+    if isinstance(value, str):
+        return f"{jtype} = 'text' AND substr({expr}, 1, 2) NOT IN (char(1, 68), char(1, 79))"
+    raise OperationFailure(f"the sqlite engine cannot compare {type(value).__name__} values")
+
+
+def _named_type(field, name, params):
+    if name == "number":
+        return _type_clause(field, 0, params)
+    kind = _TYPES.get(name)
+    if kind is None:
+        raise OperationFailure(f"unknown $type {name!r}")
+    expr, jtype = _column(field)
+    if kind == "string":
+        return _type_clause(field, "", params)
+    if kind == "date":
+        return _type_clause(field, datetime.min, params)
+    if kind == "objectId":
+        return _type_clause(field, ObjectId(), params)
+    if kind == "bool":
+        return f"{jtype} IN ('true', 'false')"
+    return f"{jtype} = '{kind}'"
+
+
+def _equals(field, value, params, negate=False):
+    expr, jtype = _column(field)
+    if value is None:
+        return f"{expr} IS {'NOT ' if negate else ''}NULL"
+    if isinstance(value, bool):
+        # Compared through the value too, so an index on the field applies
+        clause = f"({expr} = {int(value)} AND {jtype} = '{'true' if value else 'false'}')"
+        return f"NOT coalesce({clause}, 0)" if negate else clause
+    if isinstance(value, (dict, list)):
+        params.append(_dumps(value))
+        kind = "object" if isinstance(value, dict) else "array"
+        clause = f"({jtype} = '{kind}' AND {expr} = json(?))"
+        return f"NOT coalesce({clause}, 0)" if negate else clause
+    params.append(_key(value))
+    clause = f"{expr} = ?"
+    if isinstance(value, (int, float)) and field != "_id":
+        # json_extract() reads true and false as 1 and 0
+        clause = f"({clause} AND {jtype} IN ('integer', 'real'))"
+    if negate:
+        return f"NOT coalesce({clause}, 0)"
+    return clause
+
+
+def _in(field, values, params, negate=False):
+    expr, jtype = _column(field)
+    values = list(values)
+    clauses = []
+    if any(isinstance(v, (dict, list)) for v in values):
+        raise OperationFailure("$in with documents or arrays is not supported by the sqlite engine")
+    scalars = [_key(v) for v in values if v is not None and not isinstance(v, bool)]
+    if scalars:
+        params.append(orjson.dumps(scalars).decode())
+        clause = f"{expr} IN (SELECT value FROM json_each(?))"
+        if field != "_id":
+            clause += f" AND {jtype} NOT IN ('true', 'false')"
+        clauses.append(clause)
+    for flag in {v for v in values if isinstance(v, bool)}:
+        clauses.append(_equals(field, flag, params))
+    has_null = any(v is None for v in values)
+    if has_null:
+        clauses.append(f"{expr} IS NULL")
+    if not clauses:
+        return "1" if negate else "0"
+    clause = "(" + " OR ".join(clauses) + ")"
+    if negate:
+        return f"NOT coalesce({clause}, 0)"
+    return clause
+
+
+def _regex(value, options=""):
+    if isinstance(value, re.Pattern):
+        flags = "".join(f for f, bit in (("i", re.I), ("m", re.M), ("s", re.S), ("x", re.X)) if value.flags & bit)
+        value, options = value.pattern, options + flags
+    flags = "".join(sorted(set(options) & set("imsx")))
+    return f"(?{flags}){value}" if flags else value
+
+
+_RANGES = {"$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}
+
+
+def _condition(field, op, value, spec, params):
+    expr, jtype = _column(field)
+    if op == "$eq":
+        return _equals(field, value, params)
+    if op == "$ne":
+        return _equals(field, value, params, negate=True)
+    if op in _RANGES:
+        if value is None or isinstance(value, (dict, list)):
+            raise OperationFailure(f"{op} on {type(value).__name__} is not supported by the sqlite engine")
+        params.append(_key(value))
+        clause = f"{expr} {_RANGES[op]} ?"
+        # Guard only the first range operator of each type on this field
+        same = [o for o, v in spec.items() if o in _RANGES and _order_key(v)[0] == _order_key(value)[0]]
+        if same[0] != op:
+            return clause
+        bounds = (any(o in ("$gt", "$gte") for o in same), any(o in ("$lt", "$lte") for o in same))
+        return f"{clause} AND {_type_clause(field, value, params, bounds)}"
+    if op == "$in":
+        return _in(field, value, params)
+    if op == "$nin":
+        return _in(field, value, params, negate=True)
+    if op == "$exists":
+        if field == "_id":
+            return "1" if value else "0"
+        return f"{jtype} IS {'NOT ' if value else ''}NULL"
+    if op == "$type":
+        names = value if isinstance(value, list) else [value]
+        return "(" + " OR ".join(_named_type(field, name, params) for name in names) + ")"
+    if op == "$regex":
+        params.append(_regex(value, spec.get("$options", "")))
+        return f"{expr} REGEXP ?"
+    if op == "$options":
+        return None
+    raise OperationFailure(f"{op} is not supported by the sqlite engine")
+
+
+def _clauses(filter, params):
+    clauses = []
+    for key, cond in filter.items():
+        if key in ("$and", "$or", "$nor"):
+            parts = ["(" + (" AND ".join(_clauses(f, params)) or "1") + ")" for f in cond]
+            if key == "$and":
+                clauses.append("(" + (" AND ".join(parts) or "1") + ")")
+            elif key == "$or":
+                clauses.append("(" + (" OR ".join(parts) or "0") + ")")
+            else:
+                clauses.append("NOT coalesce((" + (" OR ".join(parts) or "0") + "), 0)")
+        elif key == "$text":
+            raise OperationFailure("$text is not supported by the sqlite engine; use SEARCH_BACKEND=local")
+        elif key.startswith("$"):
+            raise OperationFailure(f"{key} is not supported by the sqlite engine")
+        elif isinstance(cond, dict) and cond and all(k.startswith("$") for k in cond):
+            for op, value in cond.items():
+                clause = _condition(key, op, value, cond, params)
+                if clause:
+                    clauses.append(clause)
+        elif isinstance(cond, re.Pattern):
+            params.append(_regex(cond))
+            clauses.append(f"{_column(key)[0]} REGEXP ?")
+        else:
+            clauses.append(_equals(key, cond, params))
+    return clauses
+
+
+def where(filter):
+    """(SQL condition, parameters) for a query filter"""
+    params = []
+    clauses = _clauses(filter or {}, params)
+    return " AND ".join(clauses) or "1", params
+
+
+def _sort_spec(sort, direction=None):
+    if sort is None:
+        return []
+    if isinstance(sort, str):
+        return [(sort, direction or 1)]
+    if isinstance(sort, dict):
+        return list(sort.items())
+    return [(item, 1) if isinstance(item, str) else tuple(item) for item in sort]
+
+
+def order_by(sort):
+    terms = []
+    for field, direction in sort:
+        if isinstance(direction, dict):
+            raise OperationFailure("$meta sorts are not supported by the sqlite engine")
+        terms.append(f"{_column(field)[0]} {'DESC' if direction == -1 else 'ASC'}")
+    return " ORDER BY " + ", ".join(terms) if terms else ""
+
+
+# Filters, projections and updates in Python --------------------------------
+
+def _compare(op, a, b):
+    ka, kb = _order_key(a), _order_key(b)
+    if ka[0] != kb[0]:
+        return False
+    return {"$gt": ka > kb, "$gte": ka >= kb, "$lt": ka < kb, "$lte": ka <= kb}[op]
+
+
+def _value_equals(value, target):
+    if target is None:
+        return value is None or value is _MISSING
+    if isinstance(value, list) and not isinstance(target, list):
+        return any(_order_key(v) == _order_key(target) for v in value)
+    return value is not _MISSING and _order_key(value) == _order_key(target)
+
+
+def _is_type(value, name):
+    if name == "number":
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+    kind = _TYPES.get(name)
+    return {
+        "real": isinstance(value, float), "integer": isinstance(value, int) and not isinstance(value, bool),
+        "bool": isinstance(value, bool), "null": value is None, "object": isinstance(value, dict),
+        "array": isinstance(value, list), "string": isinstance(value, str), "date": isinstance(value, datetime),
+        "objectId": isinstance(value, ObjectId),
+    }.get(kind, False)
+
+
+def _check(value, op, arg, spec):
+    if op == "$eq":
+        return _value_equals(value, arg)
+    if op == "$ne":
+        return not _value_equals(value, arg)
+    if op in _RANGES:
+        if isinstance(value, list):
+            raise OperationFailure(f"{op} on an array is not supported by the sqlite engine")
+        return value is not _MISSING and _compare(op, value, arg)
+    if op == "$in":
+        return any(_value_equals(value, a) for a in arg)
+    if op == "$nin":
+        return not any(_value_equals(value, a) for a in arg)
+    if op == "$exists":
+        return (value is not _MISSING) == bool(arg)
+    if op == "$type":
+        return any(_is_type(value, name) for name in (arg if isinstance(arg, list) else [arg]))
+    if op == "$regex":
+        if isinstance(value, list):
+            raise OperationFailure("$regex on an array is not supported by the sqlite engine")
+        return isinstance(value, str) and _compiled(_regex(arg, spec.get("$options", ""))).search(value) is not None
+    if op == "$options":
+        return True
+    raise OperationFailure(f"{op} is not supported by the sqlite engine")
+
+
+def matches(doc, filter):
+    """Whether `doc` matches `filter`, for stages that run in Python"""
+    for key, cond in filter.items():
+        if key == "$and":
+            if not all(matches(doc, f) for f in cond):
+                return False
+        elif key == "$or":
+            if not any(matches(doc, f) for f in cond):
+                return False
+        elif key == "$nor":
+            if any(matches(doc, f) for f in cond):
+                return False
+        elif key.startswith("$"):
+            raise OperationFailure(f"{key} is not supported by the sqlite engine")
+        else:
+            value = _get(doc, key)
+            if isinstance(cond, dict) and cond and all(k.startswith("$") for k in cond):
+                if not all(_check(value, op, arg, cond) for op, arg in cond.items()):
+                    return False
+            elif isinstance(cond, re.Pattern):
+                if not _check(value, "$regex", cond, {}):
+                    return False
+            elif not _value_equals(value, cond):
+                return False
+    return True
+
+
+def project(doc, projection):
+    """Apply a find() projection"""
+    if not projection:
+        return doc
+    if isinstance(projection, (list, tuple)):
+        projection = {field: 1 for field in projection}
+    for value in projection.values():
+        if isinstance(value, dict):
+            raise OperationFailure("projection operators are not supported by the sqlite engine")
+    include_id = projection.get("_id", 1)
+    fields = {k: v for k, v in projection.items() if k != "_id"}
+    if any(fields.values()):
+        result = {"_id": doc["_id"]} if include_id and "_id" in doc else {}
+        for field, wanted in fields.items():
+            if wanted:
+                value = _get(doc, field)
+                if value is not _MISSING:
+                    _set(result, field, value)
+        return result
+    result = decode(encode(doc))
+    if not include_id:
+        result.pop("_id", None)
+    for field in fields:
+        _unset(result, field)
+    return result
+
+
+def apply_update(doc, update, inserting=False):
+    """Apply update operators (or a replacement) to `doc` in place"""
+    if not any(key.startswith("$") for key in update):
+        _id = doc.get("_id")
+        doc.clear()
+        if _id is not None:
+            doc["_id"] = _id
+        doc.update((k, v) for k, v in update.items() if k != "_id")
+        return doc
+    for op, fields in update.items():
+        for path, value in fields.items():
+            if path == "_id" and op != "$setOnInsert":
+                continue
+            current = _get(doc, path)
+            if op == "$set" or (op == "$setOnInsert" and inserting):
+                _set(doc, path, value)
+            elif op == "$setOnInsert":
+                continue
+            elif op == "$unset":
+                _unset(doc, path)
+            elif op == "$inc":
+                if current is not _MISSING and not isinstance(current, (int, float)):
+                    raise OperationFailure(f"Cannot apply $inc to a value of non-numeric type at {path!r}")
+                _set(doc, path, (0 if current is _MISSING else current) + value)
+            elif op in ("$max", "$min"):
+                if current is _MISSING or _compare("$gt" if op == "$max" else "$lt", value, current):
+                    _set(doc, path, value)
+            elif op == "$push":
+                items = value["$each"] if isinstance(value, dict) and "$each" in value else [value]
+                if current is _MISSING:
+                    _set(doc, path, list(items))
+                elif isinstance(current, list):
+                    current.extend(items)
+                else:
+                    raise OperationFailure(f"The field {path!r} must be an array")
+            else:
+                raise OperationFailure(f"Unknown modifier: {op}")
+    return doc
+
+
+def _upsert_document(filter, update):
+    """The document an upsert inserts: the filter's equality fields, then the update"""
+    doc = {}
+
+    def collect(f):
+        for key, cond in f.items():
+            if key == "$and":
+                for sub in cond:
+                    collect(sub)
+            elif key.startswith("$"):
+                continue
+            elif isinstance(cond, dict) and cond and all(k.startswith("$") for k in cond):
+                if "$eq" in cond:
+                    _set(doc, key, cond["$eq"])
+            elif not isinstance(cond, re.Pattern):
+                _set(doc, key, cond)
+
+    collect(filter)
+    replacement = not any(key.startswith("$") for key in update)
+    apply_update(doc, update, inserting=True)
+    if replacement and "_id" in filter and not isinstance(filter["_id"], dict):
+        doc["_id"] = filter["_id"]
+    _id = doc.pop("_id", None)
+    return dict({"_id": ObjectId() if _id is None else _id}, **doc)
+
+
+@lru_cache(maxsize=256)
+def _compiled(pattern):
+    return re.compile(pattern)
+
+
+def _regexp(pattern, value):
+    if not isinstance(value, str):
+        return False
+    if value[:1] == "\x01":
+        if value[:2] != _STR:
+            return False
+        value = value[2:]
+    return _compiled(pattern).search(value) is not None
+
+
+# Aggregation -----------------------------------------------------------------
+
+def _truthy(value):
+    return value not in (None, False, 0, _MISSING)
+
+
+def _date_part(part):
+    def op(arg, doc):
+        value = evaluate(arg, doc)
+        return getattr(value, part) if isinstance(value, datetime) else None
+    return op
+
+
+def _subtract(arg, doc):
+    a, b = (evaluate(x, doc) for x in arg)
+    if a is None or b is None:
+        return None
+    if isinstance(a, datetime) and isinstance(b, datetime):
+        return int((a - b) / timedelta(milliseconds=1))
+    if isinstance(a, datetime):
+        return a - timedelta(milliseconds=b)
+    return a - b
+
+
+def _cond(arg, doc):
+    if isinstance(arg, dict):
+        arg = [arg["if"], arg["then"], arg["else"]]
+    test, then, otherwise = arg
+    return evaluate(then if _truthy(evaluate(test, doc)) else otherwise, doc)
+
+
+def _compare_expr(op):
+    def compare(arg, doc):
+        a, b = (evaluate(x, doc) for x in arg)
+        a = None if a is _MISSING else a
+        b = None if b is _MISSING else b
+        ka, kb = _order_key(a), _order_key(b)
+        return {"$eq": ka == kb, "$ne": ka != kb, "$gt": ka > kb, "$gte": ka >= kb, "$lt": ka < kb, "$lte": ka <= kb}[op]
+    return compare
+
+
+def _numbers(values):
+    return [v for v in values if isinstance(v, (int, float)) and not isinstance(v, bool)]
+
+
+_EXPRESSIONS = {
+    "$cond": _cond,
+    "$and": lambda arg, doc: all(_truthy(evaluate(x, doc)) for x in arg),
+    "$or": lambda arg, doc: any(_truthy(evaluate(x, doc)) for x in arg),
+    "$not": lambda arg, doc: not _truthy(evaluate(arg[0] if isinstance(arg, list) else arg, doc)),
+    "$ifNull": lambda arg, doc: next((v for v in (evaluate(x, doc) for x in arg) if v not in (None, _MISSING)), None),
+    "$literal": lambda arg, doc: arg,
+    "$add": lambda arg, doc: sum(_numbers(evaluate(x, doc) for x in arg)),
+    "$subtract": _subtract,
+    "$multiply": lambda arg, doc: _product(_numbers(evaluate(x, doc) for x in arg)),
+    "$sum": lambda arg, doc: sum(_numbers(evaluate(x, doc) for x in (arg if isinstance(arg, list) else [arg]))),
+    "$year": _date_part("year"),
+    "$month": _date_part("month"),
+    "$dayOfMonth": _date_part("day"),
+    "$objectToArray": lambda arg, doc: [{"k": k, "v": v} for k, v in (_value(evaluate(arg, doc)) or {}).items()],
+}
+for _op in ("$eq", "$ne", "$gt", "$gte", "$lt", "$lte"):
+    _EXPRESSIONS[_op] = _compare_expr(_op)
+
+
+def _product(values):
+    result = 1
+    for value in values:
+        result *= value
+    return result
+
+
+def evaluate(expr, doc):
+    """An aggregation expression's value for `doc`"""
+    if isinstance(expr, str):
+        if expr.startswith("$"):
+            return _get(doc, expr[1:])
+        return expr
+    if isinstance(expr, list):
+        return [evaluate(e, doc) for e in expr]
+    if isinstance(expr, dict):
+        if len(expr) == 1:
+            op, arg = next(iter(expr.items()))
+            if op.startswith("$"):
+                if op not in _EXPRESSIONS:
+                    raise OperationFailure(f"{op} is not supported by the sqlite engine")
+                return _EXPRESSIONS[op](arg, doc)
+        return {k: _value(evaluate(v, doc)) for k, v in expr.items()}
+    return expr
+
+
+def _value(value):
+    return None if value is _MISSING else value
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return ("d", tuple((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, list):
+        return ("l", tuple(_freeze(v) for v in value))
+    return _order_key(value)
+
+
+class _Accumulator:
+    def __init__(self, op, expr):
+        if op not in ("$sum", "$avg", "$max", "$min", "$first", "$last", "$push", "$addToSet"):
+            raise OperationFailure(f"{op} is not supported by the sqlite engine")
+        self.op, self.expr = op, expr
+        self.values = []
+
+    def add(self, doc):
+        value = evaluate(self.expr, doc)
+        if self.op == "$sum" and isinstance(value, list):
+            value = sum(_numbers(value))
+        self.values.append(value)
+
+    def result(self):
+        present = [v for v in self.values if v not in (None, _MISSING)]
+        if self.op == "$sum":
+            return sum(_numbers(self.values))
+        if self.op == "$avg":
+            numbers = _numbers(self.values)
+            return sum(numbers) / len(numbers) if numbers else None
+        if self.op == "$max":
+            return max(present, key=_order_key) if present else None
+        if self.op == "$min":
+            return min(present, key=_order_key) if present else None
+        if self.op == "$first":
+            return _value(self.values[0]) if self.values else None
+        if self.op == "$last":
+            return _value(self.values[-1]) if self.values else None
+        if self.op == "$push":
+            return [_value(v) for v in self.values]
+        unique = {}
+        for value in self.values:
+            unique.setdefault(_freeze(value), _value(value))
+        return list(unique.values())
+
+
+def _group(docs, spec):
+    groups = {}
+    for doc in docs:
+        key = _value(evaluate(spec["_id"], doc))
+        frozen = _freeze(key)
+        if frozen not in groups:
+            groups[frozen] = (key, {name: _Accumulator(*next(iter(acc.items())))
+                                    for name, acc in spec.items() if name != "_id"})
+        for accumulator in groups[frozen][1].values():
+            accumulator.add(doc)
+    return [dict({"_id": key}, **{name: acc.result() for name, acc in accumulators.items()})
+            for key, accumulators in groups.values()]
+
+
+def _project_stage(doc, spec):
+    exclusions = [k for k, v in spec.items() if v in (0, False) and not isinstance(v, dict)]
+    if exclusions and len(exclusions) == len(spec):
+        return project(doc, spec)
+    result = {}
+    if spec.get("_id", 1) not in (0, False):
+        if "_id" in spec and spec["_id"] not in (1, True):
+            result["_id"] = _value(evaluate(spec["_id"], doc))
+        elif "_id" in doc:
+            result["_id"] = doc["_id"]
+    for field, value in spec.items():
+        if field == "_id":
+            continue
+        if value in (1, True) and not isinstance(value, dict):
+            found = _get(doc, field)
+            if found is not _MISSING:
+                _set(result, field, found)
+        elif value not in (0, False):
+            _set(result, field, _value(evaluate(value, doc)))
+    return result
+
+
+def _unwind(docs, spec):
+    if isinstance(spec, str):
+        spec = {"path": spec}
+    path = spec["path"][1:]
+    keep = spec.get("preserveNullAndEmptyArrays", False)
+    for doc in docs:
+        value = _get(doc, path)
+        if isinstance(value, list) and value:
+            for item in value:
+                copy = dict(doc)
+                _set(copy, path, item)
+                yield copy
+        elif isinstance(value, list) or value in (None, _MISSING):
+            if keep:
+                yield doc
+        else:
+            yield doc
+
+
+def _sort(docs, spec):
+    docs = list(docs)
+    for field, direction in reversed(list(spec.items())):
+        docs.sort(key=lambda d: _order_key(_get(d, field)), reverse=direction == -1)
+    return docs
+
+
+def run_pipeline(docs, pipeline):
+    """Run aggregation stages over `docs` in Python"""
+    for stage in pipeline:
+        (name, spec), = stage.items()
+        if name == "$match":
+            docs = [doc for doc in docs if matches(doc, spec)]
+        elif name == "$project":
+            docs = [_project_stage(doc, spec) for doc in docs]
+        elif name in ("$addFields", "$set"):
+            docs = [dict(doc, **{k: _value(evaluate(v, doc)) for k, v in spec.items()}) for doc in docs]
+        elif name == "$unwind":
+            docs = list(_unwind(docs, spec))
+        elif name == "$group":
+            docs = _group(docs, spec)
+        elif name == "$facet":
+            docs = list(docs)
+            docs = [{key: run_pipeline(docs, sub) for key, sub in spec.items()}]
+        elif name == "$sort":
+            docs = _sort(docs, spec)
+        elif name == "$skip":
+            docs = list(docs)[spec:]
+        elif name == "$limit":
+            docs = list(docs)[:spec]
+        elif name == "$count":
+            docs = list(docs)
+            docs = [{spec: len(docs)}] if docs else []
+        else:
+            raise OperationFailure(f"{name} is not supported by the sqlite engine")
+    return list(docs)
+
+
+# Connections -------------------------------------------------------------------
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+class _Pool:
+    """Connections used by one thread at a time; ":memory:" has exactly one"""
+
+    def __init__(self, path):
+        self.path = path
+        self.memory = path == ":memory:"
+        self._idle = []
+        self._lock = threading.Lock()
+        self._slots = threading.Semaphore(1) if self.memory else None
+        if not self.memory and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000, isolation_level=None,
+                               check_same_thread=False, cached_statements=SQLITE_STATEMENT_CACHE)
+        conn.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+        conn.execute("PRAGMA journal_mode = WAL")
+        # Durable at every checkpoint; a power cut can lose the last commits but never corrupts
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute(f"PRAGMA cache_size = -{SQLITE_CACHE_MB * 1024}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        conn.create_function("regexp", 2, _regexp, deterministic=True)
+        return conn
+
+    def acquire(self):
+        if self._slots:
+            self._slots.acquire()
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        return self._connect()
+
+    def release(self, conn):
+        with self._lock:
+            if self.memory or len(self._idle) < SQLITE_MAX_IDLE:
+                self._idle.append(conn)
+                conn = None
+        if conn is not None:
+            conn.close()
+        if self._slots:
+            self._slots.release()
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+class SQLiteClient:
+    """Stands in for pymongo.MongoClient"""
+
+    def __init__(self, path=SQLITE_PATH):
+        self.path = path
+        self.pool = _Pool(path)
+        self._write_lock = threading.Lock()
+        # Tables known to exist; only ever added to by reads
+        self._tables = set()
+        # table -> (field, seconds, last run)
+        self._ttl = {}
+        # table -> dotted paths known to hold arrays, and the fields already scanned for them
+        self._arrays = {}
+        self._scanned = {}
+        self.admin = _Admin(self)
+
+    def __getitem__(self, name):
+        return Database(self, name)
+
+    def get_database(self, name):
+        return Database(self, name)
+
+    @contextmanager
+    def read(self):
+        conn = self.pool.acquire()
+        try:
+            yield conn
+        finally:
+            self.pool.release(conn)
+
+    @contextmanager
+    def write(self):
+        with self._write_lock:
+            conn = self.pool.acquire()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    yield conn
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+                conn.execute("COMMIT")
+            finally:
+                self.pool.release(conn)
+
+    def has_table(self, conn, table):
+        if table not in self._tables:
+            if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone():
+                self._tables.add(table)
+        return table in self._tables
+
+    def create_table(self, conn, table):
+        if table not in self._tables:
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {_quote(table)} (id PRIMARY KEY, doc TEXT NOT NULL) WITHOUT ROWID")
+            self._tables.add(table)
+
+    def note_arrays(self, table, doc):
+        paths = set(_list_paths(doc))
+        if paths:
+            self._arrays.setdefault(table, set()).update(paths)
+
+    def check_arrays(self, conn, table, fields):
+        """Raise OperationFailure if any of `fields` is, or lies inside, an array in `table`"""
+        known = self._arrays.setdefault(table, set())
+        scanned = self._scanned.setdefault(table, set())
+        for field in fields:
+            if field not in scanned:
+                parts = field.split(".")
+                held = " OR ".join(f"json_type(doc, {_path('.'.join(parts[:i]))}) = 'array'"
+                                   for i in range(1, len(parts) + 1))
+                if conn.execute(f"SELECT 1 FROM {_quote(table)} WHERE {held} LIMIT 1").fetchone():
+                    known.add(field)
+                scanned.add(field)
+            if any(path == field or field.startswith(path + ".") for path in known):
+                raise OperationFailure(f"matching inside the array {field!r} is not supported by the sqlite engine")
+
+    def tables(self, prefix):
+        with self.read() as conn:
+            rows = conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND substr(name, 1, ?) = ?",
+                                (len(prefix), prefix)).fetchall()
+        return [row[0] for row in rows]
+
+    def drop_table(self, conn, table):
+        conn.execute(f"DROP TABLE IF EXISTS {_quote(table)}")
+        self._tables.discard(table)
+        self._ttl.pop(table, None)
+        self._arrays.pop(table, None)
+        self._scanned.pop(table, None)
+
+    def expire(self, conn, table):
+        """Delete documents past a TTL index's expiry, at most once a minute"""
+        ttl = self._ttl.get(table)
+        if ttl is None or time.monotonic() - ttl[2] < TTL_INTERVAL_SECONDS:
+            return
+        field, seconds, _ = ttl
+        self._ttl[table] = (field, seconds, time.monotonic())
+        condition, params = where({field: {"$lt": datetime.utcnow() - timedelta(seconds=seconds)}})
+        conn.execute(f"DELETE FROM {_quote(table)} WHERE {condition}", params)
+
+    def drop_database(self, name_or_database):
+        name = getattr(name_or_database, "name", name_or_database)
+        with self.write() as conn:
+            for table in self.tables(f"{name}."):
+                self.drop_table(conn, table)
+
+    def close(self):
+        self.pool.close()
+
+
+class _Admin:
+    def __init__(self, client):
+        self.client = client
+
+    def command(self, command, *args, **kwargs):
+        if command != "ping":
+            raise OperationFailure(f"no such command: {command!r}")
+        with self.client.read() as conn:
+            conn.execute("SELECT 1").fetchone()
+        return {"ok": 1.0}
+
+
+class Database:
+    """Stands in for pymongo.database.Database"""
+
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+
+    def __getitem__(self, name):
+        return Collection(self, name)
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return Collection(self, name)
+
+    def get_collection(self, name):
+        return Collection(self, name)
+
+    def list_collection_names(self):
+        prefix = f"{self.name}."
+        return [table[len(prefix):] for table in self.client.tables(prefix)]
+
+    def drop_collection(self, name):
+        self[name].drop()
+
+    def command(self, command, value=None, **kwargs):
+        if command == "ping":
+            return self.client.admin.command("ping")
+        if command == "profile":
+            # No profiler; slow_queries() finds an empty system.profile
+            return {"was": 0, "ok": 1.0}
+        if command == "collStats":
+            return self[value].stats()
+        raise OperationFailure(f"no such command: {command!r}")
+
+
+class Cursor:
+    """Lazy query results, like pymongo.cursor.Cursor"""
+
+    def __init__(self, collection, filter, projection, sort, skip, limit):
+        self.collection = collection
+        self._filter = filter or {}
+        self._projection = projection
+        self._sort = _sort_spec(sort)
+        self._skip = skip or 0
+        self._limit = limit or 0
+        self._conn = None
+        self._rows = None
+
+    def sort(self, key_or_list, direction=None):
+        self._sort = _sort_spec(key_or_list, direction)
+        return self
+
+    def skip(self, skip):
+        self._skip = skip
+        return self
+
+    def limit(self, limit):
+        self._limit = limit
+        return self
+
+    def batch_size(self, batch_size):
+        return self
+
+    def _query(self):
+        condition, params = where(self._filter)
+        sql = f"SELECT id, doc FROM {_quote(self.collection.table)} WHERE {condition}{order_by(self._sort)}"
+        if self._limit or self._skip:
+            sql += " LIMIT ? OFFSET ?"
+            params += [self._limit or -1, self._skip]
+        return sql, params
+
+    def _open(self):
+        sql, params = self._query()
+        client = self.collection.database.client
+        conn = client.pool.acquire()
+        try:
+            if not client.has_table(conn, self.collection.table):
+                self._rows = iter(())
+                return
+            self.collection._check_arrays(conn, self._filter, self._sort)
+            if client.pool.memory:
+                # The only connection cannot be held while the caller iterates
+                self._rows = iter(conn.execute(sql, params).fetchall())
+            else:
+                self._rows = conn.execute(sql, params)
+                self._conn, conn = conn, None
+        finally:
+            if conn is not None:
+                client.pool.release(conn)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._rows is None:
+            self._open()
+        row = next(self._rows, None)
+        if row is None:
+            self.close()
+            raise StopIteration
+        return project(_document(*row), self._projection)
+
+    def close(self):
+        self._rows = iter(())
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self.collection.database.client.pool.release(conn)
+
+    def __del__(self):
+        self.close()
+
+    def explain(self):
+        """The SQLite plan in the shape of a MongoDB explain()"""
+        client = self.collection.database.client
+        try:
+            sql, params = self._query()
+        except OperationFailure as e:
+            return {"queryPlanner": {"winningPlan": {"stage": "UNSUPPORTED", "reason": str(e)}}, "executionStats": {}}
+        with client.read() as conn:
+            if not client.has_table(conn, self.collection.table):
+                return {"queryPlanner": {"winningPlan": {"stage": "EOF"}}, "executionStats": {"nReturned": 0}}
+            plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+            started = time.perf_counter()
+            returned = sum(1 for _ in conn.execute(sql, params))
+            elapsed = (time.perf_counter() - started) * 1000
+        table = f"SCAN {self.collection.table}"
+        scan = any(step == table for step in plan)
+        index = next((step.split(" USING ", 1)[1] for step in plan if " USING " in step), None)
+        return {
+            "queryPlanner": {"winningPlan": {"stage": "COLLSCAN" if scan else "IXSCAN", "indexName": index, "sqlitePlan": plan}},
+            "executionStats": {"nReturned": returned, "executionTimeMillis": round(elapsed, 3),
+                               "totalDocsExamined": None, "totalKeysExamined": None},
+        }
+
+
+class Collection:
+    """Stands in for pymongo.collection.Collection"""
+
+    def __init__(self, database, name):
+        self.database = database
+        self.name = name
+        self.table = f"{database.name}.{name}"
+        self.full_name = self.table
+
+    def _client(self):
+        return self.database.client
+
+    def _select(self, conn, filter, sort=None, limit=0):
+        if not self._client().has_table(conn, self.table):
+            return []
+        self._check_arrays(conn, filter, _sort_spec(sort))
+        condition, params = where(filter)
+        sql = f"SELECT id, doc FROM {_quote(self.table)} WHERE {condition}{order_by(_sort_spec(sort))}"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return conn.execute(sql, params).fetchall()
+
+    def _check_arrays(self, conn, filter, sort=()):
+        fields = set(_compared_fields(filter or {})) | {field for field, _ in sort if field != "_id"}
+        if fields:
+            self._client().check_arrays(conn, self.table, sorted(fields))
+
+    # Reads
+
+    def find(self, filter=None, projection=None, sort=None, skip=0, limit=0, batch_size=0, **kwargs):
+        return Cursor(self, filter, projection, sort, skip, limit)
+
+    def find_one(self, filter=None, projection=None, sort=None, **kwargs):
+        if filter is not None and not isinstance(filter, dict):
+            filter = {"_id": filter}
+        return next(iter(self.find(filter, projection, sort=sort, limit=1)), None)
+
+    def count_documents(self, filter, skip=0, limit=0, **kwargs):
+        with self._client().read() as conn:
+            if not self._client().has_table(conn, self.table):
+                return 0
+            self._check_arrays(conn, filter)
+            condition, params = where(filter)
+            sql = f"SELECT count(*) FROM {_quote(self.table)} WHERE {condition}"
+            if skip or limit:
+                sql = f"SELECT count(*) FROM (SELECT 1 FROM {_quote(self.table)} WHERE {condition} LIMIT ? OFFSET ?)"
+                params += [limit or -1, skip]
+            return conn.execute(sql, params).fetchone()[0]
+
+    def estimated_document_count(self):
+        return self.count_documents({})
+
+    def aggregate(self, pipeline, **kwargs):
+        pipeline = list(pipeline)
+        leading = []
+        while pipeline and "$match" in pipeline[0]:
+            leading.append(pipeline.pop(0)["$match"])
+        docs = list(self.find({"$and": leading} if leading else {}))
+        return iter(run_pipeline(docs, pipeline))
+
+    # Writes
+
+    def _duplicate(self, error, doc=None):
+        return DuplicateKeyError(f"E11000 duplicate key error collection: {self.table} ({error})", 11000,
+                                 {"errmsg": str(error), "keyValue": {"_id": doc.get("_id")} if doc else None})
+
+    def _insert(self, conn, doc):
+        if "_id" not in doc:
+            doc["_id"] = ObjectId()
+        try:
+            conn.execute(f"INSERT INTO {_quote(self.table)} (id, doc) VALUES (?, ?)", (_key(doc["_id"]), _body(doc)))
+        except sqlite3.IntegrityError as e:
+            raise self._duplicate(e, doc)
+        self._client().note_arrays(self.table, doc)
+        return doc["_id"]
+
+    def _update(self, conn, filter, update, upsert, multi):
+        """Apply `update` to one or all matches; returns a raw update result"""
+        rows = self._select(conn, filter, limit=0 if multi else 1)
+        matched = modified = 0
+        for raw_id, text in rows:
+            doc = apply_update(_document(raw_id, text), update)
+            matched += 1
+            body = _body(doc)
+            if body != text:
+                try:
+                    conn.execute(f"UPDATE {_quote(self.table)} SET doc = ? WHERE id = ?", (body, raw_id))
+                except sqlite3.IntegrityError as e:
+                    raise self._duplicate(e, doc)
+                self._client().note_arrays(self.table, doc)
+                modified += 1
+        if matched or not upsert:
+            return {"n": matched, "nModified": modified}
+        doc = _upsert_document(filter, update)
+        self._insert(conn, doc)
+        return {"n": 1, "nModified": 0, "upserted": doc["_id"]}
+
+    def _write(self):
+        return self._client().write()
+
+    def _written(self, conn):
+        self._client().expire(conn, self.table)
+
+    def insert_one(self, document, **kwargs):
+        with self._write() as conn:
+            self._client().create_table(conn, self.table)
+            inserted_id = self._insert(conn, document)
+            self._written(conn)
+        return InsertOneResult(inserted_id, True)
+
+    def insert_many(self, documents, ordered=True, **kwargs):
+        documents = list(documents)
+        ids, errors = [], []
+        with self._write() as conn:
+            self._client().create_table(conn, self.table)
+            for index, doc in enumerate(documents):
+                try:
+                    ids.append(self._insert(conn, doc))
+                except DuplicateKeyError as e:
+                    errors.append({"index": index, "code": 11000, "errmsg": str(e), "op": doc})
+                    if ordered:
+                        break
+            self._written(conn)
+        if errors:
+            raise BulkWriteError({"writeErrors": errors, "writeConcernErrors": [], "nInserted": len(ids),
+                                  "nUpserted": 0, "nMatched": 0, "nModified": 0, "nRemoved": 0, "upserted": []})
+        return InsertManyResult(ids, True)
+
+    def update_one(self, filter, update, upsert=False, **kwargs):
+        with self._write() as conn:
+            self._client().create_table(conn, self.table)
+            return UpdateResult(self._update(conn, filter, update, upsert, multi=False), True)
+
+    def update_many(self, filter, update, upsert=False, **kwargs):
+        with self._write() as conn:
+            self._client().create_table(conn, self.table)
+            return UpdateResult(self._update(conn, filter, update, upsert, multi=True), True)
+
+    def replace_one(self, filter, replacement, upsert=False, **kwargs):
+        return self.update_one(filter, replacement, upsert=upsert)
+
+    def find_one_and_update(self, filter, update, projection=None, sort=None, upsert=False,
+                            return_document=ReturnDocument.BEFORE, **kwargs):
+        with self._write() as conn:
+            self._client().create_table(conn, self.table)
+            rows = self._select(conn, filter, sort, limit=1)
+            if rows:
+                raw_id, text = rows[0]
+                before = _document(raw_id, text)
+                after = apply_update(_document(raw_id, text), update)
+                body = _body(after)
+                if body != text:
+                    try:
+                        conn.execute(f"UPDATE {_quote(self.table)} SET doc = ? WHERE id = ?", (body, raw_id))
+                    except sqlite3.IntegrityError as e:
+                        raise self._duplicate(e, after)
+                    self._client().note_arrays(self.table, after)
+                doc = after if return_document == ReturnDocument.AFTER else before
+            elif upsert:
+                after = _upsert_document(filter, update)
+                self._insert(conn, after)
+                doc = after if return_document == ReturnDocument.AFTER else None
+            else:
+                doc = None
+            self._written(conn)
+        return None if doc is None else project(doc, projection)
+
+    def find_one_and_replace(self, filter, replacement, projection=None, sort=None, upsert=False,
+                             return_document=ReturnDocument.BEFORE, **kwargs):
+        return self.find_one_and_update(filter, replacement, projection, sort, upsert, return_document)
+
+    def find_one_and_delete(self, filter, projection=None, sort=None, **kwargs):
+        with self._write() as conn:
+            rows = self._select(conn, filter, sort, limit=1)
+            if not rows:
+                return None
+            raw_id, text = rows[0]
+            conn.execute(f"DELETE FROM {_quote(self.table)} WHERE id = ?", (raw_id,))
+        return project(_document(raw_id, text), projection)
+
+    def _delete(self, conn, filter, multi):
+        if not self._client().has_table(conn, self.table):
+            return 0
+        self._check_arrays(conn, filter)
+        condition, params = where(filter)
+        table = _quote(self.table)
+        if multi:
+            return conn.execute(f"DELETE FROM {table} WHERE {condition}", params).rowcount
+        return conn.execute(f"DELETE FROM {table} WHERE id = (SELECT id FROM {table} WHERE {condition} LIMIT 1)",
+                            params).rowcount
+
+    def delete_one(self, filter, **kwargs):
+        with self._write() as conn:
+            return DeleteResult({"n": self._delete(conn, filter, multi=False)}, True)
+
+    def delete_many(self, filter, **kwargs):
+        with self._write() as conn:
+            return DeleteResult({"n": self._delete(conn, filter, multi=True)}, True)
+
+    def bulk_write(self, requests, ordered=True, **kwargs):
+        result = {"writeErrors": [], "writeConcernErrors": [], "nInserted": 0, "nUpserted": 0,
+                  "nMatched": 0, "nModified": 0, "nRemoved": 0, "upserted": []}
+        with self._write() as conn:
+            self._client().create_table(conn, self.table)
+            for index, op in enumerate(requests):
+                try:
+                    if isinstance(op, InsertOne):
+                        self._insert(conn, op._doc)
+                        result["nInserted"] += 1
+                    elif isinstance(op, (UpdateOne, UpdateMany, ReplaceOne)):
+                        raw = self._update(conn, op._filter, op._doc, op._upsert, multi=isinstance(op, UpdateMany))
+                        if "upserted" in raw:
+                            result["nUpserted"] += 1
+                            result["upserted"].append({"index": index, "_id": raw["upserted"]})
+                        else:
+                            result["nMatched"] += raw["n"]
+                            result["nModified"] += raw["nModified"]
+                    elif isinstance(op, (DeleteOne, DeleteMany)):
+                        result["nRemoved"] += self._delete(conn, op._filter, multi=isinstance(op, DeleteMany))
+                    else:
+                        raise OperationFailure(f"unsupported bulk operation {op!r}")
+                except DuplicateKeyError as e:
+                    result["writeErrors"].append({"index": index, "code": 11000, "errmsg": str(e), "op": op})
+                    if ordered:
+                        break
+            self._written(conn)
+        if result["writeErrors"]:
+            raise BulkWriteError(result)
+        return BulkWriteResult(result, True)
+
+    # Indexes and administration
+
+    def create_indexes(self, indexes, **kwargs):
+        names = []
+        with self._write() as conn:
+            self._client().create_table(conn, self.table)
+            for model in indexes:
+                spec = model.document
+                keys = list(spec["key"].items())
+                names.append(spec["name"])
+                if any(direction == "text" for _, direction in keys):
+                    # No $text here: search runs on SEARCH_BACKEND=local
+                    continue
+                if "partialFilterExpression" in spec:
+                    raise OperationFailure("partial indexes are not supported by the sqlite engine")
+                columns = ", ".join(f"{_column(field)[0]}{' DESC' if direction == -1 else ''}" for field, direction in keys)
+                unique = "UNIQUE " if spec.get("unique") else ""
+                try:
+                    conn.execute(f"CREATE {unique}INDEX IF NOT EXISTS {_quote(self.table + '.' + spec['name'])} "
+                                 f"ON {_quote(self.table)} ({columns})")
+                except sqlite3.IntegrityError as e:
+                    raise OperationFailure(f"Index build failed: {spec['name']}: {e}", 11000)
+                if "expireAfterSeconds" in spec:
+                    self._client()._ttl[self.table] = (keys[0][0], spec["expireAfterSeconds"], 0)
+        return names
+
+    def create_index(self, keys, **kwargs):
+        return self.create_indexes([IndexModel(keys, **kwargs)])[0]
+
+    def drop_indexes(self):
+        with self._write() as conn:
+            for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ? "
+                                        "AND sql IS NOT NULL", (self.table,)).fetchall():
+                conn.execute(f"DROP INDEX {_quote(name)}")
+            self._client()._ttl.pop(self.table, None)
+
+    def drop(self):
+        with self._write() as conn:
+            self._client().drop_table(conn, self.table)
+
+    def rename(self, new_name, **kwargs):
+        target = f"{self.database.name}.{new_name}"
+        client = self._client()
+        with self._write() as conn:
+            # Not has_table(): another process may have renamed it since we cached it
+            if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                                (self.table,)).fetchone():
+                client._tables.discard(self.table)
+                raise OperationFailure("source namespace does not exist", 26)
+            if client.has_table(conn, target):
+                raise OperationFailure("target namespace exists", 48)
+            indexes = conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? "
+                                   "AND sql IS NOT NULL", (self.table,)).fetchall()
+            conn.execute(f"ALTER TABLE {_quote(self.table)} RENAME TO {_quote(target)}")
+            # Index names are global; move them under the new name
+            for name, sql in indexes:
+                renamed = target + name[len(self.table):]
+                conn.execute(f"DROP INDEX {_quote(name)}")
+                conn.execute(sql.replace(_quote(name), _quote(renamed), 1))
+            client._tables.discard(self.table)
+            client._tables.add(target)
+            for cache in (client._ttl, client._arrays, client._scanned):
+                if self.table in cache:
+                    cache[target] = cache.pop(self.table)
+
+    def stats(self):
+        """collStats: counts and sizes in bytes"""
+        with self._client().read() as conn:
+            if not self._client().has_table(conn, self.table):
+                raise OperationFailure(f"Collection [{self.table}] not found.", 26)
+            count, size = conn.execute(f"SELECT count(*), coalesce(sum(length(doc)), 0) FROM {_quote(self.table)}").fetchone()
+            indexes = [row[0] for row in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ?", (self.table,))]
+            try:
+                pages = dict(conn.execute(
+                    "SELECT name, sum(pgsize) FROM dbstat WHERE name IN (SELECT value FROM json_each(?)) GROUP BY name",
+                    (orjson.dumps([self.table] + indexes).decode(),)).fetchall())
+            except sqlite3.OperationalError:
+                # Built without the dbstat table
+                pages = {}
+        return {
+            "ns": self.table,
+            "count": count,
+            "size": size,
+            "storageSize": pages.get(self.table),
+            "nindexes": len(indexes),
+            "totalIndexSize": sum(pages.get(name, 0) for name in indexes) if pages else None,
+            "ok": 1.0,
+        }
@@ -0,0 +1,225 @@
+"""Leave and presence statistics computed with one $group pipeline.
+
+Each function takes an optional member list (one member, a whole team, or
+everyone) and an optional date range, and returns one row per member in the
+same shape the per-member stats endpoints have always returned. All-time
+stats are read from the materialized rollups once they have been built.
+"""
+import asyncio
+
+import buckets
+import rollups
+from archive import presence_tiers
+from db import leaves_col, team_col
+
+LEAVE_STATUSES = ["approved", "pending", "rejected"]
+
+
+def _count_if(field, value):
+    return {"$sum": {"$cond": [{"$eq": [f"${field}", value]}, 1, 0]}}
+
+
+def _member_match(members):
+    if members is None:
+        return {}
+    if len(members) == 1:
+        return {"member_name": members[0]}
+    return {"member_name": {"$in": members}}
+
+
+def leave_match(members=None, start_date=None, end_date=None):
+    match = _member_match(members)
+    # A leave counts for the range if any of its days fall inside it
+    if start_date:
+        match["end_date"] = {"$gte": start_date}
+    if end_date:
+        match["start_date"] = {"$lte": end_date}
+    return match
+
+
+def presence_match(members=None, start_date=None, end_date=None):
+    """Row filter; presence_pipeline() turns it into bucket stages"""
+    match = _member_match(members)
+    if start_date or end_date:
+        match["date"] = {}
+        if start_date:
+            match["date"]["$gte"] = start_date
+        if end_date:
+            match["date"]["$lte"] = end_date
+    return match
+
+
+def leave_pipeline(match):
+    group = {"_id": "$member_name", "total_leaves": {"$sum": 1}}
+    for s in LEAVE_STATUSES:
+        group[f"{s}_leaves"] = _count_if("status", s)
+    return [{"$match": match}, {"$group": group}]
+
+
+def presence_pipeline(match):
+    """Per-member day counts from monthly buckets (see buckets.py)"""
+    group = {
+        "_id": "$member_name",
+        "total_days": {"$sum": 1},
+        "present_days": _count_if("day.v", "present"),
+        "absent_days": _count_if("day.v", "absent")
+    }
+    stages = [
+        {"$match": buckets.bucket_filter(match)},
+        {"$project": {"_id": 0, "member_name": 1, "month": 1, "day": {"$objectToArray": "$days"}}},
+        {"$unwind": "$day"},
+    ]
+    # Only the first and last month of a range can hold days outside it
+    start, end = match.get("date", {}).get("$gte"), match.get("date", {}).get("$lte")
+    edges = []
+    if start:
+        edges.append({"$or": [{"month": {"$gt": buckets.month_of(start)}}, {"day.k": {"$gte": buckets.day_key(start)}}]})
+    if end:
+        edges.append({"$or": [{"month": {"$lt": buckets.month_of(end)}}, {"day.k": {"$lte": buckets.day_key(end)}}]})
+    if edges:
+        stages.append({"$match": {"$and": edges}})
+    stages.append({"$group": group})
+    return stages
+
+
+def _leave_row(member_name, row=None):
+    row = row or {}
+    result = {"member_name": member_name, "total_leaves": row.get("total_leaves", 0)}
+    for s in LEAVE_STATUSES:
+        result[f"{s}_leaves"] = row.get(f"{s}_leaves", 0)
+    return result
+
+
+def _presence_row(member_name, row=None):
+    row = row or {}
+    total_days = row.get("total_days", 0)
+    present_days = row.get("present_days", 0)
+    attendance_rate = (present_days / total_days * 100) if total_days > 0 else 0
+    return {
+        "member_name": member_name,
+        "total_days": total_days,
+        "present_days": present_days,
+        "absent_days": row.get("absent_days", 0),
+        "attendance_rate": round(attendance_rate, 2)
+    }
+
+
+def _combined(results):
+    """Sum $group rows that share a member, e.g. from the hot and archived tiers"""
+    by_member = {}
+    for row in results:
+        total = by_member.get(row["_id"])
+        if total is None:
+            by_member[row["_id"]] = dict(row)
+        else:
+            for key, value in row.items():
+                if key != "_id":
+                    total[key] = total.get(key, 0) + value
+    return list(by_member.values())
+
+
+def _rows(results, members, make_row):
+    by_member = {r["_id"]: r for r in results if r["_id"] is not None}
+    # Members with no records still get a zero row
+    names = members if members is not None else sorted(by_member)
+    return [make_row(name, by_member.get(name)) for name in names]
+
+
+async def team_members(team):
+    return [m["name"] for m in await team_col.find({"team": team}, {"_id": 0, "name": 1}, sort=[("name", 1)])]
+
+
+def _leave_counts(member_name, counter):
+    counts = counter["counts"]
+    row = {"_id": member_name, "total_leaves": counter["total"]}
+    for s in LEAVE_STATUSES:
+        row[f"{s}_leaves"] = counts.get(s, 0)
+    return row
+
+
+def _presence_counts(member_name, counter):
+    counts = counter["counts"]
+    return {
+        "_id": member_name,
+        "total_days": counter["total"],
+        "present_days": counts.get("present", 0),
+        "absent_days": counts.get("absent", 0)
+    }
+
+
+async def _member_counters(kind, members, to_row):
+    counters = await rollups.get(kind, "member", members)
+    return [to_row(name, counter) for name, counter in counters.items()]
+
+
+async def leave_results(members=None, start_date=None, end_date=None):
+    """Per-member leave counts as $group-shaped rows"""
+    if not start_date and not end_date and await rollups.is_built():
+        return await _member_counters("leaves", members, _leave_counts)
+    return await leaves_col.aggregate(leave_pipeline(leave_match(members, start_date, end_date)))
+
+
+async def presence_results(members=None, start_date=None, end_date=None):
+    """Per-member presence counts as $group-shaped rows"""
+    if not start_date and not end_date and await rollups.is_built():
+        return await _member_counters("presence", members, _presence_counts)
+    return _combined(await presence_tiers.aggregate(presence_pipeline(presence_match(members, start_date, end_date))))
+
+
+async def leave_stats(members=None, start_date=None, end_date=None):
+    return _rows(await leave_results(members, start_date, end_date), members, _leave_row)
+
+
+async def presence_stats(members=None, start_date=None, end_date=None):
+    return _rows(await presence_results(members, start_date, end_date), members, _presence_row)
+
+
+def leave_totals(rows):
+    totals = _leave_row(None)
+    for row in rows:
+        for key in totals:
+            if key != "member_name":
+                totals[key] += row[key]
+    del totals["member_name"]
+    return totals
+
+
+def presence_totals(rows):
+    totals = _presence_row(None, {
+        "total_days": sum(r["total_days"] for r in rows),
+        "present_days": sum(r["present_days"] for r in rows),
+        "absent_days": sum(r["absent_days"] for r in rows)
+    })
+    del totals["member_name"]
+    return totals
+
+
+async def team_dashboard(team=None, date=None):
+    """Every member with leave totals and presence on `date`.
+
+    One query for the members, then the leave $group and the presence lookup
+    for the day run concurrently and are joined here by member name.
+    """
+    members = await team_col.find({"team": team} if team else {}, {"_id": 0, "name": 1, "email": 1, "team": 1}, sort=[("name", 1)])
+    names = [m["name"] for m in members] if team else None
+    leave_rows, presence_docs = await asyncio.gather(
+        leave_results(names),
+        buckets.presence_rows.find(dict(_member_match(names), date=date), {"_id": 0, "member_name": 1, "status": 1})
+    )
+    leaves_by_member = {r["_id"]: r for r in leave_rows}
+    presence_by_member = {p["member_name"]: p.get("status") for p in presence_docs}
+    rows = []
+    for member in members:
+        name = member.get("name")
+        leaves = _leave_row(name, leaves_by_member.get(name))
+        rows.append({
+            "name": name,
+            "email": member.get("email"),
+            "team": member.get("team"),
+            "total_leaves": leaves["total_leaves"],
+            "approved_leaves": leaves["approved_leaves"],
+            "pending_leaves": leaves["pending_leaves"],
+            "rejected_leaves": leaves["rejected_leaves"],
+            "presence": presence_by_member.get(name)
+        })
+    return rows
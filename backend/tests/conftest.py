@@ -0,0 +1,46 @@
+"""The API on a fresh mongomock database for each test.
+
+The lifespan handler is not run, so no mail worker or scheduler starts; the
+fixtures build the indexes themselves.
+
+    cd backend && python -m pytest tests
+"""
+import os
+import sys
+
+import mongomock
+import pytest
+
+# mongomock has no $text; must be set before search.py is imported
+os.environ.setdefault("SEARCH_BACKEND", "local")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+import indexes  # noqa: E402
+
+
+@pytest.fixture
+def database(monkeypatch):
+    client = mongomock.MongoClient()
+    monkeypatch.setattr(db, "create_client", lambda: client)
+    monkeypatch.setattr(db, "_client", None)
+    indexes.ensure_indexes()
+    return db.get_database()
+
+
+@pytest.fixture
+def api(database, monkeypatch):
+    """A TestClient logged in as a freshly registered user"""
+    from fastapi.testclient import TestClient
+
+    import main
+    import search
+    from response_cache import response_cache
+
+    monkeypatch.setattr(main, "search_engine", search.create_engine(main.search_engine.resources))
+    response_cache.clear()
+    client = TestClient(main.app)
+    token = client.post("/register", json={"username": "tester", "email": "tester@example.com",
+                                           "password": "tester-password"}).json()["access_token"]
+    client.headers["Authorization"] = f"Bearer {token}"
+    return client
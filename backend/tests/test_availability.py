@@ -0,0 +1,24 @@
+def leave(start, end, **fields):
+    return dict({"member_name": "ann", "start_date": start, "end_date": end, "reason": "holiday",
+                 "requested_by": "ann"}, **fields)
+
+
+def test_bulk_items_overlapping_each_other_report_like_stored_leaves(api):
+    assert api.post("/leaves", json=leave("2026-03-01", "2026-03-05", reason="stored")).status_code == 200
+
+    response = api.post("/leaves/bulk", json=[
+        leave("2026-03-04", "2026-03-10", reason="first"),
+        leave("2026-03-08", "2026-03-12", reason="second", status="approved"),
+        leave("2026-03-09", "2026-03-09", reason="dropped", status="rejected"),
+    ])
+
+    assert response.status_code == 200
+    first, second, third = (result.get("overlaps", []) for result in response.json()["results"])
+    stored = {"member_name": "ann", "start_date": "2026-03-01", "end_date": "2026-03-05", "status": "pending", "reason": "stored"}
+    assert first == [stored, {"member_name": "ann", "start_date": "2026-03-08", "end_date": "2026-03-12",
+                              "status": "approved", "reason": "second"}]
+    assert second == [{"member_name": "ann", "start_date": "2026-03-04", "end_date": "2026-03-10",
+                       "status": "pending", "reason": "first"}]
+    # A rejected item still sees the others, but is never reported as an
+    # overlap itself, like a stored rejected leave
+    assert [item["reason"] for item in third] == ["first", "second"]
@@ -0,0 +1,25 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import buckets
+import scheduler
+
+RUN_ID = f"{buckets.MIGRATION_JOB}:once"
+
+
+def test_migration_running_elsewhere_is_retried(database):
+    assert scheduler.claim_run(buckets.MIGRATION_JOB, "once", instance_id="other")
+    with pytest.raises(RuntimeError, match="running in another process") as error:
+        buckets.migrate_once(database)
+    assert not isinstance(error.value, buckets.MigrationFailed)
+
+
+def test_migration_out_of_attempts_is_terminal(database):
+    database["job_runs"].insert_one({
+        "_id": RUN_ID, "status": "failed", "attempts": scheduler.SCHEDULER_MAX_ATTEMPTS,
+        "error": "boom", "started_at": datetime.utcnow() - timedelta(minutes=5)})
+    with pytest.raises(buckets.MigrationFailed, match=RUN_ID):
+        buckets.migrate_once(database)
+    database["job_runs"].delete_one({"_id": RUN_ID})
+    assert buckets.migrate_once(database) is not None
@@ -0,0 +1,24 @@
+import dates
+import mailer
+import reminders
+
+DUE = "2026-03-10"
+
+
+def add_task(database, name):
+    database["tasks"].insert_one({"taskname": name, "assign": "ann", "sendReminder": True, "enddate": dates.to_db(DUE)})
+
+
+def test_rerun_is_a_no_op_until_the_digest_changes(database, monkeypatch):
+    # Only queued: the mail worker is not running
+    monkeypatch.setattr(mailer, "SMTP_USER", "dev@localhost")
+    database["teams"].insert_one({"name": "ann", "email": "ann@example.com"})
+    add_task(database, "report")
+
+    assert reminders.run_reminders(DUE)["queued"] == 1
+    assert reminders.run_reminders(DUE)["queued"] == 0
+
+    add_task(database, "review")
+    assert reminders.run_reminders(DUE)["queued"] == 1
+    assert reminders.run_reminders(DUE)["queued"] == 0
+    assert database["mail_queue"].count_documents({"to": "ann@example.com"}) == 2
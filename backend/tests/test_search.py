@@ -0,0 +1,45 @@
+import search
+
+
+def task(name, **fields):
+    return dict({"taskname": name, "assign": "ann", "status": "Waiting", "startdate": "2026-01-05",
+                 "enddate": "2026-01-09", "email": "", "send_reminder": False}, **fields)
+
+
+def names(response):
+    assert response.status_code == 200
+    return sorted(item.get("taskname") or item.get("name") for item in response.json()["items"])
+
+
+def test_put_to_missing_task_does_not_change_results(api):
+    assert api.post("/tasks", json=task("quarterly report")).status_code == 200
+    before = names(api.get("/search", params={"q": "report ghost"}))
+
+    api.put("/tasks/ghost", json=task("ghost report"))
+    api.put("/daily/ghost", json={"name": "ghost", "assign": "ann", "description": "ghost report", "date": "2026-01-05"})
+
+    assert names(api.get("/search", params={"q": "report ghost"})) == before == ["quarterly report"]
+
+
+def test_put_to_existing_task_is_indexed(api):
+    api.post("/tasks", json=task("quarterly report"))
+    api.get("/search", params={"q": "report"})
+
+    api.put("/tasks/quarterly report", json=task("quarterly report", assign="bob"))
+
+    items = api.get("/search", params={"q": "report"}).json()["items"]
+    assert [(i["taskname"], i["assign"]) for i in items] == [("quarterly report", "bob")]
+
+
+def test_update_event_for_unknown_key_is_ignored(api):
+    import main
+    engine = main.search_engine
+    api.post("/tasks", json=task("quarterly report"))
+    api.get("/search", params={"q": "report"})
+
+    engine._apply({"resource": "tasks", "action": "updated", "key": {"taskname": "ghost"},
+                   "data": task("ghost report")})
+
+    assert ("tasks", "ghost") not in engine.docs
+    assert engine.stats()["documents"] == 1
+    assert isinstance(engine, search.LocalSearch)
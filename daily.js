@@ -44,6 +44,9 @@ function closeDailyForm() {
   document.getElementById("dailyForm").style.display = "none";
 }
 
+// Daily tasks currently shown, keyed by name
+let dailyTasks = new Map();
+
 // Load Daily Tasks
 async function loadDailyTasks() {
   try {
@@ -51,39 +54,82 @@ async function loadDailyTasks() {
     const headers = token ? { 'Authorization': `Bearer ${token}` } : {};
     const res = await fetch(`${API_URL}/daily`, { headers });
     const tasks = await res.json();
-
-    // Clear old
-    document.getElementById("today-tasks").innerHTML = "";
-    document.getElementById("tomorrow-tasks").innerHTML = "";
-    document.getElementById("upcoming-tasks").innerHTML = "";
-
-    const today = new Date().toISOString().split("T")[0];
-    const tomorrow = new Date(Date.now() + 86400000).toISOString().split("T")[0];
-
-    tasks.forEach(task => {
-      const li = document.createElement("li");
-      li.innerHTML = `
-        <span>${task.name} (Assigned to: ${task.assign || 'Unassigned'}) - ${task.date}</span>
-        <div class="task-actions">
-          <button onclick="markDone('${task.name}')" title="Mark as Done"><i class="fas fa-check"></i></button>
-          <button onclick="editDailyTask('${task.name}', '${task.assign}', '${task.description}', '${task.date}')" title="Edit"><i class="fas fa-edit"></i></button>
-          <button onclick="deleteDailyTask('${task.name}')" title="Delete"><i class="fas fa-trash"></i></button>
-        </div>
-      `;
-
-      if (task.date === today) {
-        document.getElementById("today-tasks").appendChild(li);
-      } else if (task.date === tomorrow) {
-        document.getElementById("tomorrow-tasks").appendChild(li);
-      } else {
-        document.getElementById("upcoming-tasks").appendChild(li);
-      }
-    });
+    dailyTasks = new Map(tasks.map(task => [task.name, task]));
+    renderDailyTasks();
   } catch (err) {
     console.error("Error loading daily tasks:", err);
   }
 }
 
+function renderDailyTasks() {
+  const tasks = [...dailyTasks.values()];
+
+  // Clear old
+  document.getElementById("today-tasks").innerHTML = "";
+  document.getElementById("tomorrow-tasks").innerHTML = "";
+  document.getElementById("upcoming-tasks").innerHTML = "";
+
+  const today = new Date().toISOString().split("T")[0];
+  const tomorrow = new Date(Date.now() + 86400000).toISOString().split("T")[0];
+
+  tasks.forEach(task => {
+    const li = document.createElement("li");
+    li.innerHTML = `
+      <span>${task.name} (Assigned to: ${task.assign || 'Unassigned'}) - ${task.date}</span>
+      <div class="task-actions">
+        <button onclick="markDone('${task.name}')" title="Mark as Done"><i class="fas fa-check"></i></button>
+        <button onclick="editDailyTask('${task.name}', '${task.assign}', '${task.description}', '${task.date}')" title="Edit"><i class="fas fa-edit"></i></button>
+        <button onclick="deleteDailyTask('${task.name}')" title="Delete"><i class="fas fa-trash"></i></button>
+      </div>
+    `;
+
+    if (task.date === today) {
+      document.getElementById("today-tasks").appendChild(li);
+    } else if (task.date === tomorrow) {
+      document.getElementById("tomorrow-tasks").appendChild(li);
+    } else {
+      document.getElementById("upcoming-tasks").appendChild(li);
+    }
+  });
+}
+
+// Apply daily task changes from the /events feed and refresh the presence
+// counts when presence or the roster changes. Falls back to polling every
+// 30 seconds where EventSource is not available.
+function startLiveUpdates() {
+  const token = localStorage.getItem('authToken');
+  if (!window.EventSource || !token) {
+    setInterval(() => { loadDailyTasks(); loadPresenceStats(); }, 30000);
+    return;
+  }
+  const source = new EventSource(`${API_URL}/events?types=daily,presence,teams&token=${encodeURIComponent(token)}`);
+  source.addEventListener("daily", (e) => {
+    const change = JSON.parse(e.data);
+    const name = change.key.name;
+    if (change.action === "deleted") {
+      dailyTasks.delete(name);
+    } else {
+      dailyTasks.set(name, { ...(dailyTasks.get(name) || {}), ...change.data });
+    }
+    renderDailyTasks();
+  });
+  source.addEventListener("presence", schedulePresenceStats);
+  source.addEventListener("teams", schedulePresenceStats);
+  // Changes were missed while disconnected for too long
+  source.addEventListener("reset", () => { loadDailyTasks(); loadPresenceStats(); });
+  source.onerror = () => console.warn("Daily feed disconnected, retrying");
+}
+
+// A bulk presence write arrives as one event per member; count them once
+let presenceStatsTimer = null;
+function schedulePresenceStats() {
+  if (presenceStatsTimer) return;
+  presenceStatsTimer = setTimeout(() => {
+    presenceStatsTimer = null;
+    loadPresenceStats();
+  }, 500);
+}
+
 // Load Members for Assign Select
 async function loadMembers() {
   try {
@@ -152,7 +198,7 @@ document.getElementById("dailyTaskForm").addEventListener("submit", async (e) =>
 });
 
 document.addEventListener("DOMContentLoaded", () => {
-  loadDailyTasks();
+  loadDailyTasks().then(startLiveUpdates);
   loadMembers();
   loadPresenceStats();
 });
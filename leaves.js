@@ -2,24 +2,16 @@ const API_URL = "http://localhost:8000";
 
 async function loadTeamMembers() {
   try {
-    const res = await fetch(`${API_URL}/teams`);
-    const members = await res.json();
+    const today = new Date().toISOString().split("T")[0];
+    const res = await fetch(`${API_URL}/teams/dashboard?date=${today}`);
+    const dashboard = await res.json();
 
     const tbody = document.getElementById("teamBody");
     tbody.innerHTML = "";
 
-    const today = new Date().toISOString().split("T")[0];
-
-    for (const member of members) {
-      // Get leave count for this member
-      const leaveRes = await fetch(`${API_URL}/leaves?member_name=${encodeURIComponent(member.name)}&status=approved`);
-      const leaves = await leaveRes.json();
-      const totalLeaves = leaves.length;
-
-      // Get today's presence for this member
-      const presenceRes = await fetch(`${API_URL}/presence?member_name=${encodeURIComponent(member.name)}&date=${today}`);
-      const presenceData = await presenceRes.json();
-      const todayPresence = presenceData.length > 0 ? presenceData[0].status : 'Not marked';
+    for (const member of dashboard.members) {
+      const totalLeaves = member.approved_leaves;
+      const todayPresence = member.presence || 'Not marked';
 
       const tr = document.createElement("tr");
 
@@ -91,7 +83,12 @@ async function handleLeaveSubmit(e) {
     });
 
     if (res.ok) {
-      showToast("✅ Leave request submitted");
+      const result = await res.json();
+      if (result.overlaps && result.overlaps.length) {
+        showToast(`⚠️ Leave request submitted, but it overlaps ${result.overlaps.length} existing leave(s)`);
+      } else {
+        showToast("✅ Leave request submitted");
+      }
       closeLeaveModal();
       loadTeamMembers();
     } else {
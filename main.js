@@ -12,18 +12,63 @@ function applyTheme(theme) {
 const savedTheme = localStorage.getItem("theme") || "dark";
 applyTheme(savedTheme);
 
+// Tasks currently shown on the dashboard, keyed by taskname
+let dashboardTasks = new Map();
+
 document.addEventListener("DOMContentLoaded", () => {
   console.log('DOMContentLoaded fired');
-  loadTaskStatus();
-  updateDashboardCounts();
-  startAutoRefresh();
+  loadTasks().then(startLiveUpdates);
 });
 
-function startAutoRefresh() {
-  setInterval(() => {
-    loadTaskStatus();
-    updateDashboardCounts();
-  }, 30000); // Refresh every 30 seconds
+async function loadTasks() {
+  try {
+    const token = localStorage.getItem('authToken');
+    const headers = token ? { 'Authorization': `Bearer ${token}` } : {};
+
+    const res = await fetch("http://localhost:8000/tasks", { headers });
+    if (!res.ok) {
+      console.error("Failed to fetch tasks");
+      alert("Failed to load task status. Please ensure the backend is running on localhost:8000.");
+      return;
+    }
+    const tasks = await res.json();
+    console.log('All tasks:', tasks);
+    dashboardTasks = new Map(tasks.map(task => [task.taskname, task]));
+    renderTasks();
+  } catch (err) {
+    console.error("Error loading tasks:", err);
+    alert("Error loading task status: Network error. Please ensure the backend is running on localhost:8000.");
+  }
+}
+
+function renderTasks() {
+  const tasks = [...dashboardTasks.values()];
+  renderTaskStatus(tasks);
+  renderDashboardCounts(tasks);
+}
+
+// Apply task changes from the /events feed instead of re-fetching every task.
+// Falls back to polling every 30 seconds where EventSource is not available.
+function startLiveUpdates() {
+  const token = localStorage.getItem('authToken');
+  if (!window.EventSource || !token) {
+    setInterval(loadTasks, 30000);
+    return;
+  }
+  const source = new EventSource(`http://localhost:8000/events?types=tasks&token=${encodeURIComponent(token)}`);
+  source.addEventListener("tasks", (e) => {
+    const change = JSON.parse(e.data);
+    const name = change.key.taskname;
+    if (change.action === "deleted") {
+      dashboardTasks.delete(name);
+    } else {
+      dashboardTasks.set(name, { ...(dashboardTasks.get(name) || {}), ...change.data });
+    }
+    renderTasks();
+  });
+  // Changes were missed while disconnected for too long
+  source.addEventListener("reset", loadTasks);
+  source.onerror = () => console.warn("Task feed disconnected, retrying");
 }
 
 async function login(username, password) {
@@ -77,20 +122,8 @@ async function loadTeamMembers() {
   }
 }
 
-async function loadTaskStatus() {
+function renderTaskStatus(tasks) {
   try {
-    const token = localStorage.getItem('authToken');
-    const headers = token ? { 'Authorization': `Bearer ${token}` } : {};
-
-    const res = await fetch("http://localhost:8000/tasks", { headers });
-    if (!res.ok) {
-      console.error("Failed to fetch tasks");
-      alert("Failed to load task status. Please ensure the backend is running on localhost:8000.");
-      return;
-    }
-    const tasks = await res.json();
-    console.log('All tasks:', tasks);
-
     const container = document.getElementById("taskStatusBody");
     container.innerHTML = "";
 
@@ -150,24 +183,12 @@ async function loadTaskStatus() {
 
     container.appendChild(kanbanContainer);
   } catch (err) {
-    console.error("Error loading task status:", err);
-    alert("Error loading task status: Network error. Please ensure the backend is running on localhost:8000.");
+    console.error("Error rendering task status:", err);
   }
 }
 
-async function updateDashboardCounts() {
+function renderDashboardCounts(tasks) {
   try {
-    const token = localStorage.getItem('authToken');
-    const headers = token ? { 'Authorization': `Bearer ${token}` } : {};
-
-    const res = await fetch("http://localhost:8000/tasks", { headers });
-    if (!res.ok) {
-      console.error("Failed to fetch tasks");
-      alert("Failed to load dashboard data. Please ensure the backend is running on localhost:8000.");
-      return;
-    }
-    const tasks = await res.json();
-
     // Calculate counts for all tasks
     const total = tasks.length;
     const inProgress = tasks.filter(t => t.status === "In Progress").length;
@@ -184,7 +205,6 @@ async function updateDashboardCounts() {
 
   } catch (err) {
     console.error("Error updating dashboard counts:", err);
-    alert("Error loading dashboard data. Please check the console for details and ensure the backend is running.");
   }
 }
 
@@ -2,15 +2,16 @@ const API_URL = "http://localhost:8000";
 
 async function loadTeams() {
   try {
-    const res = await fetch(`${API_URL}/teams`);
-    const members = await res.json();
+    const today = new Date().toISOString().split("T")[0];
+    const res = await fetch(`${API_URL}/teams/dashboard?date=${today}`);
+    const dashboard = await res.json();
 
     const tbody = document.getElementById("teamBody");
     tbody.innerHTML = "";
 
-    for (const member of members) {
-      const totalLeaves = await getTotalLeaves(member.name);
-      const todayPresence = await getTodayPresence(member.name);
+    for (const member of dashboard.members) {
+      const totalLeaves = member.total_leaves;
+      const todayPresence = formatPresence(member.presence);
 
       const tr = document.createElement("tr");
 
@@ -32,34 +33,33 @@ async function loadTeams() {
   }
 }
 
-// Get Total Leaves for a Member
-async function getTotalLeaves(memberName) {
-  try {
-    const res = await fetch(`${API_URL}/leaves/${memberName}`);
-    const leaves = await res.json();
-    return leaves.length;
-  } catch (err) {
-    console.error("Error getting total leaves:", err);
-    return 0;
+// The dashboard aggregates the roster, leave totals and today's presence, so
+// any change to those re-fetches it; a bulk write's burst of events triggers
+// one fetch. Falls back to polling every 30 seconds where EventSource is not
+// available.
+function startLiveUpdates() {
+  const token = localStorage.getItem('authToken');
+  if (!window.EventSource || !token) {
+    setInterval(loadTeams, 30000);
+    return;
   }
+  const source = new EventSource(`${API_URL}/events?types=teams,presence,leaves&token=${encodeURIComponent(token)}`);
+  let pending = null;
+  const refresh = () => {
+    if (pending) return;
+    pending = setTimeout(() => {
+      pending = null;
+      loadTeams();
+    }, 500);
+  };
+  ["teams", "presence", "leaves", "reset"].forEach(type => source.addEventListener(type, refresh));
+  source.onerror = () => console.warn("Team feed disconnected, retrying");
 }
 
-// Get Today's Presence for a Member
-async function getTodayPresence(memberName) {
-  try {
-    const today = new Date().toISOString().split("T")[0];
-    const res = await fetch(`${API_URL}/presence/${memberName}?date=${today}`);
-    const presenceRecords = await res.json();
-
-    if (presenceRecords.length > 0) {
-      const status = presenceRecords[0].status;
-      return status === 'present' ? '✅ Present' : '❌ Absent';
-    }
-    return '⏳ Not Marked';
-  } catch (err) {
-    console.error("Error getting today presence:", err);
-    return '⏳ Not Marked';
-  }
+// Format today's presence status from the dashboard response
+function formatPresence(status) {
+  if (!status) return '⏳ Not Marked';
+  return status === 'present' ? '✅ Present' : '❌ Absent';
 }
 
 async function deleteMember(button) {
@@ -181,4 +181,5 @@ document.addEventListener("DOMContentLoaded", () => {
   } else {
     loadTeams();
   }
+  startLiveUpdates();
 });